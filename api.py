@@ -0,0 +1,290 @@
+import argparse
+import gzip
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from starlette.applications import Starlette
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+import data_access as da
+import fig_builder as fb
+import fig_cache
+import metrics
+import warmup
+from ingest import dataset_version
+from options import PALETTES, TEXT_SIZES, THEMES, CATEGORIES, TAB_FIGURES, ROLLUP_PERIODS
+from regression import FIT_TABLES
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# JSON API over the dashboard's data layer and figures, for tools that want the same numbers
+# and charts without going through Streamlit. An ASGI app (Starlette), served with
+#
+#   python api.py --port 8000        (or any ASGI server: uvicorn api:app)
+#
+#   GET /years
+#   GET /slices/{year|continent|country}/{value}?columns=country,lifeexp
+#   GET /fits, /fits/{name}
+#   GET /figures, /figures/{name}?palette=blues&text_size=17&theme=default&year=2007&category=log_pop&period=year
+#
+# Every response carries a strong ETag derived from the dataset version, the column layout
+# (float32 or float64), the request and the fig_builder code version, so it changes exactly
+# when the data or the figure code does.
+# The dataset version is cached by ingest.dataset_version until data.db changes on disk, so
+# a matching If-None-Match gets 304 Not Modified after one stat() and a hash, without
+# opening the database. Encoded bodies (brotli when installed, else gzip) are kept in a
+# bounded LRU, so repeat requests cost a hash and a dict lookup. Clients should revalidate
+# (Cache-Control: no-cache).
+#
+# `app` is a plain ASGI callable, so checks can call it in-process without a network (see
+# tests/test_api.py), or through Starlette's TestClient when httpx is installed.
+
+MIN_COMPRESS_BYTES = 512
+BODY_CACHE_BYTES = 64 * 1024 * 1024
+
+FIGURES = ["make_choropleth", "make_bubble", *[name for name, _ in TAB_FIGURES], "make_rollup_trends", "make_rollup_summary"]
+SLICE_FIELDS = ["country", "continent", "year", *da.METRIC_COLUMNS]
+
+# Source of fig_builder and the modules it uses, plus the plotly version: a figure ETag
+# must change when the figure code does
+CODE_VERSION = fig_cache.code_version(fb.make_choropleth)[:16]
+
+_bodies = OrderedDict()
+_bodies_size = 0
+_bodies_lock = threading.Lock()
+
+
+# Dataset version written by data_builder (cached per data.db mtime); unversioned builds
+# use the full frame's digest
+def data_version():
+    return dataset_version(da.DB_PATH) or da.get_full().token
+
+
+def choose_encoding(accept_encoding):
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            accepted[name.lower()] = q
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def make_etag(key, encoding):
+    digest = hashlib.sha256(f"{CODE_VERSION}|{data_version()}|{da.LAYOUT}|{key}".encode()).hexdigest()[:32]
+    return f'"{digest}-{encoding}"' if encoding else f'"{digest}"'
+
+
+# If-None-Match uses the weak comparison, so W/ prefixes are ignored
+def not_modified(if_none_match, etag):
+    if not if_none_match:
+        return False
+    tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+# Encoded bodies by ETag, as (body, content encoding or None)
+def _cached_body(etag):
+    with _bodies_lock:
+        entry = _bodies.get(etag)
+        if entry is not None:
+            _bodies.move_to_end(etag)
+        return entry
+
+
+def _store_body(etag, entry):
+    global _bodies_size
+    with _bodies_lock:
+        if etag not in _bodies:
+            _bodies[etag] = entry
+            _bodies_size += len(entry[0])
+        while _bodies_size > BODY_CACHE_BYTES and _bodies:
+            _, (old, _) = _bodies.popitem(last=False)
+            _bodies_size -= len(old)
+
+
+def encode(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    if encoding == "gzip":
+        return gzip.compress(body, 6, mtime=0)
+    return body
+
+
+# Conditional, compressed JSON response. `key` identifies the resource within a dataset
+# version; `build` returns the JSON body (str or bytes) and only runs on a cache miss.
+def respond(request, endpoint, key, build):
+    encoding = choose_encoding(request.headers.get("accept-encoding", ""))
+    etag = make_etag(key, encoding)
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if not_modified(request.headers.get("if-none-match"), etag):
+        metrics.inc("api_responses_total", endpoint=endpoint, status=304)
+        return Response(status_code=304, headers=headers)
+
+    entry = _cached_body(etag)
+    if entry is None:
+        with metrics.span("api_build_seconds", endpoint=endpoint):
+            raw = build()
+            raw = raw.encode() if isinstance(raw, str) else raw
+            # Small bodies are not worth compressing; they keep the encoding's ETag regardless
+            entry = (encode(raw, encoding), encoding) if encoding and len(raw) >= MIN_COMPRESS_BYTES else (raw, None)
+        _store_body(etag, entry)
+        metrics.inc("api_body_cache_total", endpoint=endpoint, result="miss")
+    else:
+        metrics.inc("api_body_cache_total", endpoint=endpoint, result="hit")
+    body, content_encoding = entry
+    if content_encoding:
+        headers["Content-Encoding"] = content_encoding
+    metrics.inc("api_responses_total", endpoint=endpoint, status=200)
+    return Response(body, headers=headers, media_type="application/json")
+
+
+def _json(obj):
+    return json.dumps(obj, separators=(",", ":"), default=str)
+
+
+# A frame as {"columns": [...], "data": [[...], ...]}, merged into `extra`
+def _table_json(frame, **extra):
+    table = frame.to_json(orient="split", index=False, date_format="iso")
+    head = _json(extra)
+    return head[:-1] + "," + table[1:] if extra else table
+
+
+def _param(request, name, choices, default):
+    value = request.query_params.get(name, default)
+    if value not in choices:
+        raise HTTPException(400, f"{name} must be one of {', '.join(map(str, choices))}")
+    return value
+
+
+def _year(value):
+    years = da.get_years()
+    for year in years:
+        if str(year) == str(value):
+            return year
+    raise HTTPException(404, f"no data for year {value}")
+
+
+def health(request):
+    return JSONResponse({"status": "ok"})
+
+
+def years(request):
+    return respond(request, "years", "years", lambda: _json({"version": data_version(), "years": da.get_years()}))
+
+
+def slices(request):
+    kind, value = request.path_params["kind"], request.path_params["value"]
+    if kind not in da.SLICE_COLUMNS:
+        raise HTTPException(404, f"slices are by {', '.join(da.SLICE_COLUMNS)}")
+    columns = request.query_params.get("columns")
+    columns = [c.strip() for c in columns.split(",") if c.strip()] if columns else SLICE_FIELDS
+    unknown = [c for c in columns if c not in SLICE_FIELDS]
+    if unknown:
+        raise HTTPException(400, f"unknown columns {', '.join(unknown)}; available: {', '.join(SLICE_FIELDS)}")
+    if kind == "year":
+        value = _year(value)
+
+    def build():
+        frame = da.get_slice(kind, value, columns).frame
+        if frame.empty:
+            raise HTTPException(404, f"no rows for {kind} {value}")
+        return _table_json(frame, version=data_version(), kind=kind, value=value)
+
+    return respond(request, "slices", _json([kind, value, columns]), build)
+
+
+def fits(request):
+    tables = {name: dict(zip(("group", "x", "y"), spec)) for name, spec in FIT_TABLES.items()}
+    return respond(request, "fits", "fits", lambda: _json({"version": data_version(), "fits": tables}))
+
+
+def fit(request):
+    name = request.path_params["name"]
+    if name not in FIT_TABLES:
+        raise HTTPException(404, f"no fit {name}; available: {', '.join(FIT_TABLES)}")
+    group, x, y = FIT_TABLES[name]
+
+    def build():
+        table = da.get_fits().get(name)
+        if table is None:
+            raise HTTPException(404, f"fit {name} has not been built; run data_builder.build_db")
+        return _table_json(table, version=data_version(), name=name, group=group, x=x, y=y)
+
+    return respond(request, "fits", name, build)
+
+
+def figures(request):
+    options = {
+        "palette": list(PALETTES.values()),
+        "text_size": TEXT_SIZES,
+        "theme": list(THEMES),
+        "category": list(CATEGORIES.values()),
+        "period": list(ROLLUP_PERIODS.values()),
+    }
+    return respond(request, "figures", "figures", lambda: _json({"figures": FIGURES, "options": options}))
+
+
+# Figure JSON for the same job warmup.py pre-renders, so cached figures are shared with
+# the dashboard
+def figure(request):
+    name = request.path_params["name"]
+    if name not in FIGURES:
+        raise HTTPException(404, f"no figure {name}; available: {', '.join(FIGURES)}")
+    palette = _param(request, "palette", list(PALETTES.values()), "blues")
+    text_size = int(_param(request, "text_size", [str(s) for s in TEXT_SIZES], "17"))
+    theme = _param(request, "theme", list(THEMES), "default")
+
+    year = option = None
+    if name in ("make_choropleth", "make_latest_residual_bars"):
+        year = _year(request.query_params.get("year", da.get_years()[-1]))
+    if name == "make_choropleth":
+        option = _param(request, "category", list(CATEGORIES.values()), next(iter(CATEGORIES.values())))
+    elif name == "make_rollup_trends":
+        option = _param(request, "period", list(ROLLUP_PERIODS.values()), next(iter(ROLLUP_PERIODS.values())))
+
+    job = (name, year, option, (palette, text_size, *THEMES[theme]))
+    return respond(request, "figure", _json(job), lambda: warmup.figure_json(job))
+
+
+def error(request, exc):
+    return JSONResponse({"error": exc.detail}, status_code=exc.status_code)
+
+
+app = Starlette(
+    routes=[
+        Route("/health", health),
+        Route("/years", years),
+        Route("/slices/{kind}/{value}", slices),
+        Route("/fits", fits),
+        Route("/fits/{name}", fit),
+        Route("/figures", figures),
+        Route("/figures/{name}", figure),
+    ],
+    exception_handlers={HTTPException: error},
+)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="JSON API for dashboard data and figures")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+    metrics.start()
+    uvicorn.run(app, host=args.host, port=args.port)
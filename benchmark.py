@@ -0,0 +1,273 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+
+# Benchmarks for the ingest, load and figure-building hot paths. Every run of a case is its
+# own Python process (so peak RSS is per case and no data, feature column or figure cache
+# is warm from an earlier run), inside a work directory per dataset scale laid out like
+# the app's (data/...).
+#
+#   python benchmark.py                           # scales 1 10 100 1000, compare to baseline
+#   python benchmark.py --scales 1 10 --save-baseline
+#   python benchmark.py --verify                  # fast-path figures against their px originals
+#
+# Results go to benchmarks/results.json. When benchmarks/baseline.json exists, any case
+# that got slower, bigger in memory or bigger on the wire by more than --tolerance is
+# reported and the exit status is 1.
+
+REPO = os.path.dirname(os.path.abspath(__file__))
+BENCH_DIR = os.path.join(REPO, "benchmarks")
+WORK_DIR = os.path.join(BENCH_DIR, "work")
+RESULTS_PATH = os.path.join(BENCH_DIR, "results.json")
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+
+SCALES = [1, 10, 100, 1000]
+BUILD_CASES = ["data.build_db", "data_builder.build_db", "data_builder.build_db:streaming", "grab_df"]
+
+# Differences below these are noise, whatever the ratio
+MIN_SECONDS = 0.05
+MIN_RSS_MB = 5
+
+
+def source_csv():
+    for path in ("gapminder_data.csv", "data/gapminder_data.csv"):
+        if os.path.exists(os.path.join(REPO, path)):
+            return os.path.join(REPO, path)
+    raise FileNotFoundError("gapminder_data.csv not found next to benchmark.py or in data/")
+
+
+# The bundled CSV tiled `scale` times. Copy 0 keeps the real country names (so the map still
+# draws); later copies are renamed "<country> <k>" and jittered by a few percent so fits and
+# quantiles are not just repeats. Written copy by copy, so memory stays at one copy.
+def write_scaled_csv(src, dst, scale, seed=0):
+    base = pd.read_csv(src)
+    rng = np.random.default_rng(seed)
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    tmp = dst + ".tmp"
+    for k in range(scale):
+        part = base.copy()
+        if k:
+            part["country"] = part["country"] + f" {k}"
+            for col in ("lifeExp", "gdpPercap"):
+                part[col] = part[col] * rng.uniform(0.95, 1.05, len(part))
+            part["pop"] = (part["pop"] * rng.uniform(0.9, 1.1, len(part))).round().astype("int64")
+        part.to_csv(tmp, mode="w" if k == 0 else "a", header=k == 0, index=False)
+    os.replace(tmp, dst)
+
+
+def prepare(scale):
+    work = os.path.join(WORK_DIR, f"scale_{scale}")
+    csv = os.path.join(work, "data", "gapminder_data.csv")
+    if not os.path.exists(csv):
+        write_scaled_csv(source_csv(), csv, scale)
+    return work
+
+
+def figure_cases():
+    import fig_builder as fb
+    return [name for name in dir(fb) if name.startswith("make_") and hasattr(getattr(fb, name), "cache_key")]
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+# Runs once in the child process, with cwd set to the scale's work directory
+def run_case(case):
+    json_bytes = None
+    if case not in BUILD_CASES[:3] and not os.path.exists("data/data.db"):
+        # Load and figure cases read a database built by data_builder
+        import data_builder
+        data_builder.build_db()
+
+    if case == "data.build_db":
+        import data
+        start = time.perf_counter()
+        data.build_db(db_path="data/legacy.db")
+        seconds = time.perf_counter() - start
+
+    elif case.startswith("data_builder.build_db"):
+        import data_builder
+        chunksize = 100_000 if case.endswith(":streaming") else None
+        start = time.perf_counter()
+        data_builder.build_db(chunksize=chunksize)
+        seconds = time.perf_counter() - start
+
+    elif case == "grab_df":
+        # What a fresh dashboard process does before its first render
+        import data_access as da
+        start = time.perf_counter()
+        da.get_full()
+        da.get_fits()
+        seconds = time.perf_counter() - start
+
+    else:
+        import data_access as da
+        import warmup
+        job = next(j for j in warmup.enumerate_jobs(da.get_years()) if j[0] == case)
+        # Data-level inputs (full frame, fits, residual index, rollup) are shared by every
+        # render in production, so they are loaded before the clock starts
+        builder, args, kwargs = warmup.figure_call(job)
+        start = time.perf_counter()
+        fig = builder(*args, **kwargs)
+        seconds = time.perf_counter() - start
+        json_bytes = len(fig.to_json())
+
+    return {"seconds": seconds, "peak_rss_mb": peak_rss_mb(), "json_bytes": json_bytes}
+
+
+def spawn_once(case, work, timeout):
+    env = dict(os.environ, PYTHONPATH=REPO + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    # Figures are always built cold, into a cache nobody else reads
+    env["FIG_CACHE_DIR"] = tempfile.mkdtemp(prefix="bench-fig-cache-")
+    try:
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--run-case", case],
+            cwd=work, env=env, capture_output=True, text=True, timeout=timeout,
+        )
+    except subprocess.TimeoutExpired:
+        return {"error": f"timed out after {timeout}s"}
+    finally:
+        shutil.rmtree(env["FIG_CACHE_DIR"], ignore_errors=True)
+    if proc.returncode != 0:
+        return {"error": proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"exit {proc.returncode}"}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+# `repeat` runs, each in a fresh process; the fastest is reported
+def spawn(case, scale, repeat, timeout):
+    work = prepare(scale)
+    runs = []
+    for _ in range(repeat):
+        r = spawn_once(case, work, timeout)
+        if "error" in r:
+            return r
+        runs.append(r)
+    return {
+        "seconds": min(r["seconds"] for r in runs),
+        "first_seconds": runs[0]["seconds"],
+        "peak_rss_mb": max(r["peak_rss_mb"] for r in runs),
+        "json_bytes": runs[-1]["json_bytes"],
+    }
+
+
+# Fast-path figures against their px originals: tests/test_figure_spec.py, on `limit`
+# variants per builder. Returns pytest's exit status.
+def verify(limit=200):
+    import pytest
+    os.environ["VERIFY_LIMIT"] = str(limit)
+    return pytest.main(["-q", "-k", "matches_px", os.path.join(REPO, "tests", "test_figure_spec.py")])
+
+
+def environment():
+    import plotly
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "plotly": plotly.__version__,
+    }
+
+
+def run_all(scales, cases=None, repeat=3, timeout=3600, verbose=True):
+    cases = cases or BUILD_CASES + figure_cases()
+    results = []
+    for scale in scales:
+        # The builds write data.db, which the load and figure cases then read, so they go first
+        for case in cases:
+            r = {"case": case, "scale": scale, **spawn(case, scale, repeat, timeout)}
+            results.append(r)
+            if verbose:
+                print(format_result(r), flush=True)
+    return {"environment": environment(), "results": results}
+
+
+def format_result(r):
+    if "error" in r:
+        return f"{r['case']:<36} x{r['scale']:<5} ERROR {r['error']}"
+    size = f"{r['json_bytes'] / 1024:>10,.0f} KiB" if r.get("json_bytes") is not None else " " * 14
+    return f"{r['case']:<36} x{r['scale']:<5} {r['seconds']:>9.3f}s {r['peak_rss_mb']:>8.0f} MB{size}"
+
+
+# Cases that regressed against the baseline: list of (case, scale, metric, baseline, now)
+def compare(results, baseline, tolerance=0.25):
+    before = {(r["case"], r["scale"]): r for r in baseline["results"] if "error" not in r}
+    regressions = []
+    for r in results["results"]:
+        b = before.get((r["case"], r["scale"]))
+        if b is None:
+            continue
+        if "error" in r:
+            regressions.append((r["case"], r["scale"], "error", None, r["error"]))
+            continue
+        for metric, floor in (("seconds", MIN_SECONDS), ("peak_rss_mb", MIN_RSS_MB), ("json_bytes", 0)):
+            old, new = b.get(metric), r.get(metric)
+            if old is None or new is None:
+                continue
+            if new > old * (1 + tolerance) and new - old > floor:
+                regressions.append((r["case"], r["scale"], metric, old, new))
+    return regressions
+
+
+def save(results, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark ingest, load and figure building")
+    parser.add_argument("--scales", type=int, nargs="+", default=SCALES, help="dataset sizes as multiples of the bundled CSV (default 1 10 100 1000)")
+    parser.add_argument("--cases", nargs="+", default=None, help="only these cases (default: every build case and make_* builder)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per case, each in a fresh process; the fastest is reported (default 3)")
+    parser.add_argument("--timeout", type=float, default=3600, help="seconds before a case is abandoned (default 3600)")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed growth over the baseline (default 0.25 = 25%%)")
+    parser.add_argument("--out", default=RESULTS_PATH)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--verify", action="store_true", help="check fast-path figures against their px originals and exit")
+    parser.add_argument("--verify-limit", type=int, default=200, help="variants checked per builder with --verify (default 200)")
+    parser.add_argument("--run-case", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.verify:
+        sys.exit(verify(args.verify_limit))
+
+    if args.run_case:
+        print(json.dumps(run_case(args.run_case)))
+        sys.exit(0)
+
+    results = run_all(args.scales, args.cases, args.repeat, args.timeout)
+    save(results, args.out)
+    print(f"Results written to {args.out}")
+
+    if args.save_baseline:
+        save(results, args.baseline)
+        print(f"Baseline written to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for case, scale, metric, old, new in regressions:
+            print(f"REGRESSION {case} x{scale} {metric}: {old} -> {new}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
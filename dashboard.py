@@ -1,33 +1,39 @@
+import textwrap
+import time
 import streamlit as st
-import pandas as pd
-from sqlalchemy import create_engine, text
-import numpy as np
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 import fig_builder as fb
+import fig_cache
+import data_access as da
+import metrics
+from options import PALETTES, THEMES, CATEGORIES, MAP_COLUMNS, ROLLUP_PERIODS, TABS, text_size_for
+
+# Request-path metrics (metrics.py); exporters are started once per process
+metrics.start()
+rerun_start = time.perf_counter()
+if "reruns" not in st.session_state:
+    st.session_state["reruns"] = 0
+    metrics.inc("dashboard_sessions_total")
+st.session_state["reruns"] += 1
+metrics.inc("dashboard_reruns_total")
+
+# Full table, shared by every session in the process (read-only Dataset handle)
+@metrics.span("dashboard_stage_seconds", stage="grab_df")
+def grab_df():
+    return da.get_full()
 
-engine = create_engine("sqlite:///data/data.db")
+data = grab_df()
+df = data.frame
+with metrics.span("dashboard_stage_seconds", stage="get_fits"):
+    fits = da.get_fits()
 
-# Store df in cache
-@st.cache_data
-def grab_df():
-    q = """
-    SELECT country, continent, year, lifeexp, pop, gdppercap,
-           pop * gdppercap AS gdp
-    FROM data
-    ORDER BY country, year
-    """
-    df = pd.read_sql(text(q), engine)
-
-    # Create log values for metrics
-    df["log_pop"] = np.log10(df["pop"])
-    df["log_gdppercap"] = np.log10(df["gdppercap"])
-    df["log_gdp"] = np.log10(df["gdp"])
-    return df
-
-df = grab_df()
+# st.plotly_chart serializes the figure to JSON for the browser
+def plotly_chart(fig, builder):
+    with metrics.span("dashboard_chart_seconds", builder=builder):
+        st.plotly_chart(fig, use_container_width=True)
 
 # Global page config
-text_color = "#DAE7FF"
-background_color = '#0E1117'
+text_color, background_color = THEMES["default"]
 text_size = 16
 
 st.set_page_config(
@@ -92,17 +98,15 @@ with cols[1]:
 with cols[-1]:
     with st.popover('⚙️'):
         st.markdown("### 🧩 Accessibility Options")
-        color_mode = st.selectbox("Color Palette", ["Default","Protanopia","Deuteranopia","Tritanopia","Grayscale"])
-        text_size = st.slider("Text Size", 1, 5, 3) * 4 + 5
+        color_mode = st.selectbox("Color Palette", list(PALETTES))
+        text_size = text_size_for(st.slider("Text Size", 1, 5, 3))
         dyslexia_mode = st.checkbox("Dyslexia-friendly font")
         high_contrast = st.checkbox("High Contrast Mode")
 
-conv = {"Default":"blues","Protanopia":"viridis","Deuteranopia":"magma","Tritanopia":"cividis", "Grayscale":"greys"}
-palette = conv[color_mode]
+palette = PALETTES[color_mode]
 
 if high_contrast:
-    background_color = "black"
-    text_color = "white"
+    text_color, background_color = THEMES["high_contrast"]
     st.markdown("""
     <style>
     .stApp{background-color:black!important;color:white!important}
@@ -149,30 +153,36 @@ if dyslexia_mode:
 st.divider()
 
 # Map config
-title_ph = st.empty()
-desc_ph = st.empty()
+# The map lives in a fragment: moving the year slider or switching category reruns
+# only this function and resends only the choropleth, not the rest of the page
+@st.fragment
+@metrics.span("dashboard_fragment_seconds", fragment="map")
+def map_section(palette, text_size, text_color, background_color):
+    title_ph = st.empty()
+    desc_ph = st.empty()
+
+    year_list = da.get_years()
+    col1, col2, col3 = st.columns([1, 2, 3])
 
-year_list = sorted(df["year"].unique().tolist())
-col1, col2, col3 = st.columns([1, 2, 3])
+    with col1:
+        selected_year = st.select_slider("Select a Year", options=year_list, value=year_list[-1])
+    with col2:
+        selected_label = st.selectbox("Select a category", list(CATEGORIES))
 
-with col1:
-    selected_year = st.select_slider("Select a Year", options=year_list, value=year_list[-1])
-with col2:
-    selected_label = st.selectbox("Select a category", ["Population", "Life Expectancy", "GDP Per Capita", "GDP"])
+    title_ph.markdown(f"#### {selected_label} Map")
+    desc_ph.markdown(f"""
+                    This map shows how each country's {selected_label.lower()} change over time for the selected category.  
+                    Use the slider to move between years and the dropdown to switch between metrics such as population, life expectancy, GDP per capita, or total GDP.  
+                    Darker shades represent higher values within the chosen metric for that year.
+                    """)
 
-title_ph.markdown(f"#### {selected_label} Map")
-desc_ph.markdown(f"""
-                This map shows how each country's {selected_label.lower()} change over time for the selected category.  
-                Use the slider to move between years and the dropdown to switch between metrics such as population, life expectancy, GDP per capita, or total GDP.  
-                Darker shades represent higher values within the chosen metric for that year.
-                """)
+    df_selected = da.get_slice("year", selected_year, MAP_COLUMNS)
+    selected_category = CATEGORIES[selected_label]
 
-cols = ["country","continent","year","lifeexp","pop","gdppercap","gdp","log_pop","log_gdppercap","log_gdp"]
-df_selected = df.loc[df["year"].eq(selected_year), cols].copy()
-selected_category = {"Population":"log_pop","Life Expectancy":"lifeexp","GDP Per Capita":"log_gdppercap","GDP":"log_gdp"}[selected_label]
+    choropleth = fb.make_choropleth(df_selected, selected_category, palette, text_size, text_color, background_color)
+    plotly_chart(choropleth, "make_choropleth")
 
-choropleth = fb.make_choropleth(df_selected, selected_category, palette, text_size, text_color, background_color)
-st.plotly_chart(choropleth, use_container_width=True)
+map_section(palette, text_size, text_color, background_color)
 
 st.divider()
 
@@ -187,83 +197,102 @@ This improvement was not just in rich countries; almost all countries see an inc
             
 
         """) 
-bubble = fb.make_bubble(df.copy(), palette, text_size, text_color, background_color)
-st.plotly_chart(bubble, use_container_width=True)
-
-
-tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
-    "By Continent",
-    "By Decade",
-    "Trends",
-    "Residuals",
-    "Population vs Income",
-    "Slope Summary"
-])
-
-with tab1:
-    st.markdown("#### Life expectancy vs GDP per capita by continent")
-    st.markdown("""
-        This view compares how life expectancy increases with income for each continent.
-        The slope of each line indicates how strongly economic growth translates into longer lives
-        in that region, steeper slopes mean greater health gains per increase in income.
-        \n All continents see an upwards trend, meaning life expectancy and income are highly correlated around the world.
-                """)
-    fig_inc_health = fb.make_income_health_scatter(df.copy(), palette, text_size, text_color, background_color)
-    st.plotly_chart(fig_inc_health, use_container_width=True)
-
-with tab2:
-    st.markdown("#### Relationship by decade")
-    st.markdown("""
-    This view compares the life expectancy - GDP per capita relationship for each decade since the 1950s.
-    As global health and wealth improved, the correlation between GDP per capita and life expectancy
-    stayed relatively consistent, so the gradient of the trend line doesn't change much.
-                """)
-
-    fig_decades = fb.make_decade_facets(df.copy(), palette, text_size, text_color, background_color)
-    st.plotly_chart(fig_decades, use_container_width=True)
-
-with tab3:
-    st.markdown("#### Life expectancy trends over time by Continent")
-    st.markdown("""
-    This view tracks life expectancy through time for each continent. 
-    The trend lines show the average improvement rate: Asia and the Americas rise the fastest,
-    while Europe and Oceania rise the slowest.
-                """)
-    fig_trends = fb.make_continent_time_trends(df.copy(), palette, text_size, text_color, background_color)
-    st.plotly_chart(fig_trends, use_container_width=True)
-
-with tab4:
-    st.markdown("#### Life expectancy vs GDP per capita Residuals")
-    st.markdown("""
-    This view shows the greatest Residuals for life expectancy vs GDP per capita. 
-    Residuals measure how far each country's life expectancy is from the global average expected 
-    for its GDP per capita. It's split into two groups, highlighting the top 6 overperforming
-    and underperforming countries relative to their peers.
-                """)
-
-    fig_resid = fb.make_latest_residual_bars(df.copy(), palette, text_size, text_color, background_color)
-    st.plotly_chart(fig_resid, use_container_width=True)
-
-with tab5:
-    st.markdown('#### GDP per capita vs Population (Log Scale)')
-    st.markdown("""
-    This view shows the relationship between population and income for each continent.
-    The gradient of each trend line indicates how strongly population ties into economic growth.
-    Larger populations coincide with higher income in the Americas, but with lower income in parts of Asia.
-                """)
-
-    fig_pop_vs_inc = fb.make_logpop_vs_loggdp_facets(df.copy(), palette, text_size, text_color, background_color)
-    st.plotly_chart(fig_pop_vs_inc, use_container_width=True)
-
-with tab6:
-    st.markdown("#### Life Expectancy vs Income Slopes for each Continent")
-    st.markdown("""
-        This view compares the gradients of life expectancy vs income for each continent.
-        It tells you how many years of life every 10x rise in GDP per capita gets you for each continent
-        and hence how effectively higher income correlates to longer life across regions.
-                """)
-    fig_slopes = fb.make_summary_slopes(df.copy(), palette, text_size, text_color, background_color)
-    st.plotly_chart(fig_slopes, use_container_width=True)
+bubble = fb.make_bubble(data, palette, text_size, text_color, background_color)
+plotly_chart(bubble, "make_bubble")
+
+
+# Heading and description of analysis tab i (options.TABS)
+def tab_text(i):
+    _, heading, text, _ = TABS[i]
+    st.markdown(f"#### {heading}")
+    st.markdown(textwrap.dedent(text))
+
+
+# Analysis tabs: only the open tab's figure is built on the request path. Switching tabs
+# reruns just this fragment.
+@st.fragment
+@metrics.span("dashboard_fragment_seconds", fragment="tabs")
+def tabs_section(palette, text_size, text_color, background_color):
+    tab1, tab2, tab3, tab4, tab5, tab6, tab7 = st.tabs([label for label, _, _, _ in TABS], key="analysis_tabs", on_change="rerun")
+
+    # Figures for tabs that are not open get built in the background instead
+    closed = []
+
+    with tab1:
+        tab_text(0)
+        if tab1.open:
+            fig_inc_health = fb.make_income_health_scatter(data, palette, text_size, text_color, background_color, fits=fits)
+            plotly_chart(fig_inc_health, "make_income_health_scatter")
+        else:
+            closed.append((fb.make_income_health_scatter, {"fits": fits}))
+
+    with tab2:
+        tab_text(1)
+        if tab2.open:
+            fig_decades = fb.make_decade_facets(data, palette, text_size, text_color, background_color, fits=fits)
+            plotly_chart(fig_decades, "make_decade_facets")
+        else:
+            closed.append((fb.make_decade_facets, {"fits": fits}))
+
+    with tab3:
+        tab_text(2)
+        if tab3.open:
+            fig_trends = fb.make_continent_time_trends(data, palette, text_size, text_color, background_color, fits=fits)
+            plotly_chart(fig_trends, "make_continent_time_trends")
+        else:
+            closed.append((fb.make_continent_time_trends, {"fits": fits}))
+
+    with tab4:
+        tab_text(3)
+
+        # Every year's over/under-performers are precomputed, so moving the slider is a lookup
+        residuals = da.get_residual_index()
+        resid_years = da.get_years()
+        if tab4.open:
+            resid_year = st.select_slider("Residuals for year", options=resid_years, value=resid_years[-1], key="resid_year")
+            fig_resid = fb.make_latest_residual_bars(data, palette, text_size, text_color, background_color, year=resid_year, index=residuals)
+            plotly_chart(fig_resid, "make_latest_residual_bars")
+        else:
+            closed.append((fb.make_latest_residual_bars, {"year": st.session_state.get("resid_year", resid_years[-1]), "index": residuals}))
+
+    with tab5:
+        tab_text(4)
+        if tab5.open:
+            fig_pop_vs_inc = fb.make_logpop_vs_loggdp_facets(data, palette, text_size, text_color, background_color, fits=fits)
+            plotly_chart(fig_pop_vs_inc, "make_logpop_vs_loggdp_facets")
+        else:
+            closed.append((fb.make_logpop_vs_loggdp_facets, {"fits": fits}))
+
+    with tab6:
+        tab_text(5)
+        if tab6.open:
+            fig_slopes = fb.make_summary_slopes(data, palette, text_size, text_color, background_color, fits=fits)
+            plotly_chart(fig_slopes, "make_summary_slopes")
+        else:
+            closed.append((fb.make_summary_slopes, {"fits": fits}))
+
+    # Built from the continent x year rollup cube, so these never scan the country rows
+    rollup = da.get_rollup()
+    with tab7:
+        tab_text(6)
+        if tab7.open:
+            period = ROLLUP_PERIODS[st.radio("Period", list(ROLLUP_PERIODS), horizontal=True, key="rollup_period")]
+            plotly_chart(fb.make_rollup_trends(rollup, palette, text_size, text_color, background_color, period=period), "make_rollup_trends")
+            plotly_chart(fb.make_rollup_summary(rollup, palette, text_size, text_color, background_color), "make_rollup_summary")
+        else:
+            period = ROLLUP_PERIODS[st.session_state.get("rollup_period", next(iter(ROLLUP_PERIODS)))]
+            fig_cache.prefetch(fb.make_rollup_trends, rollup, palette, text_size, text_color, background_color, period=period)
+            fig_cache.prefetch(fb.make_rollup_summary, rollup, palette, text_size, text_color, background_color)
+
+    for builder, kwargs in closed:
+        fig_cache.prefetch(builder, data, palette, text_size, text_color, background_color, **kwargs)
+
+tabs_section(palette, text_size, text_color, background_color)
 
 with st.expander('🔍 View Raw Data'):
-    st.dataframe(df)
\ No newline at end of file
+    st.dataframe(df)
+
+rerun_seconds = time.perf_counter() - rerun_start
+metrics.observe("dashboard_rerun_seconds", rerun_seconds)
+ctx = get_script_run_ctx()
+metrics.event("dashboard_rerun", session=ctx.session_id if ctx else None, reruns=st.session_state["reruns"], seconds=rerun_seconds)
\ No newline at end of file
@@ -1,13 +1,20 @@
 import pandas as pd
 import sqlite3
 from sqlalchemy import create_engine
+from ingest import create_table, stream_csv
 
-def build_db(csv_path="data/gapminder_data.csv", db_path="data/data.db", table="data"):
-    df = pd.read_csv(csv_path)
-    df.columns = [c.strip().lower() for c in df.columns]
+def build_db(csv_path="data/gapminder_data.csv", db_path="data/data.db", table="data", chunksize=None):
+    if chunksize:
+        # Streaming mode: typed executemany inserts in one transaction, bounded memory
+        with sqlite3.connect(db_path) as con:
+            create_table(con, table, primary_key=False)
+            stream_csv(csv_path, con, table, chunksize)
+    else:
+        df = pd.read_csv(csv_path)
+        df.columns = [c.strip().lower() for c in df.columns]
 
-    eng = create_engine(f"sqlite:///{db_path}")
-    df.to_sql(table, eng, if_exists="replace", index=False, method="multi")
+        eng = create_engine(f"sqlite:///{db_path}")
+        df.to_sql(table, eng, if_exists="replace", index=False, method="multi")
 
     sql = f"""
     CREATE UNIQUE INDEX IF NOT EXISTS ux_{table}_country_year ON {table}(country, year);
@@ -0,0 +1,261 @@
+import os
+from functools import lru_cache
+import pandas as pd
+from pandas.errors import DatabaseError
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+import metrics
+from features import LOG_COLUMNS, add_columns, residual_index, clear_cache as clear_features
+from fig_cache import frame_digest
+from ingest import dataset_version
+from regression import read_fit_tables
+from rollup import RollupAccumulator, read_rollup
+from snapshot import snapshot_is_current, read_snapshot
+
+# Read path shared by every dashboard session in the process. Slices are served with
+# parameterized SQL that hits the year/continent indexes (country uses the primary key),
+# and results are kept in a bounded LRU keyed by (slice, columns, dataset version), so
+# a rebuild of data.db is picked up automatically and never served stale.
+#
+# Data is handed out as Dataset handles: a shared, read-only frame plus a version token.
+# Figure caches key on the token instead of hashing the frame, so a lookup costs the
+# same at any data size.
+
+DB_PATH = "data/data.db"
+SNAPSHOT_PATH = "data/snapshot"
+SLICE_CACHE_SIZE = 256
+RESIDUAL_TOP_K = 6
+
+SLICE_COLUMNS = {"year": "year", "continent": "continent", "country": "country"}
+
+METRIC_COLUMNS = ["lifeexp", "pop", "gdppercap", "gdp", "log_pop", "log_gdppercap", "log_gdp"]
+FLOAT32 = os.environ.get("DATA_FLOAT32") == "1"
+# Metrics DATA_FLOAT32 leaves at float64: populations pass 2**24, where float32 stops
+# holding every integer
+FLOAT64_COLUMNS = ["pop"]
+# Column layout of this process's frames, part of every token so float32 and float64
+# processes never share cached figures or features
+LAYOUT = "float32" if FLOAT32 else "float64"
+
+SELECT = """
+SELECT country, continent, year, lifeexp, pop, gdppercap,
+       pop * gdppercap AS gdp
+FROM data
+"""
+
+
+class Dataset:
+    __slots__ = ("frame", "token")
+
+    def __init__(self, frame, token):
+        object.__setattr__(self, "frame", frame)
+        object.__setattr__(self, "token", token)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Dataset is immutable")
+
+    def __len__(self):
+        return len(self.frame)
+
+    def __repr__(self):
+        return f"Dataset(token={self.token!r}, rows={len(self.frame)})"
+
+
+# Fit tables (dict of name -> frame) tagged with the dataset version they came from.
+# `source` is the token of the full Dataset they were fitted on (None when unversioned).
+class FitTables(dict):
+    def __init__(self, tables, token, source=None):
+        super().__init__(tables)
+        self.token = token
+        self.source = source
+
+
+# Per-year top/bottom residual tables (year -> frame), holding k rows per side
+class ResidualIndex(dict):
+    def __init__(self, tables, token, k):
+        super().__init__(tables)
+        self.token = token
+        self.k = k
+
+
+# Builds not made by data_builder have no version, so fall back to a content digest,
+# computed once per load rather than per figure
+def _token(version, frame, *parts):
+    base = version if version is not None else frame_digest(frame)
+    return ":".join([base, LAYOUT, *map(str, parts)])
+
+
+@lru_cache(maxsize=None)
+def get_engine(db_path=DB_PATH):
+    return create_engine(f"sqlite:///{db_path}")
+
+
+def add_log_columns(df):
+    return add_columns(df, LOG_COLUMNS)
+
+
+# Canonical in-memory layout: country/continent as categoricals coded against the
+# country dimension (same codes as the snapshot), int16 years (monthly data keeps its
+# fractional years), and optionally float32
+# metrics (DATA_FLOAT32=1; halves the float columns at ~7 significant digits, except
+# FLOAT64_COLUMNS)
+def compact_frame(df, countries, float32=FLOAT32):
+    df = df.copy(deep=False)
+    if not isinstance(df["country"].dtype, pd.CategoricalDtype) or list(df["country"].cat.categories) != list(countries["country"].cat.categories):
+        df["country"] = pd.Categorical(df["country"], categories=countries["country"].cat.categories)
+    if not isinstance(df["continent"].dtype, pd.CategoricalDtype) or list(df["continent"].cat.categories) != list(countries["continent"].cat.categories):
+        df["continent"] = pd.Categorical(df["continent"], categories=countries["continent"].cat.categories)
+    if pd.api.types.is_integer_dtype(df["year"]) and df["year"].dtype != "int16":
+        df["year"] = df["year"].astype("int16")
+    if float32:
+        metrics = [c for c in METRIC_COLUMNS if c in df.columns and c not in FLOAT64_COLUMNS and df[c].dtype != "float32"]
+        df[metrics] = df[metrics].astype("float32")
+    return df
+
+
+# Bytes per column and per row of a frame (deep, so object strings are counted)
+def memory_report(df):
+    usage = df.memory_usage(index=False, deep=True)
+    report = pd.DataFrame({"dtype": df.dtypes.astype(str), "bytes": usage})
+    report["bytes_per_row"] = report["bytes"] / max(len(df), 1)
+    report.loc["total"] = ["", usage.sum(), usage.sum() / max(len(df), 1)]
+    return report
+
+
+# Rows for one year, continent or country
+def get_slice(kind, value, columns=None, db_path=DB_PATH):
+    if kind not in SLICE_COLUMNS:
+        raise ValueError(f"Unknown slice kind {kind!r}, expected one of {list(SLICE_COLUMNS)}")
+    columns = tuple(columns) if columns is not None else None
+    metrics.inc("data_cache_requests_total", cache="slice")
+    return _cached_slice(kind, value, columns, dataset_version(db_path), db_path)
+
+
+@lru_cache(maxsize=SLICE_CACHE_SIZE)
+def _cached_slice(kind, value, columns, version, db_path):
+    metrics.inc("data_cache_misses_total", cache="slice")
+    q = SELECT + f"WHERE {SLICE_COLUMNS[kind]} = :value ORDER BY country, year"
+    with metrics.span("data_load_seconds", source="slice_sql"), get_engine(db_path).connect() as conn:
+        df = pd.read_sql(text(q), conn, params={"value": value})
+    df = compact_frame(add_log_columns(df), _cached_countries(version, db_path))
+    df = df[list(columns)] if columns is not None else df
+    return Dataset(df, _token(version, df, kind, value, columns))
+
+
+def get_years(db_path=DB_PATH):
+    return _cached_years(dataset_version(db_path), db_path)
+
+
+@lru_cache(maxsize=4)
+def _cached_years(version, db_path):
+    with get_engine(db_path).connect() as conn:
+        return [r[0] for r in conn.execute(text("SELECT DISTINCT year FROM data ORDER BY year"))]
+
+
+# Whole table, from the memory-mapped snapshot when it matches the database
+def get_full(db_path=DB_PATH, snapshot_path=SNAPSHOT_PATH):
+    metrics.inc("data_cache_requests_total", cache="full")
+    return _cached_full(dataset_version(db_path), db_path, snapshot_path)
+
+
+@lru_cache(maxsize=2)
+def _cached_full(version, db_path, snapshot_path):
+    metrics.inc("data_cache_misses_total", cache="full")
+    if snapshot_is_current(snapshot_path, db_path):
+        with metrics.span("data_load_seconds", source="snapshot"):
+            df = read_snapshot(snapshot_path)
+    else:
+        with metrics.span("data_load_seconds", source="full_sql"), get_engine(db_path).connect() as conn:
+            df = pd.read_sql(text(SELECT + "ORDER BY country, year"), conn)
+        df = add_log_columns(df)
+    # A current snapshot is already in the canonical layout, so this keeps it memory-mapped
+    # unless float32 is requested
+    df = compact_frame(df, _cached_countries(version, db_path))
+    return Dataset(df, _token(version, df, "full"))
+
+
+# Country dimension: one row per country with its continent, both categorical
+def get_countries(db_path=DB_PATH):
+    return _cached_countries(dataset_version(db_path), db_path)
+
+
+@lru_cache(maxsize=2)
+def _cached_countries(version, db_path):
+    with get_engine(db_path).connect() as conn:
+        try:
+            dim = pd.read_sql(text("SELECT country, continent FROM countries ORDER BY country"), conn)
+        except (OperationalError, DatabaseError):
+            # Databases built by data.py have no dimension table
+            dim = pd.read_sql(text("SELECT country, MIN(continent) AS continent FROM data GROUP BY country ORDER BY country"), conn)
+        continents = sorted(r[0] for r in conn.execute(text("SELECT DISTINCT continent FROM data WHERE continent IS NOT NULL")))
+    dim["country"] = pd.Categorical(dim["country"], categories=dim["country"].tolist())
+    dim["continent"] = pd.Categorical(dim["continent"], categories=continents)
+    return dim
+
+
+# Trend/slope fits precomputed by data_builder.build_db
+def get_fits(db_path=DB_PATH):
+    metrics.inc("data_cache_requests_total", cache="fits")
+    return _cached_fits(dataset_version(db_path), db_path)
+
+
+@lru_cache(maxsize=2)
+def _cached_fits(version, db_path):
+    metrics.inc("data_cache_misses_total", cache="fits")
+    with metrics.span("data_load_seconds", source="fits"), get_engine(db_path).connect() as conn:
+        tables = read_fit_tables(conn)
+    if version is None:
+        # Nothing ties an unversioned build's fits to its data, so builders refit live
+        return FitTables(tables, repr(sorted((k, frame_digest(v)) for k, v in tables.items())))
+    return FitTables(tables, version, source=_token(version, None, "full"))
+
+
+# Over/under-performers of every year, built once per dataset version
+def get_residual_index(k=RESIDUAL_TOP_K, db_path=DB_PATH, snapshot_path=SNAPSHOT_PATH):
+    metrics.inc("data_cache_requests_total", cache="residuals")
+    return _cached_residual_index(dataset_version(db_path), db_path, snapshot_path, k)
+
+
+@lru_cache(maxsize=2)
+def _cached_residual_index(version, db_path, snapshot_path, k):
+    metrics.inc("data_cache_misses_total", cache="residuals")
+    data = _cached_full(version, db_path, snapshot_path)
+    with metrics.span("data_load_seconds", source="residuals"):
+        tables = residual_index(data, k)
+    return ResidualIndex(tables, _token(data.token, None, "residuals", k), k)
+
+
+# Continent x year rollup cube written by data_builder (built from the full table once
+# per version when the database predates it)
+def get_rollup(db_path=DB_PATH, snapshot_path=SNAPSHOT_PATH):
+    metrics.inc("data_cache_requests_total", cache="rollup")
+    return _cached_rollup(dataset_version(db_path), db_path, snapshot_path)
+
+
+@lru_cache(maxsize=2)
+def _cached_rollup(version, db_path, snapshot_path):
+    metrics.inc("data_cache_misses_total", cache="rollup")
+    # Unversioned builds borrow the full frame's content digest
+    token = _token(version, None, "rollup") if version is not None else _cached_full(version, db_path, snapshot_path).token + ":rollup"
+    with metrics.span("data_load_seconds", source="rollup"), get_engine(db_path).connect() as conn:
+        cube = read_rollup(conn, token)
+    if cube is None:
+        acc = RollupAccumulator()
+        acc.add(_cached_full(version, db_path, snapshot_path).frame)
+        cube = acc.result(token)
+    return cube
+
+
+def clear_cache():
+    _cached_slice.cache_clear()
+    _cached_years.cache_clear()
+    _cached_full.cache_clear()
+    _cached_fits.cache_clear()
+    _cached_countries.cache_clear()
+    _cached_residual_index.cache_clear()
+    _cached_rollup.cache_clear()
+    clear_features()
+
+
+if __name__ == "__main__":
+    print(memory_report(get_full().frame))
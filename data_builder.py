@@ -1,45 +1,275 @@
+import hashlib
+import time
 import pandas as pd
 import sqlite3
+import metrics
 from sqlalchemy import create_engine, text
+from ingest import SCHEMA, create_table, stream_csv, iter_line_chunks, parse_chunk, upsert_chunk
+from ingest import INCREMENTAL_CHUNK_LINES, fingerprint_csv, record_keys, write_meta, dataset_version
+from features import LOG_COLUMNS, add_columns
+from regression import FIT_TABLES, FitAccumulator
+from rollup import RollupAccumulator, write_rollup, read_rollup
+from snapshot import SnapshotWriter, snapshot_is_current, patch_snapshot, read_snapshot
 
-def build_db(csv_path="data/gapminder_data.csv", db_path="data/data.db", table="data"):
-    df = pd.read_csv(csv_path)
-    df.columns = [c.strip().lower() for c in df.columns]
-
-    dtype_map = {
-        "country": "TEXT",
-        "continent": "TEXT",
-        "year": "INTEGER",
-        "lifeexp": "REAL",
-        "pop": "INTEGER",
-        "gdppercap": "REAL"
-    }
+# Gapminder only has 'Americas'; these countries are split out into North/South America
+CONTINENT_FIXES = {
+    "North America": [
+        'Canada','United States','Mexico','Cuba','Dominican Republic','Haiti',
+        'Jamaica','Trinidad and Tobago','Costa Rica','Panama','Honduras',
+        'Guatemala','El Salvador','Nicaragua','Belize','Puerto Rico'
+    ],
+    "South America": [
+        'Brazil','Argentina','Chile','Uruguay','Paraguay','Bolivia',
+        'Peru','Ecuador','Colombia','Venezuela','Guyana','Suriname'
+    ],
+}
+
+def build_db(csv_path="data/gapminder_data.csv", db_path="data/data.db", table="data", snapshot_path="data/snapshot", chunksize=None, incremental=False):
     engine = create_engine(f"sqlite:///{db_path}")
-    with engine.begin() as conn:
-        cols = ", ".join([f"{k} {v}" for k, v in dtype_map.items()])
-        conn.execute(text(f"DROP TABLE IF EXISTS {table}"))
-        conn.execute(text(f"CREATE TABLE {table} ({cols}, PRIMARY KEY(country, year))"))
-        df.to_sql(table, conn, if_exists="append", index=False)
-        conn.execute(text(f"CREATE INDEX IF NOT EXISTS idx_{table}_continent ON {table}(continent)"))
-        conn.execute(text(f"CREATE INDEX IF NOT EXISTS idx_{table}_year ON {table}(year)"))
-
-    sql = """
-    UPDATE data
-    SET continent = 'North America'
-    WHERE continent = 'Americas' AND country IN (
-      'Canada','United States','Mexico','Cuba','Dominican Republic','Haiti',
-      'Jamaica','Trinidad and Tobago','Costa Rica','Panama','Honduras',
-      'Guatemala','El Salvador','Nicaragua','Belize','Puerto Rico'
-    );
-    UPDATE data
-    SET continent = 'South America'
-    WHERE continent = 'Americas' AND country IN (
-      'Brazil','Argentina','Chile','Uruguay','Paraguay','Bolivia',
-      'Peru','Ecuador','Colombia','Venezuela','Guyana','Suriname'
-    );
+
+    if incremental and dataset_version(db_path) is not None:
+        # Derived tables and the snapshot can only be patched if they describe the data as it was
+        current = snapshot_is_current(snapshot_path, db_path)
+        changes = update_db(csv_path, db_path, table, chunksize or INCREMENTAL_CHUNK_LINES)
+        if changes is not None:
+            removed, added = changes
+            if not current or not update_derived(engine, table, snapshot_path, removed, added):
+                # Streamed, so a refresh never holds the whole table in memory
+                write_derived(engine, table, snapshot_path, chunksize or INCREMENTAL_CHUNK_LINES)
+            metrics.flush()
+            return
+        print(f"{db_path} has no chunk keys to update from, rebuilding {table} from scratch")
+
+    if chunksize:
+        # Streaming mode: bounded memory, one transaction for the whole load
+        with metrics.span("build_stage_seconds", stage="load_csv"), sqlite3.connect(db_path) as con:
+            create_table(con, table)
+            stream_csv(csv_path, con, table, chunksize)
+            con.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_continent ON {table}(continent)")
+            con.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_year ON {table}(year)")
+    else:
+        with metrics.span("build_stage_seconds", stage="read_csv"):
+            df = pd.read_csv(csv_path)
+        df.columns = [c.strip().lower() for c in df.columns]
+        # Extra indicator columns (e.g. from synth.py) are not part of the table
+        df = df[list(SCHEMA)]
+
+        with metrics.span("build_stage_seconds", stage="load_csv"), engine.begin() as conn:
+            cols = ", ".join([f"{k} {v}" for k, v in SCHEMA.items()])
+            conn.execute(text(f"DROP TABLE IF EXISTS {table}"))
+            conn.execute(text(f"CREATE TABLE {table} ({cols}, PRIMARY KEY(country, year))"))
+            df.to_sql(table, conn, if_exists="append", index=False)
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS idx_{table}_continent ON {table}(continent)"))
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS idx_{table}_year ON {table}(year)"))
+
+    sql = ""
+    for continent, countries in CONTINENT_FIXES.items():
+        names = ", ".join(f"'{c}'" for c in countries)
+        sql += f"UPDATE {table} SET continent = '{continent}' WHERE continent = 'Americas' AND country IN ({names});\n"
+    with metrics.span("build_stage_seconds", stage="reclassify"), sqlite3.connect(db_path) as con:
+        con.executescript(sql)
+        chunk_lines = chunksize or INCREMENTAL_CHUNK_LINES
+        shas, version = fingerprint_csv(csv_path, chunk_lines, con)
+        write_meta(con, shas, version, chunk_lines)
+
+    write_derived(engine, table, snapshot_path, chunksize)
+    metrics.flush()
+
+
+# Same frame the dashboard loads: gdp and log columns computed once at build time.
+# Yields the whole table at once, or chunks of chunksize rows in streaming mode.
+def iter_frame(engine, table="data", chunksize=None, year_dtype="int16"):
+    q = f"""
+    SELECT country, continent, year, lifeexp, pop, gdppercap,
+           pop * gdppercap AS gdp
+    FROM {table}
+    ORDER BY country, year
     """
+    chunks = pd.read_sql(text(q), engine, chunksize=chunksize) if chunksize else [pd.read_sql(text(q), engine)]
+    for df in chunks:
+        with metrics.span("build_stage_seconds", stage="derive"):
+            df = derive(df, year_dtype)
+        yield df
+
+
+# Fixed dtypes so every chunk lands in the same snapshot column type, plus the log columns.
+# Frames without gdp (rows from update_db) get it computed like the SQL above does.
+def derive(df, year_dtype="int16"):
+    if "gdp" not in df.columns:
+        df = df.assign(gdp=df["pop"].astype("float64") * df["gdppercap"].astype("float64"))
+    df = df.astype({"year": year_dtype, "pop": "float64", "gdppercap": "float64", "lifeexp": "float64", "gdp": "float64"})
+    return add_columns(df, LOG_COLUMNS)
+
+
+# Materialize the country dimension, the trend/slope fits and continent x year rollup used
+# by fig_builder and the columnar snapshot used by the dashboard, in a single pass over the table
+def write_derived(engine, table="data", snapshot_path="data/snapshot", chunksize=None):
+    with engine.begin() as conn:
+        # One row per country; its position is the country code used by the snapshot
+        # and by data_access's categoricals
+        conn.execute(text("DROP TABLE IF EXISTS countries"))
+        conn.execute(text(f"""
+            CREATE TABLE countries AS
+            SELECT country, MIN(continent) AS continent FROM {table}
+            WHERE country IS NOT NULL GROUP BY country ORDER BY country
+        """))
+        rows = conn.execute(text(f"SELECT COUNT(*) FROM {table}")).scalar()
+        # Monthly data (synth.py --monthly) has fractional years, which int16 would truncate
+        fractional = conn.execute(text(f"SELECT EXISTS (SELECT 1 FROM {table} WHERE year <> CAST(year AS INTEGER))")).scalar()
+        categories = {
+            "country": [r[0] for r in conn.execute(text("SELECT country FROM countries ORDER BY country"))],
+            "continent": [r[0] for r in conn.execute(text(f"SELECT DISTINCT continent FROM {table} WHERE continent IS NOT NULL ORDER BY continent"))],
+        }
+
+    writer = SnapshotWriter(snapshot_path, rows, categories, dataset_version(engine.url.database))
+    fits = FitAccumulator()
+    rollup = RollupAccumulator()
+    for df in iter_frame(engine, table, chunksize, "float64" if fractional else "int16"):
+        metrics.inc("build_rows_total", len(df))
+        with metrics.span("build_stage_seconds", stage="fits"):
+            fits.add(df)
+        with metrics.span("build_stage_seconds", stage="rollup"):
+            rollup.add(df)
+        with metrics.span("build_stage_seconds", stage="snapshot"):
+            writer.append(df)
+    writer.close()
+
+    with metrics.span("build_stage_seconds", stage="write_derived"), engine.begin() as conn:
+        fits.write(conn)
+        write_rollup(conn, rollup.result())
+
+
+# Rows of one fit group, for re-reading its x range after update_derived removed an end
+def _group_rows(conn, table, by, key, year_dtype):
+    where = "continent = :key" if by == "continent" else "year >= :key AND year < :key + 10"
+    q = f"SELECT country, continent, year, lifeexp, pop, gdppercap FROM {table} WHERE {where}"
+    return derive(pd.read_sql(text(q), conn, params={"key": key}), year_dtype)
+
+
+# Applies the rows update_db changed to everything write_derived builds, without
+# rereading the table: fit sums and rollup cells are additive, the country dimension is
+# refreshed for the countries touched, and the snapshot is merged with the changed rows.
+# Cost follows the size of the change (plus one copy of the snapshot arrays). Returns
+# False when the stored sums are missing (older data.db); build_db then runs write_derived.
+@metrics.span("build_stage_seconds", stage="update_derived")
+def update_derived(engine, table="data", snapshot_path="data/snapshot", removed=None, added=None):
+    year_dtype = read_snapshot(snapshot_path)["year"].dtype
+    removed, added = derive(removed, year_dtype), derive(added, year_dtype)
+    with engine.begin() as conn:
+        fits = FitAccumulator.read(conn)
+        cube = read_rollup(conn)
+        if fits is None or cube is None:
+            return False
+
+        affected = sorted(set(removed["country"]) | set(added["country"]))
+        for country in affected:
+            conn.execute(text("DELETE FROM countries WHERE country = :c"), {"c": country})
+            conn.execute(text(f"""
+                INSERT INTO countries SELECT country, MIN(continent) FROM {table}
+                WHERE country = :c GROUP BY country
+            """), {"c": country})
+        categories = {
+            "country": [r[0] for r in conn.execute(text("SELECT country FROM countries ORDER BY country"))],
+            "continent": [r[0] for r in conn.execute(text(f"SELECT DISTINCT continent FROM {table} WHERE continent IS NOT NULL ORDER BY continent"))],
+        }
+
+        for name, keys in fits.update(removed, added).items():
+            by, x, y = FIT_TABLES[name]
+            for key in keys:
+                rows = _group_rows(conn, table, by, key, year_dtype)[[x, y]].dropna()
+                fits.set_range(name, key, rows[x].min(), rows[x].max())
+        fits.write(conn)
+        write_rollup(conn, cube.updated(removed, added))
+
+    patch_snapshot(snapshot_path, removed, added, categories, dataset_version(engine.url.database))
+    return True
+
+# Same reclassification as the build SQL, applied only to the rows being upserted
+def reclassify(chunk):
+    chunk = chunk.copy()
+    for continent, countries in CONTINENT_FIXES.items():
+        chunk.loc[chunk["continent"].eq("Americas") & chunk["country"].isin(countries), "continent"] = continent
+    return chunk
+
+
+# Incremental refresh: only chunks whose fingerprint changed are parsed, and within them
+# only rows whose values changed are written (continents reclassified on those rows only).
+# Chunks that are gone from the CSV take the rows still keyed to them (source_keys) with
+# them, so edits, inserts and deletions anywhere in the file cost about the chunks they touch.
+# Assumes (country, year) is unique in the CSV, as the table's primary key requires.
+# Returns (removed, added): the old versions of rows that were changed or deleted and the
+# new versions of rows that were changed or inserted, for update_derived. None when the
+# database predates source_keys and needs a full build.
+@metrics.span("build_stage_seconds", stage="incremental")
+def update_db(csv_path="data/gapminder_data.csv", db_path="data/data.db", table="data", chunk_lines=INCREMENTAL_CHUNK_LINES):
+    start = time.perf_counter()
     with sqlite3.connect(db_path) as con:
-        con.executescript(sql)
+        if con.execute("SELECT 1 FROM sqlite_master WHERE name = 'source_keys'").fetchone() is None:
+            return None
+        stored = {sha for (sha,) in con.execute("SELECT sha FROM source_chunks")}
+
+        shas, written, parsed = [], 0, 0
+        removed, added = [], []
+        version = hashlib.sha256()
+        for idx, sha, header, body in iter_line_chunks(csv_path, chunk_lines):
+            shas.append((idx, sha))
+            if idx == 0:
+                version.update(header)
+            version.update(body)
+            if sha in stored:
+                continue
+            chunk = reclassify(parse_chunk(header, body))
+            old, new = changed_rows(stored_rows(con, table, chunk), chunk)
+            removed.append(old)
+            added.append(new)
+            written += upsert_chunk(con, chunk, table)
+            record_keys(con, sha, chunk)
+            parsed += 1
+
+        # Keys that moved to a new chunk were re-recorded above; the ones still on a
+        # dropped chunk are no longer in the CSV
+        dropped = [(sha,) for sha in stored - {sha for _, sha in shas}]
+        cols = ", ".join(SCHEMA)
+        for (sha,) in dropped:
+            removed.append(pd.read_sql(
+                f"SELECT {cols} FROM {table} WHERE (country, year) IN (SELECT country, year FROM source_keys WHERE chunk = ?)",
+                con, params=(sha,),
+            ))
+        before = con.total_changes
+        con.executemany(f"DELETE FROM {table} WHERE (country, year) IN (SELECT country, year FROM source_keys WHERE chunk = ?)", dropped)
+        deleted = con.total_changes - before
+        con.executemany("DELETE FROM source_keys WHERE chunk = ?", dropped)
+        written += deleted
+
+        write_meta(con, shas, version.hexdigest()[:16], chunk_lines)
+
+    elapsed = time.perf_counter() - start
+    print(f"Incremental update of {table}: {parsed}/{len(shas)} chunks changed, {written:,} rows written ({deleted:,} deleted) in {elapsed:.2f}s")
+    empty = pd.DataFrame(columns=list(SCHEMA))
+    return pd.concat([empty, *removed], ignore_index=True), pd.concat([empty, *added], ignore_index=True)
+
+
+# Stored rows with the same (country, year) keys as `chunk`
+def stored_rows(con, table, chunk):
+    con.execute("CREATE TEMP TABLE IF NOT EXISTS chunk_keys (country TEXT, year)")
+    con.execute("DELETE FROM temp.chunk_keys")
+    con.executemany("INSERT INTO temp.chunk_keys (country, year) VALUES (?, ?)", zip(chunk["country"].tolist(), chunk["year"].tolist()))
+    cols = ", ".join(f"d.{c}" for c in SCHEMA)
+    return pd.read_sql(f"SELECT {cols} FROM {table} d JOIN temp.chunk_keys k ON d.country = k.country AND d.year = k.year", con)
+
+
+# Rows of `chunk` that are new or differ from their stored version, and the stored
+# versions they replace. Same comparison as upsert_chunk (NULLs equal each other).
+def changed_rows(old, chunk):
+    keys = ["country", "year"]
+    merged = chunk.merge(old, on=keys, how="left", suffixes=("", "_old"), indicator=True)
+    same = merged["_merge"].eq("both").to_numpy()
+    for c in SCHEMA:
+        if c not in keys:
+            a, b = merged[c], merged[f"{c}_old"]
+            same = same & ((a == b) | (a.isna() & b.isna())).to_numpy()
+    added = chunk[~same]
+    return old.merge(added[keys], on=keys), added
 
 if __name__ == "__main__":
     build_db()
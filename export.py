@@ -0,0 +1,396 @@
+import argparse
+import gzip
+import html
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from plotly.offline import get_plotlyjs
+import data_access as da
+import warmup
+from ingest import dataset_version
+from options import PALETTES, TEXT_SIZES, THEMES, CATEGORIES, ROLLUP_PERIODS, TABS
+
+# Static export of the dashboard: every figure dashboard.py can show (each year x category
+# map, the bubble animation, the tab figures, per palette / text size / contrast setting),
+# pre-serialized and gzipped, plus one HTML page whose script fetches only the figures on
+# screen. The bundle needs no Python to serve; any static file server will do:
+#
+#   python export.py --out export && python -m http.server -d export 8000
+#
+# Figures come from the figure cache (warm-up output is reused, misses are built and
+# cached), so an export right after warm_up() mostly copies JSON. The bundle is written to
+# <out>.tmp and swapped in at the end, so a server never sees a half-written export.
+#
+#   export/index.html                 page, controls and the manifest
+#   export/app.js, plotly.min.js      client script, Plotly.js
+#   export/data.json.gz               raw data table (first MAX_RAW_ROWS rows)
+#   export/figures/<style>/<figure>[-<year>][-<option>].json.gz
+
+MAX_RAW_ROWS = 100_000
+
+def style_id(palette, text_size, theme):
+    return f"{palette}_{text_size}_{theme}"
+
+
+# Bundle-relative path of a warmup job's figure; app.js builds the same paths
+def figure_path(job):
+    name, year, option, (palette, text_size, text_color, background_color) = job
+    theme = next(t for t, colors in THEMES.items() if colors == (text_color, background_color))
+    suffix = "".join(f"-{part}" for part in (year, option) if part is not None)
+    return f"figures/{style_id(palette, text_size, theme)}/{name}{suffix}.json.gz"
+
+
+def write_gzip(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # mtime=0 so an unchanged figure gives an identical file (and ETag) on every export
+    with open(path, "wb") as f:
+        f.write(gzip.compress(data, 9, mtime=0))
+
+
+# Runs in a worker process: exports a batch of jobs. Returns [(name, json bytes, gzip bytes)].
+def export_jobs(jobs, out):
+    sizes = []
+    for job in jobs:
+        data = warmup.figure_json(job).encode()
+        path = os.path.join(out, figure_path(job))
+        write_gzip(path, data)
+        sizes.append((job[0], len(data), os.path.getsize(path)))
+    return sizes
+
+
+def manifest(years, text_sizes):
+    return {
+        "version": dataset_version(),
+        "exported": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "years": [int(y) if float(y).is_integer() else float(y) for y in years],
+        "palettes": [[label, value] for label, value in PALETTES.items()],
+        "textSizes": text_sizes,
+        "themes": {name: list(colors) for name, colors in THEMES.items()},
+        "categories": [[label, value] for label, value in CATEGORIES.items()],
+        "periods": [[label, value] for label, value in ROLLUP_PERIODS.items()],
+        "tabs": [{"label": label, "figures": figures} for label, _, _, figures in TABS],
+    }
+
+
+def render_page(meta):
+    tab_buttons = "".join(
+        f'<button class="tab" data-tab="{i}">{html.escape(label)}</button>' for i, (label, _, _, _) in enumerate(TABS)
+    )
+    tab_panels = "".join(
+        f'<section class="panel" data-tab="{i}" hidden><h4>{html.escape(heading)}</h4>'
+        + "".join(f'<p>{html.escape(" ".join(part.split()))}</p>' for part in text.split("\n\n"))
+        + f'<div class="controls" data-controls="{i}"></div>'
+        + "".join(f'<div class="figure" data-figure="{name}"></div>' for name in figures)
+        + "</section>"
+        for i, (_, heading, text, figures) in enumerate(TABS)
+    )
+    # The manifest sits in a JSON script tag, so nothing in it may close the tag
+    meta_json = json.dumps(meta).replace("<", "\\u003c")
+    return PAGE.replace("__TABS__", tab_buttons).replace("__PANELS__", tab_panels).replace("__MANIFEST__", meta_json)
+
+
+def export(out="export", text_sizes=None, workers=None, verbose=True):
+    start = time.perf_counter()
+    text_sizes = sorted(text_sizes or TEXT_SIZES)
+    years = da.get_years()
+    jobs = [j for j in warmup.enumerate_jobs(years) if j[3][1] in text_sizes]
+
+    tmp = out.rstrip("/") + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    # Jobs go out in batches so each worker loads the data once per batch, not per figure
+    workers = workers or os.cpu_count() or 1
+    batches = [jobs[i::workers * 4] for i in range(workers * 4)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        sizes = [s for batch in pool.map(export_jobs, batches, [tmp] * len(batches)) for s in batch]
+
+    frame = da.get_full().frame
+    write_gzip(os.path.join(tmp, "data.json.gz"), frame.head(MAX_RAW_ROWS).to_json(orient="split", index=False).encode())
+    meta = manifest(years, text_sizes)
+    meta["rawRows"] = len(frame)
+    with open(os.path.join(tmp, "index.html"), "w") as f:
+        f.write(render_page(meta))
+    with open(os.path.join(tmp, "app.js"), "w") as f:
+        f.write(APP_JS)
+    with open(os.path.join(tmp, "plotly.min.js"), "w") as f:
+        f.write(get_plotlyjs())
+
+    old = out.rstrip("/") + ".old"
+    shutil.rmtree(old, ignore_errors=True)
+    if os.path.exists(out):
+        os.replace(out, old)
+    os.replace(tmp, out)
+    shutil.rmtree(old, ignore_errors=True)
+
+    report = {"figures": len(sizes), "json_bytes": sum(s[1] for s in sizes), "gzip_bytes": sum(s[2] for s in sizes),
+              "elapsed_s": time.perf_counter() - start}
+    if verbose:
+        by_name = {}
+        for name, raw, packed in sizes:
+            count, total_raw, total_packed = by_name.get(name, (0, 0, 0))
+            by_name[name] = (count + 1, total_raw + raw, total_packed + packed)
+        for name, (count, raw, packed) in sorted(by_name.items()):
+            print(f"{name:<30} {count:>5} figures {raw / 2**20:>8.1f} MiB JSON {packed / 2**20:>7.1f} MiB gzip")
+        print(f"Exported {report['figures']} figures ({report['gzip_bytes'] / 2**20:.1f} MiB) to {out} in {report['elapsed_s']:.1f}s")
+    return report
+
+
+PAGE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>Bearibles UCL Challenge Submission</title>
+<link rel="icon" href="data:image/svg+xml,<svg xmlns='http://www.w3.org/2000/svg' viewBox='0 0 100 100'><text y='.9em' font-size='90'>🗺️</text></svg>">
+<style>
+:root { --text: #DAE7FF; --bg: #0E1117; --size: 17px; }
+body { margin: 0; padding: 0.5rem 2rem; background: var(--bg); color: var(--text); font: var(--size) "Source Sans Pro", sans-serif; }
+body.dyslexia, body.dyslexia * { font-family: "Atkinson Hyperlegible", sans-serif !important; font-weight: 700 !important; }
+h1 { text-align: center; margin: 0 0 10px; font-size: calc(var(--size) * 4); }
+h2 { font-size: calc(var(--size) * 2); margin: 0 0 0.25rem; }
+h4 { font-size: calc(var(--size) * 1.3); }
+hr { border: 0; border-top: 1px solid rgba(250, 250, 250, 0.2); margin: 1.5rem 0; }
+header { display: flex; align-items: center; }
+header h1 { flex: 1; }
+details.settings { position: relative; }
+details.settings > summary { list-style: none; cursor: pointer; font-size: 1.5em; }
+details.settings > div { position: absolute; right: 0; z-index: 10; width: 18rem; padding: 1rem; background: var(--bg); border: 1px solid rgba(250, 250, 250, 0.2); border-radius: 0.5rem; }
+label { display: block; margin: 0.5rem 0; }
+select, input[type=range] { width: 100%; }
+.controls, .map-controls { display: flex; gap: 2rem; }
+.map-controls > label { flex: 1; }
+.map-controls > label:first-child { max-width: 30%; }
+.tabs { display: flex; flex-wrap: wrap; gap: 0.25rem; border-bottom: 1px solid rgba(250, 250, 250, 0.2); }
+.tab { background: none; border: 0; color: inherit; font: inherit; padding: 0.5rem 0.75rem; cursor: pointer; }
+.tab[aria-selected=true] { border-bottom: 2px solid #ff4b4b; }
+.figure { min-height: 450px; }
+.figure.error { min-height: 0; color: #ff4b4b; }
+table { border-collapse: collapse; font-size: 0.8em; }
+td, th { padding: 0.1rem 0.5rem; border-bottom: 1px solid rgba(250, 250, 250, 0.1); text-align: right; }
+</style>
+</head>
+<body>
+<header>
+  <h1>Gapminder Economics Dashboard</h1>
+  <details class="settings"><summary title="Accessibility options">⚙️</summary><div>
+    <h3>🧩 Accessibility Options</h3>
+    <label>Color Palette <select id="palette"></select></label>
+    <label>Text Size <output id="text-step">3</output><input type="range" id="text-size" min="1" max="5" value="3"></label>
+    <label><input type="checkbox" id="dyslexia"> Dyslexia-friendly font</label>
+    <label><input type="checkbox" id="high-contrast"> High Contrast Mode</label>
+  </div></details>
+</header>
+<hr>
+<h4 id="map-title"></h4>
+<p id="map-desc"></p>
+<div class="map-controls">
+  <label>Select a Year <output id="year-label"></output><input type="range" id="year" min="0"></label>
+  <label>Select a category <select id="category"></select></label>
+</div>
+<div class="figure" id="map"></div>
+<hr>
+<h2>Life Expectancy vs GDP per capita</h2>
+<p>This view shows how how life expectancy vs income evolves for each country over time.
+Click play to see how the average life expectancy and GDP per capita vastly increase for each country over time.
+This improvement was not just in rich countries; almost all countries see an increase in life expectancy over time</p>
+<div class="figure" id="bubble"></div>
+<div class="tabs" role="tablist">__TABS__</div>
+__PANELS__
+<details id="raw"><summary>🔍 View Raw Data</summary><div id="raw-table"></div></details>
+<script id="manifest" type="application/json">__MANIFEST__</script>
+<script src="plotly.min.js"></script>
+<script src="app.js"></script>
+</body>
+</html>
+"""
+
+APP_JS = r"""// Client for the static export: draws the figures on screen from figures/<style>/...,
+// fetching each one the first time it is needed
+(function () {
+  "use strict";
+  const M = JSON.parse(document.getElementById("manifest").textContent);
+  const $ = (id) => document.getElementById(id);
+  const last = (a) => a[a.length - 1];
+  const esc = (v) => String(v ?? "").replace(/[&<>"]/g, (c) => ({ "&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;" })[c]);
+  const state = {
+    palette: M.palettes[0][1], step: Math.ceil(M.textSizes.length / 2), highContrast: false, dyslexia: false,
+    year: last(M.years), category: M.categories[0][1], tab: 0, residYear: last(M.years), period: M.periods[0][1],
+  };
+  const cache = new Map();
+
+  // Figure files are gzipped; a server that sends them with Content-Encoding has already
+  // inflated them, so only gzip bytes go through DecompressionStream
+  function load(path) {
+    if (!cache.has(path)) {
+      const p = fetch(path).then(async (r) => {
+        if (!r.ok) throw new Error(`${r.status} ${path}`);
+        let bytes = new Uint8Array(await r.arrayBuffer());
+        if (bytes[0] === 0x1f && bytes[1] === 0x8b) {
+          const stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream("gzip"));
+          bytes = new Uint8Array(await new Response(stream).arrayBuffer());
+        }
+        return JSON.parse(new TextDecoder().decode(bytes));
+      });
+      p.catch(() => cache.delete(path));
+      cache.set(path, p);
+    }
+    return cache.get(path);
+  }
+
+  function styleId() {
+    return `${state.palette}_${M.textSizes[state.step - 1]}_${state.highContrast ? "high_contrast" : "default"}`;
+  }
+
+  function figurePath(name, ...parts) {
+    return `figures/${styleId()}/${name}${parts.map((p) => "-" + p).join("")}.json.gz`;
+  }
+
+  // Figures stretch to their container, as st.plotly_chart(use_container_width=True) does
+  async function show(div, name, ...parts) {
+    const path = figurePath(name, ...parts);
+    div.dataset.path = path;
+    try {
+      const fig = structuredClone(await load(path));
+      if (div.dataset.path !== path) return;
+      delete fig.layout.width;
+      fig.layout.autosize = true;
+      div.classList.remove("error");
+      await Plotly.newPlot(div, { data: fig.data, layout: fig.layout, frames: fig.frames || [], config: { responsive: true, displaylogo: false } });
+    } catch (e) {
+      if (div.dataset.path !== path) return;
+      Plotly.purge(div);
+      div.classList.add("error");
+      div.textContent = `Could not load ${path}: ${e.message}`;
+    }
+  }
+
+  function options(select, pairs, value) {
+    select.innerHTML = "";
+    for (const [label, v] of pairs) select.add(new Option(label, v, false, v === value));
+  }
+
+  function yearSlider(input, label, value, onChange) {
+    input.max = M.years.length - 1;
+    input.value = M.years.indexOf(value);
+    label.textContent = value;
+    input.addEventListener("input", () => {
+      label.textContent = M.years[input.value];
+      onChange(M.years[input.value]);
+    });
+  }
+
+  function drawMap() {
+    const label = M.categories.find((c) => c[1] === state.category)[0];
+    $("map-title").textContent = `${label} Map`;
+    $("map-desc").textContent = `This map shows how each country's ${label.toLowerCase()} change over time for the selected category. ` +
+      "Use the slider to move between years and the dropdown to switch between metrics such as population, life expectancy, GDP per capita, or total GDP. " +
+      "Darker shades represent higher values within the chosen metric for that year.";
+    show($("map"), "make_choropleth", state.year, state.category);
+  }
+
+  // Only the open tab's figures are fetched
+  function drawTab() {
+    document.querySelectorAll(".tab").forEach((b) => b.setAttribute("aria-selected", String(+b.dataset.tab === state.tab)));
+    document.querySelectorAll(".panel").forEach((p) => { p.hidden = +p.dataset.tab !== state.tab; });
+    const panel = document.querySelector(`.panel[data-tab="${state.tab}"]`);
+    panel.querySelectorAll(".figure").forEach((div) => {
+      const name = div.dataset.figure;
+      if (name === "make_latest_residual_bars") show(div, name, state.residYear);
+      else if (name === "make_rollup_trends") show(div, name, state.period);
+      else show(div, name);
+    });
+  }
+
+  function applyStyle() {
+    const [text, bg] = M.themes[state.highContrast ? "high_contrast" : "default"];
+    const root = document.documentElement.style;
+    root.setProperty("--text", text);
+    root.setProperty("--bg", bg);
+    root.setProperty("--size", `${M.textSizes[state.step - 1]}px`);
+    document.body.classList.toggle("dyslexia", state.dyslexia);
+    if (state.dyslexia && !$("dyslexia-font")) {
+      const link = document.createElement("link");
+      link.id = "dyslexia-font";
+      link.rel = "stylesheet";
+      link.href = "https://fonts.googleapis.com/css2?family=Atkinson+Hyperlegible:wght@400;700&display=swap";
+      document.head.appendChild(link);
+    }
+  }
+
+  function redraw() {
+    applyStyle();
+    drawMap();
+    show($("bubble"), "make_bubble");
+    drawTab();
+  }
+
+  function controls() {
+    options($("palette"), M.palettes, state.palette);
+    $("text-size").max = M.textSizes.length;
+    $("text-size").value = state.step;
+    $("text-step").textContent = state.step;
+    $("palette").addEventListener("change", (e) => { state.palette = e.target.value; redraw(); });
+    $("text-size").addEventListener("input", (e) => {
+      state.step = +e.target.value;
+      $("text-step").textContent = state.step;
+      redraw();
+    });
+    $("high-contrast").addEventListener("change", (e) => { state.highContrast = e.target.checked; redraw(); });
+    $("dyslexia").addEventListener("change", (e) => { state.dyslexia = e.target.checked; applyStyle(); });
+
+    yearSlider($("year"), $("year-label"), state.year, (y) => { state.year = y; drawMap(); });
+    options($("category"), M.categories, state.category);
+    $("category").addEventListener("change", (e) => { state.category = e.target.value; drawMap(); });
+
+    document.querySelectorAll(".tab").forEach((b) => b.addEventListener("click", () => { state.tab = +b.dataset.tab; drawTab(); }));
+
+    // Residuals year slider and Continent Summary period toggle
+    M.tabs.forEach((tab, i) => {
+      const box = document.querySelector(`[data-controls="${i}"]`);
+      if (tab.figures.includes("make_latest_residual_bars")) {
+        box.innerHTML = '<label>Residuals for year <output></output><input type="range" min="0"></label>';
+        yearSlider(box.querySelector("input"), box.querySelector("output"), state.residYear, (y) => { state.residYear = y; drawTab(); });
+      }
+      if (tab.figures.includes("make_rollup_trends")) {
+        for (const [label, value] of M.periods) {
+          const l = document.createElement("label");
+          l.innerHTML = `<input type="radio" name="period" value="${value}"${value === state.period ? " checked" : ""}> ${label}`;
+          l.querySelector("input").addEventListener("change", () => { state.period = value; drawTab(); });
+          box.appendChild(l);
+        }
+      }
+    });
+
+    $("raw").addEventListener("toggle", rawTable, { once: true });
+  }
+
+  // Raw data, loaded when the expander is first opened
+  async function rawTable() {
+    const box = $("raw-table");
+    try {
+      const table = await load("data.json.gz");
+      const shown = table.data.slice(0, 1000);
+      const head = "<tr>" + table.columns.map((c) => `<th>${esc(c)}</th>`).join("") + "</tr>";
+      const rows = shown.map((r) => "<tr>" + r.map((v) => `<td>${esc(v)}</td>`).join("") + "</tr>").join("");
+      box.innerHTML = `<p>${shown.length.toLocaleString()} of ${M.rawRows.toLocaleString()} rows</p><table>${head}${rows}</table>`;
+    } catch (e) {
+      box.textContent = `Could not load data.json.gz: ${e.message}`;
+    }
+  }
+
+  controls();
+  redraw();
+})();
+"""
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the dashboard as a static site")
+    parser.add_argument("--out", default="export", help="output directory (default export/)")
+    parser.add_argument("--text-sizes", type=int, nargs="+", default=None, help=f"font sizes to export (default all: {' '.join(map(str, TEXT_SIZES))})")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    args = parser.parse_args()
+    export(args.out, args.text_sizes, args.workers)
@@ -0,0 +1,161 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import metrics
+from regression import grouped_ols
+
+# Registry of derived columns (gdp, log transforms, decade bucket, residuals). Each one is
+# a function of other columns, computed lazily the first time it is asked for and kept
+# per dataset version (the Dataset token), so every builder and every session shares one
+# read-only array instead of recomputing it on its own copy of the frame.
+
+FEATURES = {}
+FEATURE_CACHE_SIZE = 64
+
+LOG_COLUMNS = ["log_pop", "log_gdppercap", "log_gdp"]
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def feature(name):
+    def register(fn):
+        FEATURES[name] = fn
+        return fn
+    return register
+
+
+# Feature functions take `col`, which returns any base column or other feature as an array
+
+@feature("gdp")
+def _gdp(col):
+    return col("pop") * col("gdppercap")
+
+
+@feature("log_pop")
+def _log_pop(col):
+    return np.log10(col("pop"))
+
+
+@feature("log_gdppercap")
+def _log_gdppercap(col):
+    return np.log10(col("gdppercap"))
+
+
+@feature("log_gdp")
+def _log_gdp(col):
+    return np.log10(col("gdp"))
+
+
+@feature("decade")
+def _decade(col):
+    return (col("year") // 10) * 10
+
+
+# Life expectancy minus that year's OLS fit on log GDP per capita
+@feature("resid")
+def _resid(col):
+    d = pd.DataFrame({"year": col("year"), "x": col("log_gdppercap"), "y": col("lifeexp")}, copy=False)
+    fit = grouped_ols(d, "year", "x", "y").set_index("year")
+    slope = fit["slope"].reindex(d["year"]).to_numpy()
+    intercept = fit["intercept"].reindex(d["year"]).to_numpy()
+    return d["y"].to_numpy() - (slope * d["x"].to_numpy() + intercept)
+
+
+# One column of a Dataset (or plain DataFrame) as a read-only array. Base columns are
+# returned as they are; features are computed once per token and cached.
+def column(data, name):
+    frame = getattr(data, "frame", data)
+    if name in frame.columns:
+        return frame[name].to_numpy()
+    if name not in FEATURES:
+        raise KeyError(f"Unknown column or feature {name!r}")
+
+    # Plain frames have no token, so their features are computed but not kept
+    token = getattr(data, "token", None)
+    key = (token, name)
+    if token is not None:
+        with _lock:
+            if key in _cache:
+                _cache.move_to_end(key)
+                metrics.inc("feature_cache_lookups_total", feature=name, result="hit")
+                return _cache[key]
+        metrics.inc("feature_cache_lookups_total", feature=name, result="miss")
+
+    with metrics.span("feature_compute_seconds", feature=name):
+        values = np.asarray(FEATURES[name](lambda dep: column(data, dep)))
+    values.flags.writeable = False
+
+    if token is not None:
+        with _lock:
+            _cache[key] = values
+            while len(_cache) > FEATURE_CACHE_SIZE:
+                _cache.popitem(last=False)
+    return values
+
+
+# The frame's columns plus the named features, without copying any of them
+def view(data, names=()):
+    frame = getattr(data, "frame", data)
+    cols = {c: frame[c] for c in frame.columns}
+    for name in names:
+        if name not in cols:
+            cols[name] = column(data, name)
+    out = pd.DataFrame(cols, index=frame.index, copy=False)
+    # Keeps the data's version token, so regression.lookup_fit can match stored fits
+    token = getattr(data, "token", None)
+    if token is not None:
+        out.attrs.update(token=token, rows=len(frame))
+    return out
+
+
+# Writes features into a frame the caller owns (build and load time)
+def add_columns(df, names):
+    for name in names:
+        df[name] = FEATURES[name](lambda dep: column(df, dep))
+    return df
+
+
+def clear_cache():
+    with _lock:
+        _cache.clear()
+
+
+# Top-k over-performers and bottom-k under-performers (by residual) for every year.
+# Rows are laid out in a (year, row) matrix and ranked with one argpartition per side,
+# so only the k winners of each year are ever sorted. Returns {year: frame}.
+def residual_index(data, k=6):
+    frame = getattr(data, "frame", data)
+    resid = column(data, "resid")
+    years, codes = np.unique(column(data, "year"), return_inverse=True)
+
+    # Position of each row within its year
+    counts = np.bincount(codes, minlength=len(years))
+    order = np.argsort(codes, kind="stable")
+    pos = np.arange(len(order)) - np.repeat(np.cumsum(counts) - counts, counts)
+    rows = np.full((len(years), counts.max() if len(counts) else 0), -1)
+    rows[codes[order], pos] = order
+    values = np.where(rows >= 0, resid[rows], np.nan)
+
+    kk = min(k, rows.shape[1])
+    sides = {}
+    for group, sign in (("Over perform", 1.0), ("Under perform", -1.0)):
+        ranked = np.where(np.isnan(values), -np.inf, sign * values)
+        top = np.argpartition(ranked, -kk, axis=1)[:, -kk:] if kk else np.empty((len(years), 0), dtype=int)
+        top = np.take_along_axis(top, np.argsort(-np.take_along_axis(ranked, top, axis=1), axis=1), axis=1)
+        keep = np.isfinite(np.take_along_axis(ranked, top, axis=1))
+        sides[group] = (np.take_along_axis(rows, top, axis=1), keep)
+
+    country = frame["country"].to_numpy()
+    continent = frame["continent"].to_numpy()
+    index = {}
+    for i, year in enumerate(years.tolist()):
+        picked = [(group, r[i][keep[i]]) for group, (r, keep) in sides.items()]
+        index[year] = pd.DataFrame({
+            "country": np.concatenate([country[r] for _, r in picked]),
+            "continent": np.concatenate([continent[r] for _, r in picked]),
+            "resid": np.concatenate([resid[r] for _, r in picked]),
+            "group": np.concatenate([[group] * len(r) for group, r in picked]),
+        })
+    return index
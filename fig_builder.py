@@ -2,18 +2,18 @@ import plotly.express as px
 import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
-import streamlit as st
-
+import figure_spec
+from regression import fit_line, lookup_fit
+from fig_cache import cached_figure
+from density import bin_points, DENSITY_THRESHOLD
+from features import residual_index
+from rollup import WORLD
 
 
 # Removes zoom and pan features from figure
 def remove_fig_features(fig):
     fig.update_layout(dragmode=False)  # disables click-drag interaction
-    fig.update_layout(
-        modebar_remove=[
-            "zoom", "zoomIn", "zoomOut", "pan", "select", "lasso2d", "autoScale", "resetGeo"
-        ]
-    )
+    fig.update_layout(modebar_remove=figure_spec.MODEBAR_REMOVE)
     return fig
 
 def discrete_color_map(palette, n):
@@ -35,8 +35,94 @@ def discrete_color_map(palette, n):
 
 
 # Cloropleth/Map Plot
-@st.cache_data(show_spinner=False)
+CHOROPLETH_LABELS = {
+    'pop': 'Population',
+    'gdppercap': 'GDP Per Capita ',
+    'log_pop': 'Population (Log Scale)',
+    'lifeexp': 'Life Expectancy',
+    'log_gdppercap': 'GDP Per Capita (Log Scale)',
+    'log_gdp': 'GDP (Log Scale)'
+}
+
+CHOROPLETH_HOVER = {
+    "lifeexp": ":.1f",
+    "pop": ":,",
+    "gdppercap": ":.0f",
+    "continent": True,
+    "log_pop": False
+}
+
+# Same figure as make_choropleth_px, written as a plain dict (figure_spec fast path): one
+# map per year x category x accessibility setting gets pre-rendered, so this is the
+# builder that runs most often
+@cached_figure
 def make_choropleth(input_df, selected_category, input_colour_theme, text_size, text_color, background_color):
+    z = input_df[selected_category].to_numpy()
+    label = CHOROPLETH_LABELS.get(selected_category, selected_category)
+
+    # Hover lines as px writes them: the color column reads from z, hidden columns
+    # still ride along in customdata
+    hover = ["country=%{location}"]
+    for i, (col, fmt) in enumerate(CHOROPLETH_HOVER.items()):
+        if fmt is False:
+            continue
+        fmt = fmt if isinstance(fmt, str) else ""
+        source = "z" if col == selected_category else f"customdata[{i}]"
+        hover.append(f"{CHOROPLETH_LABELS.get(col, col)}=%{{{source}{fmt}}}")
+    if selected_category not in CHOROPLETH_HOVER:
+        hover.append(f"{label}=%{{z}}")
+
+    trace = {
+        "coloraxis": "coloraxis",
+        "customdata": input_df[list(CHOROPLETH_HOVER)].to_numpy(dtype=object),
+        "geo": "geo",
+        "hovertemplate": "<br>".join(hover) + "<extra></extra>",
+        "locationmode": "country names",
+        "locations": input_df["country"].to_numpy(dtype=object),
+        "name": "",
+        "z": z,
+        "type": "choropleth",
+    }
+    layout = figure_spec.base_layout(
+        text_size, text_color, background_color,
+        geo={
+            "domain": {"x": [0.0, 1.0], "y": [0.0, 1.0]},
+            "center": {"lat": 10, "lon": 0},
+            "scope": "world",
+            "projection": {"type": "equirectangular"},
+            "lonaxis": {"range": [-180, 180]},
+            "lataxis": {"range": [-60, 85]},
+            "showcountries": True,
+            "showcoastlines": False,
+            "showland": True,
+            "fitbounds": "locations",
+            "oceancolor": background_color,
+            "showocean": False,
+            "bgcolor": background_color,
+        },
+        coloraxis={
+            # Horizontal colorbar under the map
+            "colorbar": {
+                "title": {"text": label, "font": {"size": text_size}, "side": "top"},
+                "tickfont": {"size": text_size - 4},
+                "orientation": "h", "yanchor": "bottom", "y": -0.25, "xanchor": "center", "x": 0.5,
+                "thicknessmode": "pixels", "thickness": 12, "lenmode": "fraction", "len": 0.6,
+            },
+            "colorscale": figure_spec.colorscale(input_colour_theme),
+            "cmin": input_df[selected_category].min(),
+            "cmax": input_df[selected_category].max(),
+            "autocolorscale": False,
+        },
+        legend={"tracegroupgap": 0},
+        margin={"t": 30, "l": 0, "r": 0, "b": 50},
+        height=700,
+        width=1800,
+    )
+    return {"data": [trace], "layout": layout}
+
+
+# The px original of make_choropleth, kept to check the fast path against
+def make_choropleth_px(input_df, selected_category, input_colour_theme, text_size, text_color, background_color):
     fig = px.choropleth(
         input_df,
         locations="country",
@@ -47,22 +133,8 @@ def make_choropleth(input_df, selected_category, input_colour_theme, text_size,
         scope="world",
         width=1800,
         height=700,
-        labels={
-            'pop': 'Population',
-            'gdppercap': 'GDP Per Capita ',
-            'log_pop': 'Population (Log Scale)',
-            'lifeexp': 'Life Expectancy',
-            'log_gdppercap': 'GDP Per Capita (Log Scale)',
-            'log_gdp': 'GDP (Log Scale)'
-        },
-
-        hover_data={
-        "lifeexp": ":.1f", 
-        "pop": ":,", 
-        "gdppercap": ":.0f", 
-        "continent": True,
-        "log_pop": False
-    },
+        labels=CHOROPLETH_LABELS,
+        hover_data=CHOROPLETH_HOVER,
     )
 
     fig.update_geos(
@@ -108,8 +180,15 @@ def make_choropleth(input_df, selected_category, input_colour_theme, text_size,
 
 
 # Scatter/Bubble Plot
-@st.cache_resource
-def make_bubble(df, palette, text_size, text_color, background_color):
+# Above COMPACT_BUBBLE_ROWS rows the animation is built by make_bubble_compact instead of px
+COMPACT_BUBBLE_ROWS = 20_000
+
+@cached_figure
+def make_bubble(df, palette, text_size, text_color, background_color, compact=None, **compact_options):
+    if compact is None:
+        compact = len(df) > COMPACT_BUBBLE_ROWS
+    if compact:
+        return make_bubble_compact(df, palette, text_size, text_color, background_color, **compact_options)
 
     conts = sorted(df["continent"].unique())
     n_cont = len(conts)
@@ -155,16 +234,118 @@ def make_bubble(df, palette, text_size, text_color, background_color):
 
     return fig  
 
-def make_income_health_scatter(input_df, input_colour_theme, text_size, text_color, background_color):
-    d = input_df.copy()
+
+# Same bubble animation as make_bubble, built from year x entity arrays instead of px.
+# Frames carry only float32 x/y/size arrays (rounded to `decimals`), so the payload is a
+# fraction of px's. Optional per-frame filtering: keep the top_n entities by population
+# and/or every entity_step-th entity. Above webgl_threshold points per frame it switches
+# to scattergl. Returns the figure as JSON text, serialized once here so its payload size
+# can be reported; the figure cache stores it as is.
+def make_bubble_compact(df, palette, text_size, text_color, background_color, decimals=2, top_n=None, entity_step=1, webgl_threshold=5_000):
+    years = np.sort(df["year"].unique())
+    entity_codes, entities = pd.factorize(df["country"])
+    year_codes = np.searchsorted(years, df["year"].to_numpy())
+
+    # Pivot to (year, entity) arrays in one vectorized assignment
+    shape = (len(years), len(entities))
+    xs, ys, sizes = (np.full(shape, np.nan, dtype="float32") for _ in range(3))
+    xs[year_codes, entity_codes] = np.round(df["gdppercap"].to_numpy(dtype="float64"), decimals)
+    ys[year_codes, entity_codes] = np.round(df["lifeexp"].to_numpy(dtype="float64"), decimals)
+    sizes[year_codes, entity_codes] = np.round(df["pop"].to_numpy(dtype="float64"), decimals)
+
+    entity_continent = pd.Series(np.asarray(df["continent"]), index=entity_codes).groupby(level=0).first().to_numpy()
+    conts = list(pd.unique(entity_continent))
+    colors = discrete_color_map(palette, len(conts))
+
+    keep = np.ones(shape, dtype=bool)
+    if entity_step > 1:
+        keep[:, np.arange(len(entities)) % entity_step != 0] = False
+    if top_n is not None and top_n < len(entities):
+        ranked = np.where(np.isnan(sizes), -np.inf, sizes)
+        cutoff = np.partition(ranked, -top_n, axis=1)[:, -top_n][:, None]
+        keep &= ranked >= cutoff
+    filtered = not keep.all()
+
+    points = int(keep.sum(axis=1).max()) if len(years) else 0
+    scatter = go.Scattergl if points > webgl_threshold else go.Scatter
+    size_max = 60
+    sizeref = 2.0 * np.nanmax(sizes) / size_max ** 2 if np.isfinite(np.nanmax(sizes)) else 1.0
+    members = {c: np.flatnonzero(entity_continent == c) for c in conts}
+
+    def traces(i, base):
+        out = []
+        for c, color in zip(conts, colors):
+            idx = members[c]
+            if filtered:
+                idx = idx[keep[i, idx]]
+            trace = dict(x=xs[i, idx], y=ys[i, idx], marker=dict(size=sizes[i, idx]))
+            # Entity names only need resending when the set of entities changes per frame
+            if base or filtered:
+                trace.update(ids=entities[idx].to_numpy(dtype=object), hovertext=entities[idx].to_numpy(dtype=object))
+            if base:
+                trace.update(
+                    name=c, legendgroup=c, mode="markers",
+                    marker=dict(size=sizes[i, idx], sizemode="area", sizeref=sizeref, color=color,
+                                opacity=0.8, line=dict(width=0.5, color="rgba(255,255,255,0.15)")),
+                    hovertemplate=f"<b>%{{hovertext}}</b><br><br>continent={c}<br>GDP per capita (Log Scale)=%{{x}}<br>Life Expectancy=%{{y}}<br>pop=%{{marker.size}}<extra></extra>",
+                )
+                out.append(scatter(**trace))
+            else:
+                out.append(trace)
+        return out
+
+    frame_args = lambda duration: {"frame": {"duration": duration, "redraw": False}, "mode": "immediate", "fromcurrent": True, "transition": {"duration": duration, "easing": "linear"}}
+    fig = go.Figure(
+        data=traces(0, True),
+        frames=[go.Frame(name=str(y), data=traces(i, False)) for i, y in enumerate(years)],
+    )
+
+    fig.update_yaxes(range=[30, 90], title_text="Life Expectancy", title_font=dict(size=text_size + 2), gridcolor="rgba(255,255,255,0.06)")
+
+    fig.update_xaxes(type="log", title_text="GDP per capita (Log Scale)", title_font=dict(size=text_size + 2))
+
+    fig.update_layout(
+        template="plotly_dark",
+        height=800,
+        plot_bgcolor=background_color,
+        paper_bgcolor=background_color,
+        font=dict(size=text_size, color=text_color),
+        margin=dict(l=40, r=40, t=60, b=40),
+        legend=dict(title="Continent", orientation="h", y=1.02, x=0.2),
+        transition=dict(duration=1600),
+        updatemenus=[dict(
+            type="buttons", direction="left", showactive=False, x=0.1, xanchor="right", y=0, yanchor="top", pad=dict(r=10, t=70),
+            buttons=[
+                dict(label="&#9654;", method="animate", args=[None, frame_args(500)]),
+                dict(label="&#9724;", method="animate", args=[[None], frame_args(0)]),
+            ],
+        )],
+        sliders=[dict(
+            active=0, currentvalue=dict(prefix="year="), len=0.9, pad=dict(b=10, t=60),
+            steps=[dict(label=str(y), method="animate", args=[[str(y)], frame_args(0)]) for y in years],
+        )],
+    )
+
+    fig = remove_fig_features(fig)
+    fig_json = fig.to_json()
+    print(f"make_bubble_compact: {len(years)} frames, up to {points:,} points per frame, {len(fig_json):,} bytes")
+    return fig_json
+
+@cached_figure
+def make_income_health_scatter(input_df, input_colour_theme, text_size, text_color, background_color, fits=None, max_points=DENSITY_THRESHOLD):
+    d = input_df
+    # Past max_points rows, plot 2D bin counts instead of one marker per row
+    binned = len(d) > max_points
+    points = bin_points(d, "log_gdp", "lifeexp", ["continent"]) if binned else d
     # n_decs = len(d.groupby("continent"))
     # colors = discrete_color_map(input_colour_theme, n_decs)
     fig = px.scatter(
-        d,
+        points,
         x="log_gdp",
         y="lifeexp",
         color="continent",
-        hover_name="country",
+        hover_name=None if binned else "country",
+        size="count" if binned else None,
         facet_col="continent",
         #color_discrete_sequence=colors,
         opacity=0.6,
@@ -172,12 +353,12 @@ def make_income_health_scatter(input_df, input_colour_theme, text_size, text_col
     )
     facet_order = [a.text.split("=")[-1] for a in fig.layout.annotations]
 
+    fit_table = lookup_fit(d, fits, "fit_lifeexp_loggdp_continent").set_index("continent")
     for c in facet_order:
-        g = d[d["continent"] == c]
-        xs = np.array(sorted(g["log_gdp"].unique()))
-        if len(xs) > 2:
-            b1, b0 = np.polyfit(g["log_gdp"], g["lifeexp"], 1)
-            ys = b1 * xs + b0
+        if c in fit_table.index and fit_table.at[c, "n"] > 2:
+            fit = fit_table.loc[c]
+            b1 = fit["slope"]
+            xs, ys = fit_line(fit)
             fig.add_trace(
                 go.Scatter(
                     x=xs,
@@ -204,18 +385,21 @@ def make_income_health_scatter(input_df, input_colour_theme, text_size, text_col
     fig = remove_fig_features(fig)
     return fig
 
-def make_decade_facets(input_df, input_colour_theme, text_size, text_color, background_color):
-    d = input_df.copy()
-    d["decade"] = (d["year"] // 10) * 10
+@cached_figure(features=("decade",))
+def make_decade_facets(input_df, input_colour_theme, text_size, text_color, background_color, fits=None, max_points=DENSITY_THRESHOLD):
+    d = input_df
     decs = sorted(d["decade"].unique())
     n_decs = len(decs)
     colors = discrete_color_map(input_colour_theme, n_decs)
+    binned = len(d) > max_points
+    points = bin_points(d, "log_gdp", "lifeexp", ["decade", "continent"]) if binned else d
     fig = px.scatter(
-        d,
+        points,
         x="log_gdp",
         y="lifeexp",
         color="continent",
-        hover_name="country",
+        hover_name=None if binned else "country",
+        size="count" if binned else None,
         facet_col="decade",
         category_orders={"decade": decs},
         color_discrete_sequence=colors,
@@ -224,11 +408,11 @@ def make_decade_facets(input_df, input_colour_theme, text_size, text_color, back
     )
 
 
-    for i, dec in enumerate(decs, start=1):
-        g = d[d["decade"] == dec]
-        xs = np.array(sorted(g["log_gdp"].unique()))
-        b1, b0 = np.polyfit(g["log_gdp"], g["lifeexp"], 1)
-        ys = b1 * xs + b0
+    fit_table = lookup_fit(d, fits, "fit_lifeexp_loggdp_decade").sort_values("decade")
+    for i, fit in enumerate(fit_table.to_dict("records"), start=1):
+        dec = fit["decade"]
+        b1 = fit["slope"]
+        xs, ys = fit_line(fit)
         fig.add_trace(
             go.Scatter(x=xs, y=ys, mode="lines", line=dict(width=2), name=f"{dec} fit", showlegend=False, hovertemplate=f"<b>Decade:</b> {dec}<br>Gradient: {b1:.2f} years per 10x GDP<extra></extra>"),
             row=1, col=i, 
@@ -246,13 +430,17 @@ def make_decade_facets(input_df, input_colour_theme, text_size, text_color, back
     fig = remove_fig_features(fig)
     return fig
 
-def make_continent_time_trends(input_df, input_colour_theme, text_size, text_color, background_color):
+@cached_figure
+def make_continent_time_trends(input_df, input_colour_theme, text_size, text_color, background_color, fits=None, max_points=DENSITY_THRESHOLD):
+    binned = len(input_df) > max_points
+    points = bin_points(input_df, "year", "lifeexp", ["continent"]) if binned else input_df
     fig = px.scatter(
-        input_df,
+        points,
         x="year",
         y="lifeexp",
         color="continent",
-        hover_name="country",
+        hover_name=None if binned else "country",
+        size="count" if binned else None,
         opacity=0.2,
         labels={"year": "Year", "lifeexp": "Life expectancy"}
     )
@@ -260,12 +448,14 @@ def make_continent_time_trends(input_df, input_colour_theme, text_size, text_col
     # quik fix to get rid of the dupe legend
     fig.for_each_trace(lambda t: t.update(showlegend=False))
 
-    for c, g in input_df.groupby("continent"):
-        xs = np.array(sorted(g["year"].unique()))
-        b1, b0 = np.polyfit(g["year"], g["lifeexp"], 1)
-        ys = b1 * xs + b0
+    fit_table = lookup_fit(input_df, fits, "fit_lifeexp_year_continent").sort_values("continent")
+    for fit in fit_table.to_dict("records"):
+        c = fit["continent"]
+        b1 = fit["slope"]
+        xs, ys = fit_line(fit)
         fig.add_trace(go.Scatter(x=xs, y=ys, mode="lines", line=dict(width=2), name=f"{c} trend", hovertemplate=f"<b>Continent:</b> {c}<br>Gradient: {b1:.2f}<extra></extra>"))
-    fig.update_traces(marker=dict(size=6))
+    if not binned:
+        fig.update_traces(marker=dict(size=6))
     fig.update_layout(
         template="plotly_dark",
         plot_bgcolor=background_color,
@@ -276,18 +466,53 @@ def make_continent_time_trends(input_df, input_colour_theme, text_size, text_col
     fig = remove_fig_features(fig)
     return fig
 
-def make_latest_residual_bars(input_df, input_colour_theme, text_size, text_color, background_color, top_n=6):
-    d = input_df.copy()
-    latest_year = int(d["year"].max())
-    d = d[d["year"] == latest_year].copy()
-    d["log_gdp"] = np.log10(d["gdppercap"])
-    x = d["log_gdp"].to_numpy()
-    y = d["lifeexp"].to_numpy()
-    b1, b0 = np.polyfit(x, y, 1)
-    d["resid"] = y - (b1 * x + b0)
-    pos = d.nlargest(top_n, "resid")[["country", "continent", "resid"]].assign(group="Over perform")
-    neg = d.nsmallest(top_n, "resid")[["country", "continent", "resid"]].assign(group="Under perform")
-    show = pd.concat([pos, neg], axis=0)
+# Over/under-performers of one year (default: the latest). `index` is a prebuilt
+# data_access.ResidualIndex holding at least top_n rows per side; without one the
+# index is built from input_df. Built as a plain dict (figure_spec fast path), since
+# every year is pre-rendered; make_latest_residual_bars_px is the px original.
+@cached_figure
+def make_latest_residual_bars(input_df, input_colour_theme, text_size, text_color, background_color, top_n=6, year=None, index=None):
+    if index is None:
+        index = residual_index(input_df, top_n)
+    year = max(index) if year is None else int(year)
+    show = index[year].groupby("group", sort=False).head(top_n).sort_values(["group", "resid"])
+
+    # One horizontal bar trace per group, coloured from the theme's colorway like px
+    colorway = figure_spec.template("plotly_dark")["layout"]["colorway"]
+    y_label = f"Countries {year}"
+    data = []
+    for i, (group, rows) in enumerate(show.groupby("group", sort=False)):
+        data.append({
+            "hovertemplate": f"group={group}<br>Residual (years)=%{{x}}<br>{y_label}=%{{y}}<br>continent=%{{text}}<extra></extra>",
+            "legendgroup": group,
+            "marker": {"color": colorway[i % len(colorway)], "pattern": {"shape": ""}},
+            "name": group,
+            "orientation": "h",
+            "showlegend": True,
+            "text": rows["continent"].to_numpy(dtype=object),
+            "textposition": "auto",
+            "x": rows["resid"].to_numpy(),
+            "xaxis": "x",
+            "y": rows["country"].to_numpy(dtype=object),
+            "yaxis": "y",
+            "type": "bar",
+        })
+    layout = figure_spec.base_layout(
+        text_size, text_color, background_color, showlegend=True,
+        xaxis={"anchor": "y", "domain": [0.0, 1.0], "title": {"text": "Residual (years)"}},
+        yaxis={"anchor": "x", "domain": [0.0, 1.0], "title": {"text": y_label}},
+        legend={"title": {"text": "group"}, "tracegroupgap": 0},
+        margin={"t": 10, "l": 10, "r": 10, "b": 10},
+        barmode="relative",
+    )
+    return {"data": data, "layout": layout}
+
+
+def make_latest_residual_bars_px(input_df, input_colour_theme, text_size, text_color, background_color, top_n=6, year=None, index=None):
+    if index is None:
+        index = residual_index(input_df, top_n)
+    year = max(index) if year is None else int(year)
+    show = index[year].groupby("group", sort=False).head(top_n)
 
     fig = px.bar(
         show.sort_values(["group", "resid"]),
@@ -296,7 +521,7 @@ def make_latest_residual_bars(input_df, input_colour_theme, text_size, text_colo
         color="group",
         orientation="h",
         text="continent",
-        labels={"resid": "Residual (years)", "country": f"Countries {latest_year}"}
+        labels={"resid": "Residual (years)", "country": f"Countries {year}"}
     )
     fig.update_layout(
         template="plotly_dark",
@@ -309,26 +534,28 @@ def make_latest_residual_bars(input_df, input_colour_theme, text_size, text_colo
     fig = remove_fig_features(fig)
     return fig
 
-def make_logpop_vs_loggdp_facets(input_df, input_colour_theme, text_size, text_color, background_color):
-    d = input_df.copy()
-    d["log_gdp"] = np.log10(d["gdppercap"])
-    d["log_pop"] = np.log10(d["pop"])
+@cached_figure
+def make_logpop_vs_loggdp_facets(input_df, input_colour_theme, text_size, text_color, background_color, fits=None, max_points=DENSITY_THRESHOLD):
+    d = input_df
+    binned = len(d) > max_points
+    points = bin_points(d, "log_pop", "log_gdppercap", ["continent"]) if binned else d
     fig = px.scatter(
-        d,
+        points,
         x="log_pop",
-        y="log_gdp",
+        y="log_gdppercap",
         color="continent",
-        hover_name="country",
+        hover_name=None if binned else "country",
+        size="count" if binned else None,
         facet_col="continent",
         opacity=0.6,
-        labels={"log_pop": "Population (Log Scale)", "log_gdp": "GDP per capita (Log Scale)"}
+        labels={"log_pop": "Population (Log Scale)", "log_gdppercap": "GDP per capita (Log Scale)"}
     )
     continents = list(d["continent"].unique())
+    fit_table = lookup_fit(d, fits, "fit_loggdppercap_logpop_continent").set_index("continent")
     for c in continents:
-        g = d[d["continent"] == c]
-        xs = np.array(sorted(g["log_pop"].unique()))
-        b1, b0 = np.polyfit(g["log_pop"], g["log_gdp"], 1)
-        ys = b1 * xs + b0
+        fit = fit_table.loc[c]
+        b1 = fit["slope"]
+        xs, ys = fit_line(fit)
         fig.add_trace(
             go.Scatter(x=xs, y=ys, mode="lines", line=dict(width=2), name=f"{c} fit", hovertemplate=f"<b>Continent:</b> {c}<br>Gradient: {b1:.2f}<extra></extra>", showlegend=False),
             row=1, col=continents.index(c)+1
@@ -347,14 +574,11 @@ def make_logpop_vs_loggdp_facets(input_df, input_colour_theme, text_size, text_c
     fig = remove_fig_features(fig)
     return fig
 
-def make_summary_slopes(input_df, input_colour_theme, text_size, text_color, background_color):
-    d = input_df.copy()
-    rows = []
-    for c, g in d.groupby("continent"):
-        b1, b0 = np.polyfit(g["log_gdp"], g["lifeexp"], 1)
-        rows.append({"continent": c, "slope_years_per_10x_gdp": b1})
-    t = pd.DataFrame(rows)
-    colors = discrete_color_map(input_colour_theme, len(rows))
+@cached_figure
+def make_summary_slopes(input_df, input_colour_theme, text_size, text_color, background_color, fits=None):
+    fit_table = lookup_fit(input_df, fits, "fit_lifeexp_loggdp_continent").sort_values("continent")
+    t = fit_table[["continent"]].assign(slope_years_per_10x_gdp=fit_table["slope"])
+    colors = discrete_color_map(input_colour_theme, len(t))
     fig = px.scatter(
         t,
         x="slope_years_per_10x_gdp",
@@ -374,3 +598,77 @@ def make_summary_slopes(input_df, input_colour_theme, text_size, text_color, bac
     )
     fig = remove_fig_features(fig)
     return fig
+
+
+# Population-weighted life expectancy per continent plus the world line, read from the
+# data_access rollup cube (period is "year" or "decade")
+@cached_figure
+def make_rollup_trends(cube, input_colour_theme, text_size, text_color, background_color, period="year"):
+    t = pd.concat([cube.query(("continent", period)), cube.query((period,))], ignore_index=True)
+    t["continent"] = t["continent"].astype(str)
+    conts = [c for c in t["continent"].unique() if c != WORLD]
+    colors = discrete_color_map(input_colour_theme, len(conts))
+    fig = px.line(
+        t,
+        x=period,
+        y="lifeexp",
+        color="continent",
+        category_orders={"continent": [*conts, WORLD]},
+        color_discrete_sequence=[*colors[:len(conts)], text_color],
+        markers=True,
+        hover_data={"pop": ":,.0f", "gdppercap": ":,.0f"},
+        labels={period: period.capitalize(), "lifeexp": "Life expectancy (population weighted)", "pop": "Population", "gdppercap": "GDP per capita"}
+    )
+    fig.update_traces(line=dict(width=4, dash="dash"), selector=dict(name=WORLD))
+    fig.update_layout(
+        template="plotly_dark",
+        plot_bgcolor=background_color,
+        paper_bgcolor=background_color,
+        font=dict(size=text_size, color=text_color),
+        margin=dict(l=10, r=10, t=30, b=10),
+        legend=dict(title="Continent")
+    )
+    fig = remove_fig_features(fig)
+    return fig
+
+# Median GDP per capita of each continent and the world in one year, with the
+# interquartile range as error bars and marker size by total population
+@cached_figure
+def make_rollup_summary(cube, input_colour_theme, text_size, text_color, background_color, year=None):
+    t = pd.concat([cube.query(("continent", "year")), cube.query(("year",))], ignore_index=True)
+    year = int(t["year"].max()) if year is None else int(year)
+    t = t[t["year"] == year].assign(continent=lambda x: x["continent"].astype(str))
+    colors = discrete_color_map(input_colour_theme, len(t))
+    fig = px.scatter(
+        t,
+        x="gdppercap_median",
+        y="continent",
+        color="continent",
+        color_discrete_sequence=colors,
+        size="pop",
+        size_max=40,
+        error_x=t["gdppercap_p75"] - t["gdppercap_median"],
+        error_x_minus=t["gdppercap_median"] - t["gdppercap_p25"],
+        log_x=True,
+        hover_data={"lifeexp": ":.1f", "gdp": ":,.0f", "pop": ":,.0f"},
+        labels={"gdppercap_median": f"Median GDP per capita {year} (Log Scale)", "continent": "Continent",
+                "lifeexp": "Life expectancy (population weighted)", "gdp": "Total GDP", "pop": "Population"}
+    )
+    fig.update_layout(
+        template="plotly_dark",
+        plot_bgcolor=background_color,
+        paper_bgcolor=background_color,
+        font=dict(size=text_size, color=text_color),
+        margin=dict(l=10, r=10, t=20, b=10),
+        showlegend=False
+    )
+    fig = remove_fig_features(fig)
+    return fig
+
+
+# Builders on the figure_spec fast path -> the px version each one replaces, for
+# benchmark.py --verify
+PX_REFERENCES = {
+    "make_choropleth": make_choropleth_px,
+    "make_latest_residual_bars": make_latest_residual_bars_px,
+}
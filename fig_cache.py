@@ -0,0 +1,233 @@
+import ast
+import functools
+import hashlib
+import inspect
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+import plotly
+import features as _features
+import figure_spec
+import metrics
+
+# Content-addressed on-disk cache for fig_builder figures. Each figure is stored as
+# Plotly JSON under a key built from the builder name, the data's version token (or a
+# digest of a plain DataFrame) and every other argument (palette, text size, colours,
+# extra options). The directory is
+# shared by every process and survives restarts; it is kept under CACHE_MAX_BYTES by
+# evicting the least recently used files (hits refresh a file's mtime). Each process counts
+# the bytes it writes and only walks the directory when its estimate crosses the limit, or
+# after writing 1/8 of it (to catch up with other processes), not on every store.
+#
+# Builders may return a go.Figure, a plain figure dict (see figure_spec.py) or figure JSON
+# they already serialized; dicts are serialized directly and wrapped without validation,
+# and JSON text is stored as is. Hits are decoded the same way,
+# since the stored JSON was already written by Plotly or a verified fast builder.
+
+CACHE_DIR = os.environ.get("FIG_CACHE_DIR", "data/fig_cache")
+CACHE_MAX_BYTES = int(os.environ.get("FIG_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+# Eviction trims to this fraction of the limit, so a full cache is not walked on every store
+EVICT_TO = 0.9
+
+# Per cache directory: (bytes found by the last walk, bytes this process stored since)
+_usage = {}
+_usage_lock = threading.Lock()
+
+
+# Digest of a frame's contents, so equal data gives equal keys in any process
+def frame_digest(df):
+    h = hashlib.sha256()
+    h.update(repr(list(zip(df.columns, map(str, df.dtypes)))).encode())
+    h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def _key_part(value):
+    # Versioned handles (data_access.Dataset / FitTables) are keyed by their token
+    token = getattr(value, "token", None)
+    if isinstance(token, str):
+        return ["token", token]
+    if isinstance(value, pd.DataFrame):
+        return ["df", frame_digest(value)]
+    if isinstance(value, dict):
+        return ["dict", [[str(k), _key_part(v)] for k, v in sorted(value.items(), key=lambda kv: str(kv[0]))]]
+    if isinstance(value, (list, tuple)):
+        return ["seq", [_key_part(v) for v in value]]
+    if isinstance(value, np.generic):
+        return value.item()
+    return repr(value)
+
+
+def figure_key(name, args, kwargs, code_version=""):
+    payload = json.dumps([name, code_version, _key_part(list(args)), _key_part(kwargs)], sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+# Source files of a module and of every module next to it that it imports, directly or
+# through another one (figure_spec, density, features, regression, rollup, ...)
+def _local_sources(path):
+    root = os.path.dirname(path)
+    found, todo = set(), [path]
+    while todo:
+        path = todo.pop()
+        if path in found or not os.path.exists(path):
+            continue
+        found.add(path)
+        with open(path, "rb") as f:
+            tree = ast.parse(f.read())
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and not node.level and node.module:
+                names = [node.module]
+            else:
+                continue
+            todo += [os.path.join(root, name.split(".")[0] + ".py") for name in names]
+    return sorted(found)
+
+
+# Source of the builder's module and of every local module it depends on, plus the plotly
+# version, so editing any code that shapes a figure or upgrading plotly never serves
+# figures built by the old code
+def code_version(builder):
+    h = hashlib.sha256(plotly.__version__.encode())
+    for path in _local_sources(os.path.abspath(inspect.getsourcefile(builder))):
+        h.update(os.path.basename(path).encode())
+        with open(path, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def _path(key, cache_dir):
+    return os.path.join(cache_dir, key[:2], f"{key}.json")
+
+
+def load(key, cache_dir=CACHE_DIR):
+    path = _path(key, cache_dir)
+    try:
+        with open(path) as f:
+            fig_json = f.read()
+        os.utime(path)
+    except (FileNotFoundError, OSError):
+        return None
+    return fig_json
+
+
+def store(key, fig_json, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+    path = _path(key, cache_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        f.write(fig_json)
+    os.replace(tmp, path)
+
+    with _usage_lock:
+        total, written = _usage.get(cache_dir, (None, 0))
+        written += len(fig_json)
+        _usage[cache_dir] = (total, written)
+        if total is not None and total + written <= max_bytes and written <= max_bytes // 8:
+            return
+    total = evict(cache_dir, max_bytes)
+    with _usage_lock:
+        _usage[cache_dir] = (total, 0)
+
+
+# Delete least recently used figures until the cache fits in EVICT_TO * max_bytes, if it
+# is over max_bytes. Returns the bytes left in the cache.
+def evict(cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+    entries = []
+    for root, _, files in os.walk(cache_dir):
+        for name in files:
+            if name.endswith(".json"):
+                try:
+                    stat = os.stat(os.path.join(root, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, os.path.join(root, name)))
+
+    total = sum(size for _, size, _ in entries)
+    if total <= max_bytes:
+        return total
+    for _, size, path in sorted(entries):
+        if total <= max_bytes * EVICT_TO:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+    return total
+
+
+# Decorator for fig_builder functions: returns the cached figure when one exists.
+# Builders get read-only views of their data, with the derived columns named in
+# `features` attached from the shared registry (see features.py).
+def cached_figure(builder=None, features=()):
+    if builder is None:
+        return functools.partial(cached_figure, features=features)
+    version = code_version(builder)
+
+    def inputs(*args):
+        return [_features.view(a, features) if isinstance(getattr(a, "frame", a), pd.DataFrame) else a for a in args]
+
+    @functools.wraps(builder)
+    def wrapper(*args, **kwargs):
+        name = builder.__name__
+        key = figure_key(name, args, kwargs, version)
+        fig_json = load(key)
+        if fig_json is not None:
+            metrics.inc("figure_cache_lookups_total", builder=name, result="hit")
+            metrics.observe("figure_payload_bytes", len(fig_json), metrics.BYTE_BUCKETS, builder=name)
+            with metrics.span("figure_decode_seconds", builder=name):
+                return figure_spec.from_json(fig_json)
+
+        metrics.inc("figure_cache_lookups_total", builder=name, result="miss")
+        args = inputs(*args)
+        with metrics.span("figure_build_seconds", builder=name):
+            fig = builder(*args, **kwargs)
+        with metrics.span("figure_serialize_seconds", builder=name):
+            if isinstance(fig, str):
+                fig_json, fig = fig, figure_spec.from_json(fig)
+            elif isinstance(fig, dict):
+                fig_json = figure_spec.to_json(fig)
+                fig = figure_spec.as_figure(fig)
+            else:
+                fig_json = fig.to_json()
+        metrics.observe("figure_payload_bytes", len(fig_json), metrics.BYTE_BUCKETS, builder=name)
+        store(key, fig_json)
+        return fig
+
+    # The arguments exactly as the builder sees them, for calling it (or a reference
+    # implementation) outside the cache
+    wrapper.inputs = inputs
+    wrapper.cache_key = lambda *args, **kwargs: figure_key(builder.__name__, args, kwargs, version)
+    return wrapper
+
+
+# Background builds for figures the user has not asked for yet (e.g. closed tabs).
+# One small pool per process, shared by every session; a figure already cached or
+# already queued is not submitted again.
+PREFETCH_WORKERS = int(os.environ.get("FIG_PREFETCH_WORKERS", 2))
+_prefetch_pool = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="fig-prefetch")
+_prefetch_pending = {}
+_prefetch_lock = threading.Lock()
+
+
+def is_cached(cached_builder, *args, **kwargs):
+    return os.path.exists(_path(cached_builder.cache_key(*args, **kwargs), CACHE_DIR))
+
+
+def prefetch(cached_builder, *args, **kwargs):
+    key = cached_builder.cache_key(*args, **kwargs)
+    if os.path.exists(_path(key, CACHE_DIR)):
+        return None
+    with _prefetch_lock:
+        if key in _prefetch_pending:
+            return _prefetch_pending[key]
+        future = _prefetch_pool.submit(cached_builder, *args, **kwargs)
+        _prefetch_pending[key] = future
+    future.add_done_callback(lambda _: _prefetch_pending.pop(key, None))
+    return future
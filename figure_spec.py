@@ -0,0 +1,152 @@
+import base64
+import json
+import math
+from functools import lru_cache
+import numpy as np
+import plotly.colors as pc
+import plotly.graph_objects as go
+import plotly.io as pio
+
+# Plotly's own (private) typed array encoder; without it arrays are written as plain lists,
+# which draw the same figure
+try:
+    from _plotly_utils.utils import to_typed_array_spec
+except ImportError:
+    to_typed_array_spec = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Fast path for building and serializing figures. Builders on this path return the figure
+# as a plain dict (data + layout) instead of going through px and update_layout, so none
+# of Plotly's per-property validation runs, and the dict is written straight to JSON:
+# numeric arrays as Plotly's base64 typed arrays, everything else by orjson (or Plotly's
+# own encoder when orjson is not installed). The result is wrapped in an unvalidated
+# go.Figure, which st.plotly_chart and the figure cache accept like any other.
+#
+# equivalent() compares two figures after decoding typed arrays, so a fast builder can be
+# checked against the px version it replaces (see tests/test_figure_spec.py).
+
+# Modebar buttons removed from every figure (zoom and pan are disabled)
+MODEBAR_REMOVE = ["zoom", "zoomIn", "zoomOut", "pan", "select", "lasso2d", "autoScale", "resetGeo"]
+
+
+@lru_cache(maxsize=None)
+def template(name="plotly_dark"):
+    return go.Figure(layout={"template": name}).to_plotly_json()["layout"]["template"]
+
+
+# A named continuous scale with evenly spaced stops, computed the way px does
+@lru_cache(maxsize=None)
+def _colorscale(name):
+    colors = [c for _, c in pc.get_colorscale(name)]
+    return tuple((i / (len(colors) - 1), c) for i, c in enumerate(colors))
+
+
+def colorscale(name):
+    return [list(stop) for stop in _colorscale(name)]
+
+
+# Layout every dashboard figure shares: theme, background, font and the disabled
+# interactions that fig_builder.remove_fig_features sets on px figures
+def base_layout(text_size, text_color, background_color, showlegend=None, **extra):
+    # Keys in the order Plotly writes them, so the JSON matches px's byte for byte
+    layout = {
+        "template": template("plotly_dark"),
+        **extra,
+        "font": {"size": text_size, "color": text_color},
+        "plot_bgcolor": background_color,
+        "paper_bgcolor": background_color,
+    }
+    if showlegend is not None:
+        layout["showlegend"] = showlegend
+    layout["dragmode"] = False
+    layout["modebar"] = {"remove": MODEBAR_REMOVE}
+    return layout
+
+
+def _default(value):
+    if isinstance(value, np.ndarray):
+        if to_typed_array_spec is not None and value.dtype.kind in "biuf":
+            spec = to_typed_array_spec(value)
+            if isinstance(spec, dict):
+                return spec
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+# Characters Plotly escapes so figure JSON can sit inside a <script> tag
+_UNSAFE = (("<", "\\u003c"), (">", "\\u003e"), ("/", "\\u002f"), ("\u2028", "\\u2028"), ("\u2029", "\\u2029"))
+
+
+def to_json(spec):
+    if orjson is None:
+        return pio.json.to_json_plotly(spec, engine="json")
+    out = orjson.dumps(spec, default=_default).decode()
+    for char, escaped in _UNSAFE:
+        if char in out:
+            out = out.replace(char, escaped)
+    return out
+
+
+def as_figure(spec):
+    return go.Figure(spec, _validate=False)
+
+
+# Figure JSON from the cache, without re-validating what Plotly already wrote
+def from_json(fig_json):
+    return as_figure(orjson.loads(fig_json) if orjson is not None else json.loads(fig_json))
+
+
+def _decode(value):
+    if isinstance(value, dict):
+        if set(value) in ({"dtype", "bdata"}, {"dtype", "bdata", "shape"}):
+            arr = np.frombuffer(base64.b64decode(value["bdata"]), dtype=np.dtype(value["dtype"]).newbyteorder("<"))
+            if "shape" in value:
+                arr = arr.reshape([int(n) for n in value["shape"].split(",")])
+            return _decode(arr.tolist())
+        return {k: _decode(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+    return value
+
+
+# Plain JSON structure of a figure (Figure, dict or JSON text) with typed arrays decoded
+def normalize(fig):
+    if isinstance(fig, go.Figure):
+        fig = fig.to_json()
+    elif isinstance(fig, dict):
+        fig = to_json(fig)
+    return _decode(json.loads(fig))
+
+
+# Paths where two figures differ, as (path, a, b); empty when they draw the same thing.
+# Numbers are compared to rel_tol, and NaN/None match each other.
+def differences(a, b, rel_tol=1e-9, path="", out=None):
+    out = [] if out is None else out
+    if path == "":
+        a, b = normalize(a), normalize(b)
+    if isinstance(a, dict) and isinstance(b, dict):
+        for k in sorted(set(a) | set(b)):
+            differences(a.get(k), b.get(k), rel_tol, f"{path}.{k}", out)
+    elif isinstance(a, list) and isinstance(b, list) and len(a) == len(b):
+        for i, (x, y) in enumerate(zip(a, b)):
+            differences(x, y, rel_tol, f"{path}[{i}]", out)
+    elif isinstance(a, (int, float)) and isinstance(b, (int, float)) and not isinstance(a, bool) and not isinstance(b, bool):
+        if not (math.isclose(a, b, rel_tol=rel_tol) or (math.isnan(a) and math.isnan(b))):
+            out.append((path, a, b))
+    elif a != b and not (_missing(a) and _missing(b)):
+        out.append((path, a, b))
+    return out
+
+
+def _missing(value):
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+def equivalent(a, b, rel_tol=1e-9):
+    return not differences(a, b, rel_tol)
@@ -0,0 +1,179 @@
+import hashlib
+import io
+import os
+import sqlite3
+import time
+import zlib
+import pandas as pd
+
+# SQLite column types for the gapminder table
+SCHEMA = {
+    "country": "TEXT",
+    "continent": "TEXT",
+    "year": "INTEGER",
+    "lifeexp": "REAL",
+    "pop": "INTEGER",
+    "gdppercap": "REAL"
+}
+
+
+# Rows per fingerprinted chunk in incremental mode
+INCREMENTAL_CHUNK_LINES = 100_000
+
+
+def create_table(con, table="data", primary_key=True):
+    cols = ", ".join([f"{k} {v}" for k, v in SCHEMA.items()])
+    pk = ", PRIMARY KEY(country, year)" if primary_key else ""
+    con.execute(f"DROP TABLE IF EXISTS {table}")
+    con.execute(f"CREATE TABLE {table} ({cols}{pk})")
+
+
+# Text columns are read as strings, REAL columns as floats, integers are left to the column affinity
+def csv_dtypes(header):
+    names = {c: c.strip().lower() for c in header}
+    dtypes = {c: str for c, n in names.items() if SCHEMA.get(n) == "TEXT"}
+    dtypes.update({c: "float64" for c, n in names.items() if SCHEMA.get(n) == "REAL"})
+    return names, dtypes
+
+
+# Series iteration yields python scalars, which sqlite3 can bind directly
+def _records(chunk, cols):
+    return zip(*(chunk[c].astype(object).where(chunk[c].notna(), None) for c in cols))
+
+
+# Stream a CSV into an existing table chunk by chunk with executemany, so peak memory
+# is bounded by chunksize rather than the file size. Runs inside the caller's transaction.
+def stream_csv(csv_path, con, table="data", chunksize=100_000, verbose=True):
+    names, dtypes = csv_dtypes(pd.read_csv(csv_path, nrows=0).columns)
+
+    cols = list(SCHEMA)
+    insert = f"INSERT INTO {table} ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})"
+
+    rows = 0
+    start = time.perf_counter()
+    for chunk in pd.read_csv(csv_path, chunksize=chunksize, dtype=dtypes):
+        chunk = chunk.rename(columns=names)[cols]
+        con.executemany(insert, _records(chunk, cols))
+        rows += len(chunk)
+
+    elapsed = time.perf_counter() - start
+    if verbose:
+        print(f"Ingested {rows:,} rows into {table} in {elapsed:.2f}s ({rows / max(elapsed, 1e-9):,.0f} rows/s)")
+    return rows
+
+
+# Split a CSV into raw chunks of about `lines` data lines and fingerprint each one, without
+# parsing it. Yields (index, sha256 hex prefix, header bytes, chunk bytes).
+# A chunk ends after a line whose crc32 is a multiple of `lines` (or at 4 * lines), so the
+# boundaries follow the content rather than line numbers: inserting or deleting a line
+# anywhere only changes the chunk it falls in, not every chunk after it.
+def iter_line_chunks(csv_path, lines=100_000):
+    limit = 4 * lines
+    with open(csv_path, "rb") as f:
+        header = f.readline()
+        idx, buf = 0, []
+        for line in f:
+            buf.append(line)
+            if zlib.crc32(line) % lines == 0 or len(buf) >= limit:
+                body = b"".join(buf)
+                yield idx, hashlib.sha256(body).hexdigest()[:16], header, body
+                idx, buf = idx + 1, []
+        if buf:
+            body = b"".join(buf)
+            yield idx, hashlib.sha256(body).hexdigest()[:16], header, body
+
+
+def parse_chunk(header, body, columns=None):
+    columns = columns or list(SCHEMA)
+    names, dtypes = csv_dtypes(pd.read_csv(io.BytesIO(header), nrows=0).columns)
+    usecols = [c for c, n in names.items() if n in columns]
+    dtypes = {c: t for c, t in dtypes.items() if c in usecols}
+    chunk = pd.read_csv(io.BytesIO(header + body), dtype=dtypes, usecols=usecols)
+    return chunk.rename(columns=names)[columns]
+
+
+# Insert new (country, year) rows and update existing ones whose values differ.
+# Returns the number of rows actually written; unchanged rows cost no write.
+def upsert_chunk(con, chunk, table="data"):
+    cols = list(SCHEMA)
+    values = [c for c in cols if c not in ("country", "year")]
+    upsert = f"""
+    INSERT INTO {table} ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})
+    ON CONFLICT(country, year) DO UPDATE SET {', '.join(f'{c} = excluded.{c}' for c in values)}
+    WHERE {' OR '.join(f'{c} IS NOT excluded.{c}' for c in values)}
+    """
+    before = con.total_changes
+    con.executemany(upsert, _records(chunk, cols))
+    return con.total_changes - before
+
+
+# Fingerprint every chunk of a CSV. The version hashes the whole file, so it does not
+# depend on the chunk size used. With `con`, also records which chunk each key came from.
+def fingerprint_csv(csv_path, lines=INCREMENTAL_CHUNK_LINES, con=None):
+    if con is not None:
+        create_meta(con)
+        con.execute("DELETE FROM source_keys")
+    version = hashlib.sha256()
+    shas = []
+    for idx, sha, header, body in iter_line_chunks(csv_path, lines):
+        if idx == 0:
+            version.update(header)
+        version.update(body)
+        shas.append((idx, sha))
+        if con is not None:
+            record_keys(con, sha, parse_chunk(header, body, ["country", "year"]))
+    return shas, version.hexdigest()[:16]
+
+
+def create_meta(con):
+    con.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+    con.execute("CREATE TABLE IF NOT EXISTS source_chunks (idx INTEGER PRIMARY KEY, sha TEXT)")
+    con.execute("CREATE TABLE IF NOT EXISTS source_keys (country TEXT, year, chunk TEXT, PRIMARY KEY(country, year))")
+    con.execute("CREATE INDEX IF NOT EXISTS idx_source_keys_chunk ON source_keys(chunk)")
+
+
+# The chunk (by fingerprint) each (country, year) key was last read from, so the rows of a
+# chunk that changed or disappeared from the CSV can be found without rereading it
+def record_keys(con, sha, chunk):
+    con.executemany(
+        "INSERT OR REPLACE INTO source_keys (country, year, chunk) VALUES (?, ?, ?)",
+        ((country, year, sha) for country, year in _records(chunk, ["country", "year"])),
+    )
+
+
+# Chunk fingerprints and the dataset version live next to the data table
+def write_meta(con, shas, version, chunk_lines=INCREMENTAL_CHUNK_LINES):
+    create_meta(con)
+    con.execute("DELETE FROM source_chunks")
+    con.executemany("INSERT INTO source_chunks (idx, sha) VALUES (?, ?)", shas)
+    con.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", [
+        ("chunk_lines", str(chunk_lines)),
+        ("version", version),
+    ])
+
+
+# (mtime, size) of each db file and the version read from it; dataset_version runs on every
+# data access, so it only reopens the database when the file has changed
+_versions = {}
+
+
+# Version token of the data currently in db_path, or None if it was not built by data_builder
+def dataset_version(db_path="data/data.db"):
+    try:
+        st = os.stat(db_path)
+    except OSError:
+        return None
+    stamp = (st.st_mtime_ns, st.st_size)
+    cached = _versions.get(db_path)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    con = sqlite3.connect(db_path)
+    try:
+        row = con.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+    except sqlite3.OperationalError:
+        row = None
+    finally:
+        con.close()
+    version = row[0] if row else None
+    _versions[db_path] = (stamp, version)
+    return version
@@ -0,0 +1,359 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+import numpy as np
+
+# Headless load test for dashboard.py. Starts a real `streamlit run dashboard.py` on a free
+# local port and drives N concurrent sessions against it over the same websocket protocol
+# the browser uses: each session sends rerun requests with its widget states and waits for
+# the script (or fragment) run to finish. Sessions go through a realistic sequence of year
+# slider sweeps, category switches, tab opens and accessibility toggles, and the latency of
+# every rerun is recorded.
+#
+#   python loadtest.py --sessions 1 4 16 32
+#
+#   python loadtest.py --sessions 4 16 --workers 4      # through serve.py's proxy
+#
+# Each concurrency level gets a fresh server so memory readings are not polluted by the
+# previous level. Reported per level: p50/p95/p99 rerun latency, reruns per second, and
+# memory per session (server RSS growth over the single-session baseline, divided by N).
+# Nothing leaves 127.0.0.1.
+
+REPO = os.path.dirname(os.path.abspath(__file__))
+DASHBOARD = os.path.join(REPO, "dashboard.py")
+
+SESSIONS = [1, 2, 4, 8, 16]
+RESULTS_PATH = "data/loadtest.json"
+
+TABS = ["By Continent", "By Decade", "Trends", "Residuals", "Population vs Income", "Slope Summary", "Continent Summary"]
+
+# Widget element type -> WidgetState field it reports its value in. A select_slider is a
+# slider element with options, and reports the chosen option's label instead.
+WIDGET_FIELDS = {
+    "selectbox": "string_value",
+    "radio": "string_value",
+    "checkbox": "bool_value",
+    "slider": "double_array_value",
+}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# RSS of the server and everything it spawned (the figure warm-up pool), from /proc
+def tree_rss_mb(pid):
+    children = {}
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            children.setdefault(ppid, []).append(int(entry))
+    total, todo = 0, [pid]
+    while todo:
+        p = todo.pop()
+        todo.extend(children.get(p, []))
+        try:
+            with open(f"/proc/{p}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1])
+        except OSError:
+            pass
+    return total / 1024
+
+
+# The dashboard reads data/data.db relative to the repo; build it from the bundled CSV if
+# this checkout has never been run
+def ensure_db():
+    if not os.path.exists(os.path.join(REPO, "data", "data.db")):
+        from benchmark import source_csv
+        import data_builder
+        os.makedirs(os.path.join(REPO, "data"), exist_ok=True)
+        data_builder.build_db(
+            csv_path=source_csv(),
+            db_path=os.path.join(REPO, "data", "data.db"),
+            snapshot_path=os.path.join(REPO, "data", "snapshot"),
+        )
+
+
+# A single streamlit process, or with workers > 1 serve.py's workers behind its proxy
+def start_server(port, fig_cache_dir, timeout=120, workers=1):
+    env = dict(os.environ, FIG_CACHE_DIR=fig_cache_dir)
+    if workers > 1:
+        cmd = [sys.executable, os.path.join(REPO, "serve.py"), "--workers", str(workers), "--host", "127.0.0.1", "--port", str(port)]
+    else:
+        cmd = [sys.executable, "-m", "streamlit", "run", DASHBOARD,
+               "--server.headless", "true", "--server.address", "127.0.0.1", "--server.port", str(port),
+               "--server.fileWatcherType", "none", "--browser.gatherUsageStats", "false"]
+    proc = subprocess.Popen(cmd, cwd=REPO, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"streamlit exited with {proc.returncode}: {proc.stderr.read()[-500:]}")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1) as r:
+                if r.status == 200:
+                    return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f"streamlit did not come up on port {port} within {timeout}s")
+
+
+def stop_server(proc):
+    proc.terminate()
+    try:
+        proc.wait(10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+
+# One browser tab: keeps the widgets the server has drawn (id, fragment, options) and the
+# values this session has set, and replays them on every rerun like the frontend does
+class Session:
+    def __init__(self, ws):
+        self.ws = ws
+        self.page_script_hash = ""
+        self.widgets = {}
+        self.states = {}
+        self.exceptions = []
+
+    async def rerun(self, fragment_id="", timeout=120):
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        msg = BackMsg()
+        msg.rerun_script.page_script_hash = self.page_script_hash
+        msg.rerun_script.fragment_id = fragment_id
+        msg.rerun_script.widget_states.widgets.extend(self.states.values())
+        await self.ws.send(msg.SerializeToString())
+
+        async with asyncio.timeout(timeout):
+            while True:
+                fwd = ForwardMsg()
+                fwd.ParseFromString(await self.ws.recv())
+                kind = fwd.WhichOneof("type")
+                if kind == "new_session":
+                    self.page_script_hash = fwd.new_session.page_script_hash
+                elif kind == "delta":
+                    self._record(fwd.delta)
+                elif kind == "script_finished":
+                    if fwd.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                        return
+
+    def _record(self, delta):
+        kind = delta.WhichOneof("type")
+        if kind == "new_element":
+            el = delta.new_element
+            ty = el.WhichOneof("type")
+            if ty in WIDGET_FIELDS:
+                proto = getattr(el, ty)
+                self.widgets[proto.label] = (ty, proto.id, delta.fragment_id, list(getattr(proto, "options", [])))
+            elif ty == "exception":
+                self.exceptions.append(f"{el.exception.type}: {el.exception.message}")
+        elif kind == "add_block" and delta.add_block.WhichOneof("type") == "tab_container":
+            block = delta.add_block
+            self.widgets["tabs"] = ("tabs", block.id, delta.fragment_id, [])
+
+    # Sets one widget's value and reruns what the browser would: the widget's fragment
+    # if it lives in one, else the whole script
+    async def set(self, label, value, timeout=120):
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        if label not in self.widgets:
+            raise LookupError(f"no {label!r} widget on the page")
+        ty, wid, fragment_id, options = self.widgets[label]
+        state = WidgetState(id=wid)
+        field = "string_array_value" if ty == "slider" and options else WIDGET_FIELDS.get(ty, "string_value")
+        if field == "double_array_value":
+            state.double_array_value.data[:] = [float(value)]
+        elif field == "string_array_value":
+            state.string_array_value.data[:] = [str(value)]
+        else:
+            setattr(state, field, value)
+        self.states[wid] = state
+        await self.rerun(fragment_id, timeout)
+
+    def options(self, label):
+        return self.widgets[label][3]
+
+
+# A user's visit: interactions picked at random (seeded per session) in realistic proportions.
+# Each step is one rerun.
+def scenario(rng, years, actions):
+    steps = []
+    for _ in range(actions):
+        kind = rng.choices(["year", "category", "tab", "accessibility"], weights=[4, 2, 3, 1])[0]
+        if kind == "year":
+            # A slider sweep: several consecutive years, as a drag produces
+            start = rng.randrange(len(years))
+            for y in years[start:start + rng.randint(2, 4)]:
+                steps.append(("year", y))
+        elif kind == "category":
+            steps.append(("category", rng.choice(["Population", "Life Expectancy", "GDP Per Capita", "GDP"])))
+        elif kind == "tab":
+            steps.append(("tab", rng.choice(TABS)))
+        else:
+            steps.append(rng.choice([
+                ("palette", rng.choice(["Default", "Protanopia", "Deuteranopia", "Tritanopia", "Grayscale"])),
+                ("text_size", rng.randint(1, 5)),
+                ("high_contrast", rng.random() < 0.5),
+                ("dyslexia", rng.random() < 0.5),
+            ]))
+    return steps[:actions]
+
+
+STEP_WIDGETS = {
+    "year": "Select a Year",
+    "category": "Select a category",
+    "tab": "tabs",
+    "palette": "Color Palette",
+    "text_size": "Text Size",
+    "high_contrast": "High Contrast Mode",
+    "dyslexia": "Dyslexia-friendly font",
+}
+
+
+async def run_session(index, url, seed, actions, timeout, finished, release, latencies, errors):
+    import websockets
+
+    rng = random.Random(seed * 1000 + index)
+    try:
+        async with websockets.connect(url, subprotocols=["streamlit"], max_size=None) as ws:
+            try:
+                session = Session(ws)
+                t = time.perf_counter()
+                await session.rerun(timeout=timeout)
+                latencies.append(("load", time.perf_counter() - t))
+                for step in scenario(rng, session.options("Select a Year"), actions):
+                    t = time.perf_counter()
+                    await session.set(STEP_WIDGETS[step[0]], step[1], timeout)
+                    latencies.append((step[0], time.perf_counter() - t))
+                errors.extend(f"session {index}: {e}" for e in session.exceptions)
+            finally:
+                # Held open until every session is done, so its server-side state still counts
+                await finished.wait()
+                await release.wait()
+    except Exception as e:
+        errors.append(f"session {index}: {type(e).__name__}: {e}")
+
+
+# Runs n sessions at once. Returns once all have finished their steps, with their
+# websockets still open; set `release` to let them disconnect.
+async def drive(url, n, actions, seed, timeout):
+    latencies, errors = [], []
+    finished, release = asyncio.Barrier(n + 1), asyncio.Event()
+    tasks = [
+        asyncio.create_task(run_session(i, url, seed, actions, timeout, finished, release, latencies, errors))
+        for i in range(n)
+    ]
+    t = time.perf_counter()
+    await finished.wait()
+    return latencies, errors, time.perf_counter() - t, tasks, release
+
+
+# One concurrency level against a fresh server
+def run_level(n, actions=20, seed=0, timeout=120, fig_cache_dir=None, workers=1):
+    port = free_port()
+    url = f"ws://127.0.0.1:{port}/_stcore/stream"
+    server = start_server(port, fig_cache_dir or tempfile.mkdtemp(prefix="loadtest-fig-cache-"), timeout, workers)
+    try:
+        async def level():
+            # One session first, so imports, data loading and process-wide caches are in the baseline
+            _, _, _, tasks, release = await drive(url, 1, 0, seed, timeout)
+            release.set()
+            await asyncio.gather(*tasks)
+            await asyncio.sleep(1)
+            baseline = tree_rss_mb(server.pid)
+
+            latencies, errors, elapsed, tasks, release = await drive(url, n, actions, seed, timeout)
+            after = tree_rss_mb(server.pid)
+            release.set()
+            await asyncio.gather(*tasks)
+            return latencies, errors, elapsed, baseline, after
+
+        latencies, errors, elapsed, baseline, after = asyncio.run(level())
+    finally:
+        stop_server(server)
+
+    reruns = np.array([s for kind, s in latencies if kind != "load"])
+    loads = np.array([s for kind, s in latencies if kind == "load"])
+    pct = lambda a, q: float(np.percentile(a, q)) if len(a) else None
+    return {
+        "sessions": n,
+        "workers": workers,
+        "reruns": int(len(reruns)),
+        "errors": errors[:10],
+        "error_count": len(errors),
+        "elapsed_s": elapsed,
+        "throughput_rps": len(latencies) / elapsed if elapsed else None,
+        "p50_s": pct(reruns, 50),
+        "p95_s": pct(reruns, 95),
+        "p99_s": pct(reruns, 99),
+        "first_load_p50_s": pct(loads, 50),
+        "rss_baseline_mb": baseline,
+        "rss_mb": after,
+        "mb_per_session": (after - baseline) / n,
+        "by_action_p50_s": {
+            kind: pct(np.array([s for k, s in latencies if k == kind]), 50)
+            for kind in sorted({k for k, _ in latencies})
+        },
+    }
+
+
+def format_level(r):
+    if "p50_s" not in r:
+        return f"{r['sessions']:>4} sessions  FAILED {r['errors']}"
+    ms = lambda s: f"{s * 1000:>7.0f}" if s is not None else "      -"
+    return (
+        f"{r['sessions']:>4} sessions {r['reruns']:>6} reruns  p50{ms(r['p50_s'])}ms p95{ms(r['p95_s'])}ms p99{ms(r['p99_s'])}ms"
+        f"  {r['throughput_rps']:>6.1f} reruns/s  {r['mb_per_session']:>6.1f} MB/session  {r['error_count']} errors"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent-session load test for dashboard.py")
+    parser.add_argument("--sessions", type=int, nargs="+", default=SESSIONS, help="concurrency levels (default 1 2 4 8 16)")
+    parser.add_argument("--actions", type=int, default=20, help="interactions per session (default 20)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=120, help="seconds allowed per rerun")
+    parser.add_argument("--fig-cache", default=None, help="figure cache dir to use (default: a fresh empty one, shared by all levels)")
+    parser.add_argument("--workers", type=int, default=1, help="serve through serve.py with this many worker processes (default 1: plain streamlit)")
+    parser.add_argument("--out", default=RESULTS_PATH)
+    args = parser.parse_args()
+
+    ensure_db()
+    fig_cache_dir = args.fig_cache or tempfile.mkdtemp(prefix="loadtest-fig-cache-")
+    levels = []
+    try:
+        for n in args.sessions:
+            try:
+                r = run_level(n, args.actions, args.seed, args.timeout, fig_cache_dir, args.workers)
+            except RuntimeError as e:
+                r = {"sessions": n, "error_count": 1, "errors": [str(e)]}
+            levels.append(r)
+            print(format_level(r), flush=True)
+    finally:
+        if not args.fig_cache:
+            shutil.rmtree(fig_cache_dir, ignore_errors=True)
+
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump({"actions": args.actions, "workers": args.workers, "seed": args.seed, "levels": levels}, f, indent=2)
+    print(f"Results written to {args.out}")
@@ -1,10 +1,29 @@
 import os
-from data import build_db
+from data_builder import build_db
+from serve import serve
+from warmup import warm_up
 
-csv_path = "data/gapminder_data.csv"
+csv_path = "gapminder_data.csv"
 db_path = "data/data.db"
 
-if not os.path.exists(db_path):
-    build_db(csv_path, db_path)
+if __name__ == "__main__":
+    # Builds data.db if missing; otherwise, when the CSV is there, only applies the rows
+    # that changed in it
+    if not os.path.exists(db_path):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        build_db(csv_path, db_path)
+    elif os.path.exists(csv_path):
+        build_db(csv_path, db_path, incremental=True)
 
-os.system("streamlit run dashboard.py --server.port 8080")
\ No newline at end of file
+    # Pre-render figures before the server takes traffic; WARMUP_BUDGET=0 skips it
+    budget = float(os.environ.get("WARMUP_BUDGET", 300))
+    if budget > 0:
+        warm_up(budget)
+
+    # WORKERS=N (or "auto" for one per core) serves from N processes behind a sticky proxy
+    workers = os.environ.get("WORKERS", "1")
+    workers = (os.cpu_count() or 1) if workers == "auto" else int(workers)
+    if workers > 1:
+        serve(workers, port=8080)
+    else:
+        os.system("streamlit run dashboard.py --server.port 8080")
\ No newline at end of file
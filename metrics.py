@@ -0,0 +1,177 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Process-wide counters and timing histograms for the request path (data load, derived
+# columns, figure build, JSON serialization, figure cache) and the build. Everything is
+# kept in memory and exposed in the Prometheus text format, either written to a file or
+# served over HTTP; each span can also be appended to a JSON-lines log.
+#
+#   METRICS_FILE=data/metrics.prom   rewritten every FLUSH_INTERVAL seconds (and by flush())
+#   METRICS_PORT=9100                serves http://METRICS_HOST:9100/metrics
+#   METRICS_LOG=data/metrics.jsonl   one JSON object per span / event
+#
+# With none of them set, recording costs a dict update under a lock.
+
+METRICS_FILE = os.environ.get("METRICS_FILE")
+METRICS_PORT = int(os.environ.get("METRICS_PORT", 0))
+METRICS_HOST = os.environ.get("METRICS_HOST", "127.0.0.1")
+METRICS_LOG = os.environ.get("METRICS_LOG")
+FLUSH_INTERVAL = float(os.environ.get("METRICS_FLUSH_INTERVAL", 5))
+
+# Histogram buckets: seconds for spans, bytes for payload sizes
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+BYTE_BUCKETS = (1e3, 1e4, 1e5, 1e6, 1e7, 1e8)
+
+_lock = threading.Lock()
+_log_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_server = None
+_flusher = None
+
+
+def _labels(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(name, value=1, **labels):
+    key = (name, _labels(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, value, buckets=BUCKETS, **labels):
+    key = (name, _labels(labels))
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = {"buckets": buckets, "counts": [0] * len(buckets), "count": 0, "sum": 0.0}
+        for i, bound in enumerate(hist["buckets"]):
+            if value <= bound:
+                hist["counts"][i] += 1
+        hist["count"] += 1
+        hist["sum"] += value
+
+
+# Times the block (or, used as a decorator, every call) into the histogram `name`
+@contextmanager
+def span(name, **labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        observe(name, seconds, **labels)
+        if METRICS_LOG:
+            event(name, seconds=seconds, **labels)
+
+
+def event(name, **fields):
+    if not METRICS_LOG:
+        return
+    line = json.dumps({"ts": time.time(), "pid": os.getpid(), "metric": name, **fields}, default=str)
+    with _log_lock:
+        with open(METRICS_LOG, "a") as f:
+            f.write(line + "\n")
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels, extra=()):
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+# Prometheus text exposition format
+def render():
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted((k, dict(v, counts=list(v["counts"]))) for k, v in _histograms.items())
+
+    lines, typed = [], set()
+    for (name, labels), value in counters:
+        if name not in typed:
+            lines.append(f"# TYPE {name} counter")
+            typed.add(name)
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+    for (name, labels), hist in histograms:
+        if name not in typed:
+            lines.append(f"# TYPE {name} histogram")
+            typed.add(name)
+        for bound, count in zip(hist["buckets"], hist["counts"]):
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', repr(float(bound)))])} {count}")
+        lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {hist['count']}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {hist['sum']}")
+        lines.append(f"{name}_count{_format_labels(labels)} {hist['count']}")
+    return "\n".join(lines) + "\n"
+
+
+# Writes the current values to `path`, atomically
+def flush(path=METRICS_FILE):
+    if not path:
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        f.write(render())
+    os.replace(tmp, path)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+# Starts the /metrics endpoint on a background thread, once per process
+def serve(port=METRICS_PORT, host=METRICS_HOST):
+    global _server
+    if not port:
+        return None
+    with _lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), _Handler)
+            threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+    return _server
+
+
+def _flush_forever(path, interval):
+    while True:
+        time.sleep(interval)
+        flush(path)
+
+
+# Whatever exporters the environment asks for: the endpoint and/or a periodically
+# rewritten file. Safe to call on every rerun.
+def start():
+    global _flusher
+    serve()
+    if METRICS_FILE:
+        with _lock:
+            if _flusher is None:
+                _flusher = threading.Thread(target=_flush_forever, args=(METRICS_FILE, FLUSH_INTERVAL), name="metrics-flush", daemon=True)
+                _flusher.start()
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
@@ -0,0 +1,78 @@
+# Values behind the dashboard's controls. warmup.py enumerates the same space, so any
+# change here changes both what users can pick and what gets pre-rendered.
+
+# Color Palette select -> fig_builder palette
+PALETTES = {"Default":"blues","Protanopia":"viridis","Deuteranopia":"magma","Tritanopia":"cividis", "Grayscale":"greys"}
+
+# Text Size slider (1-5) -> font size
+def text_size_for(step):
+    return step * 4 + 5
+
+TEXT_SIZES = [text_size_for(step) for step in range(1, 6)]
+
+# High Contrast Mode off/on -> (text_color, background_color)
+THEMES = {
+    "default": ("#DAE7FF", "#0E1117"),
+    "high_contrast": ("white", "black"),
+}
+
+# Map category select -> column
+CATEGORIES = {"Population":"log_pop","Life Expectancy":"lifeexp","GDP Per Capita":"log_gdppercap","GDP":"log_gdp"}
+
+MAP_COLUMNS = ["country","continent","year","lifeexp","pop","gdppercap","gdp","log_pop","log_gdppercap","log_gdp"]
+
+# Tab figures (builder name, takes fits=)
+TAB_FIGURES = [
+    ("make_income_health_scatter", True),
+    ("make_decade_facets", True),
+    ("make_continent_time_trends", True),
+    ("make_latest_residual_bars", False),
+    ("make_logpop_vs_loggdp_facets", True),
+    ("make_summary_slopes", True),
+]
+
+# Analysis tabs in order: label, heading, description (markdown; blank lines split
+# paragraphs) and the figures each one shows. Used by dashboard.py and export.py.
+TABS = [
+    ("By Continent", "Life expectancy vs GDP per capita by continent", """
+        This view compares how life expectancy increases with income for each continent.
+        The slope of each line indicates how strongly economic growth translates into longer lives
+        in that region, steeper slopes mean greater health gains per increase in income.
+
+        All continents see an upwards trend, meaning life expectancy and income are highly correlated around the world.
+     """, ["make_income_health_scatter"]),
+    ("By Decade", "Relationship by decade", """
+        This view compares the life expectancy - GDP per capita relationship for each decade since the 1950s.
+        As global health and wealth improved, the correlation between GDP per capita and life expectancy
+        stayed relatively consistent, so the gradient of the trend line doesn't change much.
+     """, ["make_decade_facets"]),
+    ("Trends", "Life expectancy trends over time by Continent", """
+        This view tracks life expectancy through time for each continent.
+        The trend lines show the average improvement rate: Asia and the Americas rise the fastest,
+        while Europe and Oceania rise the slowest.
+     """, ["make_continent_time_trends"]),
+    ("Residuals", "Life expectancy vs GDP per capita Residuals", """
+        This view shows the greatest Residuals for life expectancy vs GDP per capita.
+        Residuals measure how far each country's life expectancy is from the global average expected
+        for its GDP per capita. It's split into two groups, highlighting the top 6 overperforming
+        and underperforming countries relative to their peers.
+     """, ["make_latest_residual_bars"]),
+    ("Population vs Income", "GDP per capita vs Population (Log Scale)", """
+        This view shows the relationship between population and income for each continent.
+        The gradient of each trend line indicates how strongly population ties into economic growth.
+        Larger populations coincide with higher income in the Americas, but with lower income in parts of Asia.
+     """, ["make_logpop_vs_loggdp_facets"]),
+    ("Slope Summary", "Life Expectancy vs Income Slopes for each Continent", """
+        This view compares the gradients of life expectancy vs income for each continent.
+        It tells you how many years of life every 10x rise in GDP per capita gets you for each continent
+        and hence how effectively higher income correlates to longer life across regions.
+     """, ["make_summary_slopes"]),
+    ("Continent Summary", "Continent and world summary", """
+        The first view tracks population-weighted life expectancy for each continent and for the world,
+        so populous countries count for more. The second compares median GDP per capita across continents
+        for the latest year; the bars span the middle half of countries and marker size shows total population.
+     """, ["make_rollup_trends", "make_rollup_summary"]),
+]
+
+# Continent Summary tab period toggle -> rollup cube grouping
+ROLLUP_PERIODS = {"By year": "year", "By decade": "decade"}
@@ -0,0 +1,208 @@
+import numpy as np
+import pandas as pd
+from pandas.errors import DatabaseError
+from sqlalchemy.exc import OperationalError
+
+
+# Ordinary least squares y = slope * x + intercept for every group in one pass.
+# Uses groupby sums of x, y, x^2, y^2 and xy instead of masking + np.polyfit per group.
+def grouped_ols(input_df, by, x, y):
+    d = input_df[[by, x, y]].dropna()
+    # Center on the global mean so the sums stay well conditioned (years, large logs)
+    x0 = float(d[x].mean()) if len(d) else 0.0
+    y0 = float(d[y].mean()) if len(d) else 0.0
+    return ols_from_sums(grouped_sums(d, by, x, y, x0, y0), by, x0, y0)
+
+
+# Per-group sums of (x - x0), (y - y0) and their products. Sums taken with the same
+# shift are additive, so chunks of a larger table can be combined with combine_sums.
+def grouped_sums(input_df, by, x, y, x0=0.0, y0=0.0):
+    d = input_df[[by, x, y]].dropna()
+    xv = d[x].to_numpy(dtype="float64")
+    yv = d[y].to_numpy(dtype="float64")
+    xc = xv - x0
+    yc = yv - y0
+
+    return pd.DataFrame({
+        "key": d[by].to_numpy(),
+        "x": xc,
+        "y": yc,
+        "xx": xc * xc,
+        "yy": yc * yc,
+        "xy": xc * yc,
+        "x_min": xv,
+        "x_max": xv,
+    }).groupby("key", sort=True, observed=True).agg(
+        n=("x", "size"), sx=("x", "sum"), sy=("y", "sum"),
+        sxx=("xx", "sum"), syy=("yy", "sum"), sxy=("xy", "sum"),
+        x_min=("x_min", "min"), x_max=("x_max", "max"),
+    )
+
+
+def combine_sums(a, b):
+    both = pd.concat([a, b])
+    return both.groupby(level=0, sort=True).agg(
+        n=("n", "sum"), sx=("sx", "sum"), sy=("sy", "sum"),
+        sxx=("sxx", "sum"), syy=("syy", "sum"), sxy=("sxy", "sum"),
+        x_min=("x_min", "min"), x_max=("x_max", "max"),
+    )
+
+
+def ols_from_sums(sums, by, x0=0.0, y0=0.0):
+    n = sums["n"].to_numpy(dtype="float64")
+    sx, sy = sums["sx"].to_numpy(), sums["sy"].to_numpy()
+    sxx, syy, sxy = sums["sxx"].to_numpy(), sums["syy"].to_numpy(), sums["sxy"].to_numpy()
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ssx = sxx - sx * sx / n
+        ssy = syy - sy * sy / n
+        spxy = sxy - sx * sy / n
+
+        # One point, or all x equal: no line to fit. Tested on the exact min/max, since
+        # ssx of a constant column rounds to a tiny nonzero value as often as not
+        slope = np.where(sums["x_max"].to_numpy() > sums["x_min"].to_numpy(), spxy / ssx, np.nan)
+        intercept = (sy - slope * sx) / n + y0 - slope * x0
+        sse = np.clip(ssy - slope * spxy, 0.0, None)
+        r2 = np.where(ssy > 0, 1.0 - sse / ssy, np.nan)
+        stderr = np.where(n > 2, np.sqrt(sse / (n - 2) / ssx), np.nan)
+
+    out = pd.DataFrame({
+        by: sums.index.to_numpy(),
+        "slope": slope,
+        "intercept": intercept,
+        "r2": r2,
+        "n": sums["n"].to_numpy(),
+        "stderr": stderr,
+        "x_min": sums["x_min"].to_numpy(),
+        "x_max": sums["x_max"].to_numpy(),
+    })
+    return out
+
+
+# Endpoints of each group's fitted line, for drawing trend lines
+def fit_line(row):
+    xs = np.array([row["x_min"], row["x_max"]])
+    return xs, row["slope"] * xs + row["intercept"]
+
+
+# Fits materialized at build time by data_builder.build_db: table -> (group, x, y)
+FIT_TABLES = {
+    "fit_lifeexp_loggdp_continent": ("continent", "log_gdp", "lifeexp"),
+    "fit_lifeexp_loggdp_decade": ("decade", "log_gdp", "lifeexp"),
+    "fit_lifeexp_year_continent": ("continent", "year", "lifeexp"),
+    "fit_loggdppercap_logpop_continent": ("continent", "log_pop", "log_gdppercap"),
+}
+
+
+def compute_fit_tables(input_df):
+    acc = FitAccumulator()
+    acc.add(input_df)
+    return acc.result()
+
+
+# Builds every FIT_TABLES fit from a stream of chunks. The first chunk's means are
+# used as the shift for all later chunks so their sums can be combined.
+class FitAccumulator:
+    def __init__(self):
+        self.shift = {}
+        self.sums = {}
+
+    def add(self, chunk):
+        d = chunk.assign(decade=(chunk["year"] // 10) * 10)
+        for name, (by, x, y) in FIT_TABLES.items():
+            if name not in self.shift:
+                self.shift[name] = (float(d[x].mean()), float(d[y].mean()))
+            x0, y0 = self.shift[name]
+            s = grouped_sums(d, by, x, y, x0, y0)
+            self.sums[name] = s if name not in self.sums else combine_sums(self.sums[name], s)
+
+    def result(self):
+        return {
+            name: ols_from_sums(self.sums[name], by, *self.shift[name])
+            for name, (by, x, y) in FIT_TABLES.items() if name in self.sums
+        }
+
+    # The fit tables plus the sums behind them (<name>_sums, with the shift in x0/y0), so an
+    # incremental build can add and remove rows without rereading the data
+    def write(self, conn):
+        for name, fit in self.result().items():
+            by = FIT_TABLES[name][0]
+            x0, y0 = self.shift[name]
+            fit.to_sql(name, conn, if_exists="replace", index=False)
+            sums = self.sums[name].rename_axis(by).reset_index().assign(x0=x0, y0=y0)
+            sums.to_sql(f"{name}_sums", conn, if_exists="replace", index=False)
+
+    # Accumulator holding the stored sums, or None when a data.db predates them
+    @classmethod
+    def read(cls, con):
+        acc = cls()
+        for name, (by, x, y) in FIT_TABLES.items():
+            try:
+                sums = pd.read_sql(f"SELECT * FROM {name}_sums", con)
+            except (OperationalError, DatabaseError):
+                return None
+            if sums.empty:
+                return None
+            acc.shift[name] = (float(sums["x0"].iloc[0]), float(sums["y0"].iloc[0]))
+            acc.sums[name] = sums.drop(columns=["x0", "y0"]).set_index(by)
+        return acc
+
+    # Takes rows out of and puts rows into every fit. Sums are additive, x ranges are not:
+    # returns {name: groups} whose x_min or x_max was held by a removed row, for the caller
+    # to re-read with set_range.
+    def update(self, removed, added):
+        removed = removed.assign(decade=(removed["year"] // 10) * 10)
+        added = added.assign(decade=(added["year"] // 10) * 10)
+        cols = ["n", "sx", "sy", "sxx", "syy", "sxy"]
+        stale = {}
+        for name, (by, x, y) in FIT_TABLES.items():
+            x0, y0 = self.shift[name]
+            sums = self.sums[name]
+            old = grouped_sums(removed, by, x, y, x0, y0)
+            new = grouped_sums(added, by, x, y, x0, y0)
+            out = sums[cols].add(new[cols], fill_value=0).sub(old[cols], fill_value=0)
+            out["n"] = out["n"].round().astype("int64")
+            out["x_min"] = pd.concat([sums["x_min"], new["x_min"]]).groupby(level=0).min()
+            out["x_max"] = pd.concat([sums["x_max"], new["x_max"]]).groupby(level=0).max()
+            ends = (old["x_min"] <= sums["x_min"].reindex(old.index)) | (old["x_max"] >= sums["x_max"].reindex(old.index))
+            self.sums[name] = out = out[out["n"] > 0]
+            stale[name] = [key for key in old.index[ends] if key in out.index]
+        return stale
+
+    def set_range(self, name, key, x_min, x_max):
+        self.sums[name].loc[key, ["x_min", "x_max"]] = [x_min, x_max]
+
+
+def read_fit_tables(con):
+    fits = {}
+    for name in FIT_TABLES:
+        try:
+            fits[name] = pd.read_sql(f"SELECT * FROM {name}", con)
+        except (OperationalError, DatabaseError):
+            # Table not built yet (older data.db), builders will fit live
+            continue
+    return fits
+
+
+# Version token of a Dataset, or of a features.view of one. pandas carries attrs into
+# derived frames (head, filters), so a view whose row count changed is other data.
+def data_token(input_df):
+    token = getattr(input_df, "token", None)
+    if token is not None:
+        return token
+    attrs = getattr(input_df, "attrs", {})
+    return attrs.get("token") if attrs.get("rows") == len(input_df) else None
+
+
+# Stored fits describe the full dataset of one version (fits.source, the full Dataset's
+# token). They are used only for that exact data; anything else is refit live.
+def lookup_fit(input_df, fits, name):
+    by, x, y = FIT_TABLES[name]
+    token = data_token(input_df)
+    source = getattr(fits, "source", None)
+    if token is not None and token == source and fits.get(name) is not None:
+        return fits[name]
+    input_df = getattr(input_df, "frame", input_df)
+    if by == "decade" and by not in input_df.columns:
+        input_df = input_df.assign(decade=(input_df["year"] // 10) * 10)
+    return grouped_ols(input_df, by, x, y)
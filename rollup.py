@@ -0,0 +1,158 @@
+import numpy as np
+import pandas as pd
+from pandas.errors import DatabaseError
+from sqlalchemy.exc import OperationalError
+
+# Continent x year rollup cube, materialized at build time by data_builder. Each cell holds
+# additive measures (row count, total population, total GDP, population-weighted life
+# expectancy sums) plus a histogram of log10 GDP per capita. Histograms add up like the
+# sums do, so quantiles can be read at any roll-up level (continent or world, year or
+# decade) from the cube alone, without touching the country rows. Across years, population
+# and GDP are averaged rather than added up.
+
+QUANTILES = {"p10": 0.10, "p25": 0.25, "median": 0.50, "p75": 0.75, "p90": 0.90}
+
+# log10 GDP per capita grid for the histograms (0.002 decades, so quantiles are within ~0.25%)
+HIST_MIN, HIST_MAX, HIST_BINS = 0.0, 7.0, 3500
+
+SUM_COLUMNS = ["n", "pop", "gdp", "lifeexp_pop", "pop_lifeexp"]
+
+WORLD = "World"
+
+
+def _cell_sums(input_df):
+    pop = input_df["pop"].to_numpy(dtype="float64")
+    lifeexp = input_df["lifeexp"].to_numpy(dtype="float64")
+    gdp = input_df["gdp"].to_numpy(dtype="float64")
+    has_life = ~np.isnan(lifeexp) & ~np.isnan(pop)
+    return pd.DataFrame({
+        "continent": input_df["continent"].to_numpy(),
+        "year": input_df["year"].to_numpy(),
+        "n": 1,
+        "pop": np.nan_to_num(pop),
+        "gdp": np.nan_to_num(gdp),
+        "lifeexp_pop": np.where(has_life, lifeexp * pop, 0.0),
+        "pop_lifeexp": np.where(has_life, pop, 0.0),
+    }).groupby(["continent", "year"], sort=True, observed=True).sum()
+
+
+def _cell_hist(input_df):
+    d = input_df[["continent", "year", "gdppercap"]].dropna()
+    x = np.log10(d["gdppercap"].to_numpy(dtype="float64"))
+    bins = np.clip(((x - HIST_MIN) / (HIST_MAX - HIST_MIN) * HIST_BINS).astype("int64"), 0, HIST_BINS - 1)
+    return pd.DataFrame({
+        "continent": d["continent"].to_numpy(),
+        "year": d["year"].to_numpy(),
+        "bin": bins,
+        "count": 1,
+    }).groupby(["continent", "year", "bin"], sort=True, observed=True)["count"].sum().reset_index()
+
+
+# Builds the cube from a stream of chunks, like regression.FitAccumulator
+class RollupAccumulator:
+    def __init__(self):
+        self.sums = None
+        self.hist = None
+
+    def add(self, chunk):
+        sums, hist = _cell_sums(chunk), _cell_hist(chunk)
+        if self.sums is not None:
+            sums = pd.concat([self.sums, sums]).groupby(level=[0, 1], sort=True).sum()
+            hist = pd.concat([self.hist, hist]).groupby(["continent", "year", "bin"], sort=True)["count"].sum().reset_index()
+        self.sums, self.hist = sums, hist
+
+    def result(self, token=None):
+        return RollupCube(self.sums, self.hist, token)
+
+
+# Quantiles of every row of a (groups x bins) count matrix, with the same linear
+# interpolation between order statistics as pandas' quantile. Each order statistic is
+# read as the centre of the bin holding it.
+def hist_quantiles(counts, q):
+    cum = np.cumsum(counts, axis=1)
+    n = cum[:, -1]
+    rank = q * np.maximum(n - 1, 0)
+    lo = np.floor(rank)
+    hi = np.minimum(lo + 1, np.maximum(n - 1, 0))
+    width = (HIST_MAX - HIST_MIN) / HIST_BINS
+
+    def order_stat(k):
+        i = np.minimum((cum <= k[:, None]).sum(axis=1), counts.shape[1] - 1)
+        return 10 ** (HIST_MIN + (i + 0.5) * width)
+
+    value = order_stat(lo) + (rank - lo) * (order_stat(hi) - order_stat(lo))
+    return np.where(n > 0, value, np.nan)
+
+
+class RollupCube:
+    def __init__(self, sums, hist, token=None):
+        self.sums = sums
+        self.hist = hist
+        self.token = token
+        self._queries = {}
+
+    # The cube with rows taken out and put in, for incremental builds: every cell and
+    # histogram bin is a sum, so this never needs the rest of the rows
+    def updated(self, removed, added, token=None):
+        sums = pd.concat([self.sums[SUM_COLUMNS], _cell_sums(added), -_cell_sums(removed)])
+        sums = sums.groupby(level=[0, 1], sort=True).sum()
+        sums = sums[sums["n"] > 0]
+        removed_hist = _cell_hist(removed)
+        removed_hist["count"] = -removed_hist["count"]
+        hist = pd.concat([self.hist, _cell_hist(added), removed_hist])
+        hist = hist.groupby(["continent", "year", "bin"], sort=True)["count"].sum().reset_index()
+        return RollupCube(sums, hist[hist["count"] > 0].reset_index(drop=True), token)
+
+    # Rolled-up view grouped by any of continent / year / decade. Without "continent" the
+    # rows are world totals (continent == "World").
+    def query(self, by=("continent", "year")):
+        by = tuple(by)
+        if by not in self._queries:
+            self._queries[by] = self._query(by)
+        return self._queries[by]
+
+    def _query(self, by):
+        sums = self.sums.reset_index()
+        hist = self.hist
+        if "decade" in by:
+            sums = sums.assign(decade=(sums["year"] // 10) * 10)
+            hist = hist.assign(decade=(hist["year"] // 10) * 10)
+        if "continent" not in by:
+            sums = sums.assign(continent=WORLD)
+            hist = hist.assign(continent=WORLD)
+        keys = ["continent", *[k for k in by if k != "continent"]]
+
+        out = sums.groupby(keys, sort=True, observed=True)[SUM_COLUMNS].sum()
+        if "year" not in keys:
+            # Population and GDP are stocks, so a period holds the average of its yearly
+            # totals, not their sum (gdppercap, a ratio of the two, is the same either way)
+            years = sums.groupby(keys, sort=True, observed=True)["year"].nunique()
+            out[["pop", "gdp"]] = out[["pop", "gdp"]].div(years, axis=0)
+        counts = (
+            hist.groupby([*keys, "bin"], sort=True, observed=True)["count"].sum()
+            .unstack("bin", fill_value=0)
+            .reindex(index=out.index, columns=range(HIST_BINS), fill_value=0)
+            .to_numpy()
+        )
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            out["lifeexp"] = out["lifeexp_pop"] / out["pop_lifeexp"]
+            out["gdppercap"] = out["gdp"] / out["pop"]
+        for name, q in QUANTILES.items():
+            out[f"gdppercap_{name}"] = hist_quantiles(counts, q)
+        return out.reset_index()
+
+
+def write_rollup(conn, cube):
+    cube.query(("continent", "year")).to_sql("rollup_continent_year", conn, if_exists="replace", index=False)
+    cube.hist.to_sql("rollup_gdppercap_hist", conn, if_exists="replace", index=False)
+
+
+def read_rollup(con, token=None):
+    try:
+        sums = pd.read_sql("SELECT continent, year, n, pop, gdp, lifeexp_pop, pop_lifeexp FROM rollup_continent_year", con)
+        hist = pd.read_sql("SELECT continent, year, bin, count FROM rollup_gdppercap_hist", con)
+    except (OperationalError, DatabaseError):
+        # Older data.db without the rollup tables
+        return None
+    return RollupCube(sums.set_index(["continent", "year"]), hist, token)
@@ -0,0 +1,357 @@
+import argparse
+import asyncio
+import json
+import os
+import secrets
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+# Multi-process serving: N `streamlit run dashboard.py` workers, each on its own local port,
+# behind a small reverse proxy on the public port. Every worker reads the same memory-mapped
+# snapshot (so the OS keeps one copy of the data in the page cache) and the same on-disk
+# figure cache, so a figure built by one worker is a cache hit for all of them.
+#
+#   python serve.py --workers 4 --port 8080        (or WORKERS=4 python main.py)
+#
+# Sessions are sticky: the first response to a client sets a cookie naming its worker slot,
+# and later requests, including the websocket a Streamlit session lives on, go back to that
+# slot. New clients go to the slot with the fewest open connections.
+#
+# Workers are restarted one at a time without dropping the service: a replacement is started
+# on a fresh port, takes over the slot once it passes its health check, and the old process
+# is stopped when its connections have closed (or after DRAIN_TIMEOUT). SIGHUP restarts every
+# worker in turn; a worker that dies is replaced automatically. From the local machine,
+#   GET  /_proxy/status         workers, ports, pids and open connections
+#   POST /_proxy/restart/<n>    restarts worker slot n
+
+DASHBOARD = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dashboard.py")
+COOKIE = "dashboard_worker"
+HEALTH_TIMEOUT = float(os.environ.get("WORKER_HEALTH_TIMEOUT", 120))
+DRAIN_TIMEOUT = float(os.environ.get("WORKER_DRAIN_TIMEOUT", 30))
+# A slot whose worker keeps dying is restarted after 1, 2, 4, ... up to 60 seconds; the delay
+# resets once a worker has stayed up for RESTART_BACKOFF_MAX seconds
+RESTART_BACKOFF = 1.0
+RESTART_BACKOFF_MAX = 60.0
+BUFFER = 64 * 1024
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# Per-worker settings: the metrics endpoint and file are per process, so each slot gets
+# its own port (METRICS_PORT + 1 + slot) and file (<name>.worker<slot>.prom)
+def worker_env(slot, base=os.environ):
+    env = dict(base)
+    if base.get("METRICS_PORT"):
+        env["METRICS_PORT"] = str(int(base["METRICS_PORT"]) + 1 + slot)
+    if base.get("METRICS_FILE"):
+        root, ext = os.path.splitext(base["METRICS_FILE"])
+        env["METRICS_FILE"] = f"{root}.worker{slot}{ext}"
+    return env
+
+
+class Worker:
+    def __init__(self, slot, port, proc):
+        self.slot = slot
+        self.port = port
+        self.proc = proc
+        self.started = time.time()
+        self.connections = 0
+
+    def alive(self):
+        return self.proc.poll() is None
+
+    def status(self):
+        return {"slot": self.slot, "port": self.port, "pid": self.proc.pid, "alive": self.alive(),
+                "connections": self.connections, "uptime_s": round(time.time() - self.started, 1)}
+
+
+async def healthy(port):
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    except OSError:
+        return False
+    try:
+        writer.write(b"GET /_stcore/health HTTP/1.0\r\nHost: 127.0.0.1\r\n\r\n")
+        await writer.drain()
+        return b" 200 " in await reader.readline()
+    except (OSError, asyncio.IncompleteReadError):
+        return False
+    finally:
+        writer.close()
+
+
+class Pool:
+    def __init__(self, n, script=DASHBOARD, streamlit_args=()):
+        self.n = n
+        self.script = script
+        self.streamlit_args = list(streamlit_args)
+        self.workers = [None] * n
+        self.restarting = set()
+        self.backoff = [0.0] * n
+        self.next_restart = [0.0] * n
+        # One cookie secret for every worker, so the XSRF cookie a client got from one
+        # process is still valid after its slot is restarted
+        self.env = dict(os.environ)
+        self.env.setdefault("STREAMLIT_SERVER_COOKIE_SECRET", secrets.token_hex(32))
+
+    def spawn(self, slot):
+        port = free_port()
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "streamlit", "run", self.script,
+             "--server.headless", "true", "--server.address", "127.0.0.1", "--server.port", str(port),
+             "--server.fileWatcherType", "none", "--browser.gatherUsageStats", "false", *self.streamlit_args],
+            env=worker_env(slot, self.env),
+        )
+        return Worker(slot, port, proc)
+
+    async def start_worker(self, slot):
+        worker = self.spawn(slot)
+        try:
+            deadline = time.monotonic() + HEALTH_TIMEOUT
+            while time.monotonic() < deadline:
+                if not worker.alive():
+                    raise RuntimeError(f"worker {slot} exited with {worker.proc.returncode}")
+                if await healthy(worker.port):
+                    return worker
+                await asyncio.sleep(0.2)
+            raise RuntimeError(f"worker {slot} did not pass its health check within {HEALTH_TIMEOUT:.0f}s")
+        except BaseException:
+            # Failed, timed out or cancelled: the process is never left running
+            await stop_worker(worker, 0)
+            raise
+
+    # Starts every slot at once; if one fails, the others are cancelled and stopped
+    async def start(self):
+        tasks = [asyncio.ensure_future(self.start_worker(slot)) for slot in range(self.n)]
+        try:
+            self.workers = list(await asyncio.gather(*tasks))
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            started = await asyncio.gather(*tasks, return_exceptions=True)
+            await asyncio.gather(*(stop_worker(w, 0) for w in started if isinstance(w, Worker)))
+            raise
+
+    # Worker for a request: its sticky slot when that worker is up, else the least busy one
+    def pick(self, slot=None):
+        live = [w for w in self.workers if w is not None and w.alive()]
+        if not live:
+            return None
+        if slot is not None and 0 <= slot < self.n:
+            worker = self.workers[slot]
+            if worker is not None and worker.alive():
+                return worker
+        return min(live, key=lambda w: w.connections)
+
+    async def restart(self, slot):
+        if slot in self.restarting:
+            return
+        self.restarting.add(slot)
+        try:
+            try:
+                replacement = await self.start_worker(slot)
+            except RuntimeError as e:
+                print(f"serve: {e}", flush=True)
+                return
+            old, self.workers[slot] = self.workers[slot], replacement
+            print(f"serve: worker {slot} restarted on port {replacement.port} (pid {replacement.proc.pid})", flush=True)
+            if old is not None:
+                await stop_worker(old, DRAIN_TIMEOUT)
+        finally:
+            self.restarting.discard(slot)
+
+    async def rolling_restart(self):
+        for slot in range(self.n):
+            await self.restart(slot)
+
+    # Replaces workers that exited on their own, backing off on slots that keep failing
+    async def monitor(self, interval=1.0):
+        while True:
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            for slot, worker in enumerate(self.workers):
+                if worker is None or slot in self.restarting:
+                    continue
+                if worker.alive():
+                    if self.backoff[slot] and time.time() - worker.started > RESTART_BACKOFF_MAX:
+                        self.backoff[slot] = 0.0
+                    continue
+                if now < self.next_restart[slot]:
+                    continue
+                self.backoff[slot] = min(self.backoff[slot] * 2 or RESTART_BACKOFF, RESTART_BACKOFF_MAX)
+                self.next_restart[slot] = now + self.backoff[slot]
+                print(f"serve: worker {slot} exited with {worker.proc.returncode}, replacing it "
+                      f"(next retry in {self.backoff[slot]:.0f}s at the earliest)", flush=True)
+                asyncio.ensure_future(self.restart(slot))
+
+    async def stop(self):
+        await asyncio.gather(*(stop_worker(w, 0) for w in self.workers if w is not None))
+
+
+# Waits up to `drain` seconds for the worker's connections to close, then stops it
+async def stop_worker(worker, drain):
+    deadline = time.monotonic() + drain
+    while worker.connections and time.monotonic() < deadline:
+        await asyncio.sleep(0.2)
+    if worker.alive():
+        worker.proc.terminate()
+        for _ in range(50):
+            if not worker.alive():
+                break
+            await asyncio.sleep(0.2)
+        else:
+            worker.proc.kill()
+    worker.proc.wait()
+
+
+def parse_head(head):
+    lines = head.decode("latin-1").split("\r\n")
+    method, target, _ = (lines[0].split(" ", 2) + ["", ""])[:3]
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+    return method, target, headers
+
+
+def cookie_slot(headers):
+    for part in headers.get("cookie", "").split(";"):
+        name, _, value = part.strip().partition("=")
+        if name == COOKIE and value.isdigit():
+            return int(value)
+    return None
+
+
+def simple_response(writer, status, body, content_type="text/plain; charset=utf-8"):
+    body = body.encode() if isinstance(body, str) else body
+    writer.write(
+        f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\n"
+        f"Connection: close\r\n\r\n".encode() + body
+    )
+
+
+async def pipe(reader, writer):
+    try:
+        while data := await reader.read(BUFFER):
+            writer.write(data)
+            await writer.drain()
+    except (ConnectionError, asyncio.CancelledError):
+        pass
+
+
+class Proxy:
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def control(self, writer, method, target):
+        path = target.split("?")[0].rstrip("/")
+        if path == "/_proxy/status":
+            simple_response(writer, "200 OK", json.dumps([w.status() for w in self.pool.workers if w]), "application/json")
+        elif path.startswith("/_proxy/restart/") and method == "POST" and path.rsplit("/", 1)[1].isdigit():
+            slot = int(path.rsplit("/", 1)[1])
+            if slot >= self.pool.n:
+                simple_response(writer, "404 Not Found", f"no worker {slot}\n")
+            else:
+                asyncio.ensure_future(self.pool.restart(slot))
+                simple_response(writer, "202 Accepted", f"restarting worker {slot}\n")
+        else:
+            simple_response(writer, "404 Not Found", "not found\n")
+
+    async def handle(self, client_reader, client_writer):
+        worker = None
+        backend_writer = None
+        tasks = []
+        try:
+            try:
+                head = await client_reader.readuntil(b"\r\n\r\n")
+            except asyncio.LimitOverrunError:
+                simple_response(client_writer, "431 Request Header Fields Too Large", "headers too large\n")
+                return
+            except asyncio.IncompleteReadError:
+                return
+            method, target, headers = parse_head(head)
+
+            if target.startswith("/_proxy/"):
+                peer = client_writer.get_extra_info("peername")
+                if peer and peer[0] in ("127.0.0.1", "::1"):
+                    await self.control(client_writer, method, target)
+                else:
+                    simple_response(client_writer, "403 Forbidden", "forbidden\n")
+                return
+
+            # The whole client connection (keep-alive requests or a websocket) stays on one worker
+            slot = cookie_slot(headers)
+            worker = self.pool.pick(slot)
+            if worker is None:
+                simple_response(client_writer, "503 Service Unavailable", "no workers available\n")
+                return
+            worker.connections += 1
+            try:
+                backend_reader, backend_writer = await asyncio.open_connection("127.0.0.1", worker.port, limit=BUFFER)
+            except OSError:
+                simple_response(client_writer, "502 Bad Gateway", "worker unavailable\n")
+                return
+            backend_writer.write(head)
+            tasks.append(asyncio.ensure_future(pipe(client_reader, backend_writer)))
+
+            # Pins the client to this worker's slot on the first response
+            response = await backend_reader.readuntil(b"\r\n\r\n")
+            if slot != worker.slot:
+                response = response[:-2] + f"Set-Cookie: {COOKIE}={worker.slot}; Path=/; HttpOnly; SameSite=Lax\r\n\r\n".encode()
+            client_writer.write(response)
+            tasks.append(asyncio.ensure_future(pipe(backend_reader, client_writer)))
+
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            if worker is not None:
+                worker.connections -= 1
+            for writer in (backend_writer, client_writer):
+                if writer is not None:
+                    writer.close()
+
+
+async def run(workers, port=8080, host="0.0.0.0", streamlit_args=()):
+    pool = Pool(workers, streamlit_args=streamlit_args)
+    await pool.start()
+    server = await asyncio.start_server(Proxy(pool).handle, host, port, limit=BUFFER)
+    print(f"serve: {workers} workers on ports {', '.join(str(w.port) for w in pool.workers)}, "
+          f"proxy on http://{host}:{port}", flush=True)
+
+    loop = asyncio.get_running_loop()
+    stopping = asyncio.Event()
+    loop.add_signal_handler(signal.SIGHUP, lambda: asyncio.ensure_future(pool.rolling_restart()))
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopping.set)
+
+    monitor = asyncio.ensure_future(pool.monitor())
+    try:
+        await stopping.wait()
+    finally:
+        monitor.cancel()
+        server.close()
+        await pool.stop()
+
+
+def serve(workers, port=8080, host="0.0.0.0", streamlit_args=()):
+    asyncio.run(run(workers, port, host, streamlit_args))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the dashboard from several worker processes behind a sticky proxy")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes (default: CPU count)")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--host", default="0.0.0.0")
+    args = parser.parse_args()
+    serve(args.workers, args.port, args.host)
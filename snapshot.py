@@ -0,0 +1,166 @@
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+from ingest import dataset_version
+
+# Columnar snapshot of the dashboard frame: one .npy file per column plus a manifest.
+# String columns are dictionary encoded (codes .npy + categories in the manifest).
+# Reads memory-map every file, so loading is zero-copy and pages are shared by the OS
+# between every process that maps the same snapshot.
+
+MANIFEST = "manifest.json"
+
+
+def write_snapshot(input_df, path="data/snapshot", version=None):
+    categories = {c: sorted(input_df[c].dropna().unique()) for c in input_df.columns if _is_text(input_df[c])}
+    writer = SnapshotWriter(path, len(input_df), categories, version)
+    writer.append(input_df)
+    writer.close()
+
+
+def _is_text(s):
+    return isinstance(s.dtype, pd.CategoricalDtype) or s.dtype == object or pd.api.types.is_string_dtype(s.dtype)
+
+
+# Writes a snapshot chunk by chunk into preallocated .npy files, so a table larger than
+# memory can be snapshotted. Row count and the categories of text columns must be known
+# up front (SELECT COUNT(*) / SELECT DISTINCT are cheap on the indexed table).
+class SnapshotWriter:
+    def __init__(self, path, rows, categories, version=None):
+        self.path = path
+        self.version = version
+        self.tmp = path + ".tmp"
+        self.rows = rows
+        self.categories = {c: [str(v) for v in cats] for c, cats in categories.items()}
+        self.arrays = {}
+        self.offset = 0
+        shutil.rmtree(self.tmp, ignore_errors=True)
+        os.makedirs(self.tmp)
+
+    def append(self, chunk):
+        for col in chunk.columns:
+            if col in self.categories:
+                values = pd.Categorical(chunk[col], categories=self.categories[col]).codes
+            else:
+                values = chunk[col].to_numpy()
+            if col not in self.arrays:
+                self.arrays[col] = np.lib.format.open_memmap(
+                    os.path.join(self.tmp, f"{col}.npy"), mode="w+", dtype=values.dtype, shape=(self.rows,)
+                )
+            self.arrays[col][self.offset:self.offset + len(chunk)] = values
+        self.offset += len(chunk)
+
+    def close(self):
+        manifest = {"rows": self.offset, "version": self.version, "columns": []}
+        for col, arr in self.arrays.items():
+            arr.flush()
+            entry = {"name": col}
+            if col in self.categories:
+                entry["categories"] = self.categories[col]
+            manifest["columns"].append(entry)
+        self.arrays = {}
+
+        with open(os.path.join(self.tmp, MANIFEST), "w") as f:
+            json.dump(manifest, f)
+
+        # Swap in the finished snapshot so readers never see a half-written one
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.replace(self.tmp, self.path)
+
+
+# A snapshot is only used if it was written from the dataset version now in the database
+def snapshot_is_current(path="data/snapshot", db_path="data/data.db"):
+    manifest = os.path.join(path, MANIFEST)
+    if not os.path.exists(manifest):
+        return False
+    with open(manifest) as f:
+        version = json.load(f).get("version")
+    return version is not None and version == dataset_version(db_path)
+
+
+def read_snapshot(path="data/snapshot"):
+    with open(os.path.join(path, MANIFEST)) as f:
+        manifest = json.load(f)
+
+    cols = {}
+    for entry in manifest["columns"]:
+        arr = np.load(os.path.join(path, f"{entry['name']}.npy"), mmap_mode="r", allow_pickle=False)
+        if "categories" in entry:
+            cols[entry["name"]] = pd.Categorical.from_codes(arr, entry["categories"], validate=False)
+        else:
+            cols[entry["name"]] = arr
+    return pd.DataFrame(cols, copy=False)
+
+
+# Positions of (country code, year) keys in arrays sorted by code then year, one
+# searchsorted per distinct country. `side="left"` finds existing rows, and is also where
+# a new row goes.
+def _positions(codes, years, key_codes, key_years):
+    out = np.empty(len(key_codes), dtype="int64")
+    for code in np.unique(key_codes):
+        lo, hi = np.searchsorted(codes, code, "left"), np.searchsorted(codes, code, "right")
+        mine = key_codes == code
+        out[mine] = lo + np.searchsorted(years[lo:hi], key_years[mine])
+    return out
+
+
+# Incremental version of a rebuild from the table: rows whose (country, year) is in
+# `removed` are dropped, `added` rows are merged in at their sorted place, and text columns
+# are re-encoded against `categories`. Copies the columns into a new snapshot that is
+# swapped in like a full write, so it costs a pass over the arrays but no SQL or parsing.
+def patch_snapshot(path="data/snapshot", removed=None, added=None, categories=None, version=None):
+    with open(os.path.join(path, MANIFEST)) as f:
+        manifest = json.load(f)
+    if (removed is None or removed.empty) and (added is None or added.empty):
+        manifest["version"] = version
+        tmp = os.path.join(path, MANIFEST + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp, os.path.join(path, MANIFEST))
+        return
+
+    old = read_snapshot(path)
+    old_countries = old["country"].cat.categories
+    codes = np.asarray(old["country"].cat.codes, dtype="int64")
+    years = np.asarray(old["year"])
+
+    keep = np.ones(len(old), dtype=bool)
+    if removed is not None and not removed.empty:
+        removed_codes = old_countries.get_indexer(removed["country"].astype(str))
+        at = _positions(codes, years, removed_codes, removed["year"].to_numpy(dtype=years.dtype))
+        keep[at] = False
+
+    # Old codes in the new country order (categories stay sorted, so order is kept)
+    new_countries = pd.Index(categories["country"])
+    remap = new_countries.get_indexer(old_countries)
+    codes = remap[codes[keep]]
+    years = years[keep]
+
+    added = added.iloc[0:0] if added is None else added
+    added_codes = new_countries.get_indexer(added["country"].astype(str))
+    order = np.lexsort((added["year"].to_numpy(), added_codes))
+    added, added_codes = added.iloc[order], added_codes[order]
+    at = _positions(codes, years, added_codes, added["year"].to_numpy(dtype=years.dtype))
+
+    columns = {}
+    for col in old.columns:
+        if col in categories:
+            cats = pd.Index(categories[col])
+            if col == "country":
+                kept = codes
+            else:
+                kept = cats.get_indexer(old[col].cat.categories)[np.asarray(old[col].cat.codes, dtype="int64")[keep]]
+            values = np.insert(kept, at, cats.get_indexer(added[col].astype(str)))
+            columns[col] = pd.Categorical.from_codes(values, categories=cats, validate=False)
+        else:
+            arr = np.asarray(old[col])
+            columns[col] = np.insert(arr[keep], at, added[col].to_numpy(dtype=arr.dtype))
+
+    rows = len(columns["country"])
+    writer = SnapshotWriter(path, rows, categories, version)
+    step = 1_000_000
+    for start in range(0, rows, step):
+        writer.append(pd.DataFrame({c: v[start:start + step] for c, v in columns.items()}, copy=False))
+    writer.close()
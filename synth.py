@@ -0,0 +1,178 @@
+import argparse
+import hashlib
+import os
+import time
+import numpy as np
+import pandas as pd
+
+# Synthetic Gapminder-shaped data for load testing. Same columns as gapminder_data.csv
+# (country, year, pop, continent, lifeExp, gdpPercap), any number of countries, annual or
+# monthly rows and optional extra indicator columns. Countries are generated in blocks and
+# each block is written out before the next one is made, so memory stays flat however many
+# rows are asked for.
+#
+#   python synth.py --rows 10000000 --out data/synth.csv --build
+#
+# Each country gets a continent-typical starting income and population, yearly growth with
+# persistent shocks, and a life expectancy that rises with log income and over time along
+# a logistic curve. Monthly rows have fractional years (1952.0833 = February 1952).
+
+# Continent -> (share of countries, median GDP per capita in the start year), after gapminder
+CONTINENTS = {
+    "Africa": (0.37, 1100),
+    "Asia": (0.23, 1600),
+    "Europe": (0.21, 6000),
+    "North America": (0.09, 3500),
+    "South America": (0.08, 3800),
+    "Oceania": (0.02, 10000),
+}
+
+# Extra indicator name -> (base, log growth per year, noise); added with --indicators N
+INDICATORS = {
+    "fertility": (6.0, -0.018, 0.05),
+    "co2percap": (0.8, 0.025, 0.10),
+    "urbanpop": (30.0, 0.012, 0.03),
+    "literacy": (40.0, 0.010, 0.03),
+    "internet": (0.1, 0.080, 0.15),
+    "healthspend": (2.5, 0.015, 0.05),
+}
+
+BLOCK_ROWS = 500_000
+
+
+def periods(start_year, end_year, monthly):
+    years = end_year - start_year + 1
+    if monthly:
+        return np.round(start_year + np.arange(years * 12) / 12, 4)
+    return start_year + np.arange(years, dtype="float64")
+
+
+# One block of countries: every series is a (countries, periods) matrix
+def make_block(rng, first, count, years, indicators):
+    names = np.array([f"Country {i:07d}" for i in range(first, first + count)], dtype=object)
+    shares = np.array([share for share, _ in CONTINENTS.values()])
+    cont_idx = rng.choice(len(CONTINENTS), size=count, p=shares / shares.sum())
+    continent = np.array(list(CONTINENTS), dtype=object)[cont_idx]
+    base_gdp = np.log10(np.array([gdp for _, gdp in CONTINENTS.values()]))[cont_idx]
+
+    t = years - years[0]
+    dt = np.diff(t, prepend=t[0])
+
+    # log10 GDP per capita: continent level + country offset, drift plus an AR(1)-ish shock
+    # (cumulated noise), so countries diverge and cross over the way the real ones do
+    drift = rng.normal(0.008, 0.006, count)[:, None]
+    shocks = np.cumsum(rng.normal(0, 0.02, (count, len(years))) * np.sqrt(dt), axis=1)
+    log_gdp = base_gdp[:, None] + rng.normal(0, 0.3, count)[:, None] + drift * t + shocks
+
+    log_pop = rng.normal(6.8, 0.7, count)[:, None] + rng.normal(0.008, 0.004, count)[:, None] * t
+    log_pop += np.cumsum(rng.normal(0, 0.002, (count, len(years))) * np.sqrt(dt), axis=1)
+
+    # Preston curve: logistic in log income, shifted up over time, plus a country effect
+    z = 2.4 * (log_gdp - 3.5) + 0.02 * t + rng.normal(0, 0.35, count)[:, None]
+    life = 25 + 58 / (1 + np.exp(-z)) + rng.normal(0, 0.6, (count, len(years)))
+
+    block = {
+        "country": np.repeat(names, len(years)),
+        "year": np.tile(years, count),
+        "pop": np.round(10 ** log_pop).astype("int64").ravel(),
+        "continent": np.repeat(continent, len(years)),
+        "lifeExp": np.round(np.clip(life, 20, 88), 3).ravel(),
+        "gdpPercap": np.round(10 ** log_gdp, 4).ravel(),
+    }
+    for name in list(INDICATORS)[:indicators]:
+        base, growth, noise = INDICATORS[name]
+        values = base * np.exp(growth * t + rng.normal(0, noise, (count, 1)) + rng.normal(0, noise / 3, (count, len(years))))
+        block[name] = np.round(values, 3).ravel()
+    return pd.DataFrame(block)
+
+
+# Yields DataFrame blocks of about block_rows rows, country by country
+def iter_blocks(countries=1000, start_year=1952, end_year=2007, monthly=False, indicators=0, seed=0, block_rows=BLOCK_ROWS):
+    rng = np.random.default_rng(seed)
+    years = periods(start_year, end_year, monthly)
+    per_block = max(1, block_rows // len(years))
+    for first in range(0, countries, per_block):
+        block = make_block(rng, first, min(per_block, countries - first), years, indicators)
+        if not monthly:
+            block["year"] = block["year"].astype("int64")
+        yield block
+
+
+def write_csv(path, blocks):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    rows = 0
+    with open(tmp, "w", newline="") as f:
+        for i, block in enumerate(blocks):
+            block.to_csv(f, header=i == 0, index=False)
+            rows += len(block)
+    os.replace(tmp, path)
+    return rows
+
+
+# Straight to the dashboard's columnar snapshot layout (see snapshot.py), with the same
+# derived columns data_builder adds. The manifest gets the dataset version data_builder
+# records for the same rows written as CSV (a hash of the CSV text), so the snapshot is
+# current for a database built from `--format csv` with the same arguments.
+def write_columnar(path, blocks, rows, countries):
+    from features import LOG_COLUMNS, add_columns
+    from snapshot import SnapshotWriter
+
+    writer = None
+    version = hashlib.sha256()
+    for i, block in enumerate(blocks):
+        version.update(block.to_csv(header=i == 0, index=False).encode())
+        df = block.rename(columns={"lifeExp": "lifeexp", "gdpPercap": "gdppercap"})
+        df = df[["country", "continent", "year", *[c for c in df.columns if c not in ("country", "continent", "year")]]]
+        df["pop"] = df["pop"].astype("float64")
+        if df["year"].dtype.kind == "i":
+            df["year"] = df["year"].astype("int16")
+        df = add_columns(df, ["gdp", *LOG_COLUMNS])
+        if writer is None:
+            # Country names are generated in order, so the categories are known up front
+            names = [f"Country {i:07d}" for i in range(countries)]
+            writer = SnapshotWriter(path, rows, {"country": names, "continent": sorted(CONTINENTS)}, version)
+        writer.append(df)
+    writer.version = version.hexdigest()[:16]
+    writer.close()
+    return rows
+
+
+def generate(out, countries=1000, start_year=1952, end_year=2007, monthly=False, indicators=0, seed=0, fmt="csv"):
+    blocks = iter_blocks(countries, start_year, end_year, monthly, indicators, seed)
+    if fmt == "csv":
+        return write_csv(out, blocks)
+    return write_columnar(out, blocks, countries * len(periods(start_year, end_year, monthly)), countries)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic Gapminder-shaped dataset")
+    parser.add_argument("--out", default="data/synth.csv", help="CSV file, or snapshot directory with --format columnar")
+    parser.add_argument("--countries", type=int, default=1000)
+    parser.add_argument("--rows", type=int, default=None, help="target row count; sets --countries from the period range")
+    parser.add_argument("--start-year", type=int, default=1952)
+    parser.add_argument("--end-year", type=int, default=2007)
+    parser.add_argument("--monthly", action="store_true", help="one row per country per month instead of per year")
+    parser.add_argument("--indicators", type=int, default=0, help=f"extra indicator columns (up to {len(INDICATORS)})")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--format", choices=["csv", "columnar"], default="csv")
+    parser.add_argument("--build", action="store_true", help="then run data_builder.build_db on the CSV (streaming)")
+    parser.add_argument("--db", default="data/synth.db", help="database for --build (default data/synth.db, so the dashboard's data.db is left alone)")
+    parser.add_argument("--snapshot", default="data/synth_snapshot", help="snapshot directory for --build (default data/synth_snapshot)")
+    args = parser.parse_args()
+
+    countries = args.countries
+    if args.rows:
+        countries = max(1, -(-args.rows // len(periods(args.start_year, args.end_year, args.monthly))))
+
+    start = time.perf_counter()
+    rows = generate(args.out, countries, args.start_year, args.end_year, args.monthly, args.indicators, args.seed, args.format)
+    elapsed = time.perf_counter() - start
+    print(f"Wrote {rows:,} rows for {countries:,} countries to {args.out} in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):,.0f} rows/s)")
+
+    if args.build:
+        if args.format != "csv":
+            parser.error("--build needs --format csv")
+        import data_builder
+        os.makedirs(os.path.dirname(args.db) or ".", exist_ok=True)
+        data_builder.build_db(csv_path=args.out, db_path=args.db, snapshot_path=args.snapshot, chunksize=100_000)
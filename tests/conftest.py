@@ -0,0 +1,20 @@
+import os
+import sys
+import pytest
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+
+# Tests run in a scratch directory laid out like the app's (data/data.db, data/snapshot,
+# data/fig_cache), built from the bundled CSV, so they never touch the real data or cache
+@pytest.fixture(scope="session", autouse=True)
+def workdir(tmp_path_factory):
+    import data_builder
+    work = tmp_path_factory.mktemp("app")
+    os.makedirs(work / "data")
+    cwd = os.getcwd()
+    os.chdir(work)
+    data_builder.build_db(os.path.join(REPO, "gapminder_data.csv"), "data/data.db")
+    yield work
+    os.chdir(cwd)
@@ -0,0 +1,96 @@
+import asyncio
+import gzip
+import json
+import pytest
+import api
+import ingest
+
+
+# Drives the ASGI app in-process, without a network or an HTTP client library.
+# Returns (status, headers, body) with the body decompressed.
+def get(path, headers=()):
+    path, _, query = path.partition("?")
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": path, "raw_path": path.encode(), "query_string": query.encode(), "root_path": "",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in headers],
+        "client": ("127.0.0.1", 1234), "server": ("127.0.0.1", 80),
+    }
+    response = {"body": b""}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = {k.decode(): v.decode() for k, v in message["headers"]}
+        else:
+            response["body"] += message.get("body", b"")
+
+    asyncio.run(api.app(scope, receive, send))
+    body = response["body"]
+    if response["headers"].get("content-encoding") == "gzip":
+        body = gzip.decompress(body)
+    return response["status"], response["headers"], body
+
+
+def test_years():
+    status, headers, body = get("/years")
+    assert status == 200
+    assert headers["etag"].startswith('"')
+    assert json.loads(body)["years"][-1] == 2007
+
+
+def test_slice_columns():
+    status, _, body = get("/slices/year/2007?columns=country,lifeexp", [("Accept-Encoding", "gzip")])
+    table = json.loads(body)
+    assert status == 200
+    assert table["columns"] == ["country", "lifeexp"]
+    assert len(table["data"]) == 142
+
+
+def test_not_modified_without_touching_data(monkeypatch):
+    _, headers, _ = get("/slices/country/Chile")
+    etag = headers["etag"]
+
+    # A matching If-None-Match is answered from the ETag alone: no query, no build
+    def fail(*args, **kwargs):
+        raise AssertionError("data was read for a 304")
+    monkeypatch.setattr(ingest.sqlite3, "connect", fail)
+    monkeypatch.setattr(api.da, "get_slice", fail)
+    status, headers, body = get("/slices/country/Chile", [("If-None-Match", f'W/"x", {etag}')])
+    assert status == 304
+    assert headers["etag"] == etag
+    assert body == b""
+
+
+def test_etag_per_encoding():
+    path = "/figures/make_choropleth?year=1952&category=lifeexp"
+    _, plain, plain_body = get(path)
+    status, zipped, zipped_body = get(path, [("Accept-Encoding", "gzip")])
+    assert status == 200
+    assert zipped["content-encoding"] == "gzip"
+    assert "content-encoding" not in plain
+    assert zipped["etag"] != plain["etag"]
+    assert zipped_body == plain_body
+    # The gzip ETag does not validate the identity representation
+    assert get(path, [("If-None-Match", zipped["etag"])])[0] == 200
+    assert get(path, [("Accept-Encoding", "gzip"), ("If-None-Match", zipped["etag"])])[0] == 304
+
+
+@pytest.mark.parametrize("path, status", [
+    ("/slices/year/2007?columns=nope", 400),
+    ("/figures/make_bubble?palette=red", 400),
+    ("/figures/make_bubble?text_size=big", 400),
+    ("/slices/planet/Mars", 404),
+    ("/slices/year/1800", 404),
+    ("/slices/country/Atlantis", 404),
+    ("/fits/nope", 404),
+    ("/figures/nope", 404),
+])
+def test_errors(path, status):
+    got, headers, body = get(path)
+    assert got == status
+    assert headers["content-type"] == "application/json"
+    assert json.loads(body)["error"]
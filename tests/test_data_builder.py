@@ -0,0 +1,101 @@
+import os
+import sqlite3
+import numpy as np
+import pandas as pd
+import pytest
+import data_builder
+from conftest import REPO
+from regression import FIT_TABLES
+from snapshot import read_snapshot, snapshot_is_current
+
+
+def lines():
+    with open(os.path.join(REPO, "gapminder_data.csv")) as f:
+        return f.readlines()
+
+
+def build(tmp_path, name, body, incremental=False):
+    csv = tmp_path / f"{name}.csv"
+    csv.write_text("".join(body))
+    db, snap = str(tmp_path / f"{name}.db"), str(tmp_path / f"{name}_snapshot")
+    data_builder.build_db(str(csv), db, snapshot_path=snap, chunksize=50, incremental=incremental)
+    return db, snap
+
+
+def table(db, name, order):
+    with sqlite3.connect(db) as con:
+        return pd.read_sql(f"SELECT * FROM {name} ORDER BY {order}", con)
+
+
+def assert_same_build(a, b):
+    (db_a, snap_a), (db_b, snap_b) = a, b
+    pd.testing.assert_frame_equal(table(db_a, "data", "country, year"), table(db_b, "data", "country, year"))
+    pd.testing.assert_frame_equal(table(db_a, "countries", "country"), table(db_b, "countries", "country"))
+    for name, (by, _, _) in FIT_TABLES.items():
+        pd.testing.assert_frame_equal(table(db_a, name, by), table(db_b, name, by), rtol=1e-7, atol=1e-9)
+    pd.testing.assert_frame_equal(
+        table(db_a, "rollup_continent_year", "continent, year"), table(db_b, "rollup_continent_year", "continent, year"),
+        rtol=1e-9, check_dtype=False,
+    )
+    pd.testing.assert_frame_equal(
+        table(db_a, "rollup_gdppercap_hist", "continent, year, bin"), table(db_b, "rollup_gdppercap_hist", "continent, year, bin"),
+    )
+    assert snapshot_is_current(snap_a, db_a) and snapshot_is_current(snap_b, db_b)
+    pd.testing.assert_frame_equal(read_snapshot(snap_a), read_snapshot(snap_b))
+
+
+def edit(body):
+    # Edited values, including a continent the build reclassifies
+    body[10] = body[10].replace(",Asia,", ",Europe,")
+    header, *rows = body
+    i = next(i for i, r in enumerate(rows) if r.startswith("Canada,"))
+    fields = rows[i].split(",")
+    fields[4] = "12.5"
+    rows[i] = ",".join(fields)
+    return [header, *rows]
+
+
+def insert(body):
+    # A new year for an existing country, a whole new country, and a row of missing values
+    header, *rows = body
+    fields = rows[300].split(",")
+    fields[1] = "2009"
+    rows.insert(300, ",".join(fields))
+    rows.insert(900, "Atlantis,1952,1000,Europe,50,1234.5\n")
+    rows.insert(901, "Atlantis,1957,,Europe,,\n")
+    return [header, *rows]
+
+
+def delete(body):
+    # Single rows, a whole country, and the rows that hold a fit's x_min and x_max
+    header, *rows = body
+    d = pd.read_csv(pd.io.common.StringIO("".join(body)))
+    gone = {int(d["gdpPercap"].idxmin()), int(d["gdpPercap"].idxmax()), 5, 700}
+    gone |= set(np.flatnonzero(d["country"].eq("Chile")))
+    return [header, *[r for i, r in enumerate(rows) if i not in gone]]
+
+
+def move(body):
+    # The same rows in another order, so keys change chunks
+    header, *rows = body
+    return [header, *rows[400:600], *rows[:400], *rows[600:]]
+
+
+@pytest.mark.parametrize("change", [edit, insert, delete, move, lambda b: move(delete(insert(edit(b))))])
+def test_incremental_matches_full_build(tmp_path, monkeypatch, change):
+    body = lines()
+    build(tmp_path, "inc", body)
+    changed = change(list(body))
+    with monkeypatch.context() as m:
+        # The refresh must go through the deltas, not the full rewrite
+        m.setattr(data_builder, "write_derived", None)
+        incremental = build(tmp_path, "inc", changed, incremental=True)
+    full = build(tmp_path, "full", changed)
+    assert_same_build(incremental, full)
+
+
+def test_unchanged_csv_writes_nothing(tmp_path, capsys):
+    body = lines()
+    build(tmp_path, "inc", body)
+    build(tmp_path, "inc", body, incremental=True)
+    assert "0/" in capsys.readouterr().out.splitlines()[-1]
@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+import pytest
+from features import residual_index
+
+
+def frame():
+    rng = np.random.default_rng(0)
+    resid = rng.normal(size=60).round(1)
+    years = np.repeat([2000, 2001, 2002], 20)
+    df = pd.DataFrame({"year": years, "country": [f"c{i}" for i in range(60)], "continent": "x", "resid": resid})
+    # Ties straddling the cutoff, a year with fewer rows than k and a missing residual
+    df.loc[df["year"] == 2001, "resid"] = [3.0, 3.0, 3.0, 2.0, 2.0, 2.0, 2.0, *np.zeros(6), -1.0, -1.0, -1.0, -5.0, -5.0, -5.0, -5.0]
+    df = pd.concat([df, pd.DataFrame({"year": 2003, "country": ["d0", "d1", "d2"], "continent": "x", "resid": [0.5, np.nan, -0.5]})])
+    return df.sample(frac=1, random_state=1).reset_index(drop=True)
+
+
+@pytest.mark.parametrize("k", [1, 4, 6, 25])
+def test_residual_index_matches_nlargest(k):
+    df = frame()
+    index = residual_index(df, k)
+    assert sorted(index) == sorted(df["year"].unique())
+    for year, rows in df.groupby("year"):
+        got = index[year]
+        # Missing residuals are never ranked
+        resid = rows["resid"].dropna()
+        for group, expected in (("Over perform", resid.nlargest(k)), ("Under perform", resid.nsmallest(k))):
+            side = got[got["group"] == group]
+            # Ties may be broken either way, so compare the ranked residuals, then check
+            # every picked row really has the residual it was listed with
+            np.testing.assert_array_equal(side["resid"].to_numpy(), expected.to_numpy())
+            picked = side.merge(rows, on=["country", "continent", "resid"], how="left", indicator=True)
+            assert (picked["_merge"] == "both").all()
+            assert side["country"].is_unique
@@ -0,0 +1,20 @@
+import importlib
+import sys
+import fig_cache
+
+
+def test_code_version_covers_local_imports(tmp_path, monkeypatch):
+    (tmp_path / "helper.py").write_text("SCALE = 1\n")
+    (tmp_path / "other.py").write_text("import helper\n")
+    (tmp_path / "builders.py").write_text("import json\nfrom other import helper\n\ndef build():\n    return helper.SCALE\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    build = importlib.import_module("builders").build
+    try:
+        before = fig_cache.code_version(build)
+        assert fig_cache.code_version(build) == before
+        # Editing a module two imports away changes the version
+        (tmp_path / "helper.py").write_text("SCALE = 2\n")
+        assert fig_cache.code_version(build) != before
+    finally:
+        for name in ("builders", "other", "helper"):
+            sys.modules.pop(name, None)
@@ -0,0 +1,60 @@
+import os
+import numpy as np
+import pytest
+import data_access as da
+import fig_builder as fb
+import figure_spec
+import warmup
+
+# Dashboard variants checked per fast-path builder; benchmark.py --verify raises it
+VERIFY_LIMIT = int(os.environ.get("VERIFY_LIMIT", 20))
+
+
+def sample_jobs(name, limit=VERIFY_LIMIT):
+    jobs = [j for j in warmup.enumerate_jobs(da.get_years()) if j[0] == name]
+    return jobs[::max(1, len(jobs) // limit)][:limit]
+
+
+# Every fast-path builder (fig_builder.PX_REFERENCES) against the px builder it replaces:
+# the JSON must be byte-identical, or at least draw the same figure
+@pytest.mark.parametrize("name", sorted(fb.PX_REFERENCES))
+def test_fast_builder_matches_px(name):
+    reference = fb.PX_REFERENCES[name]
+    jobs = sample_jobs(name)
+    assert jobs
+    mismatches = []
+    for job in jobs:
+        builder, args, kwargs = warmup.figure_call(job)
+        args = builder.inputs(*args)
+        fast = figure_spec.to_json(builder.__wrapped__(*args, **kwargs))
+        slow = reference(*args, **kwargs).to_json()
+        if fast == slow:
+            continue
+        diffs = figure_spec.differences(fast, slow)
+        if diffs:
+            mismatches.append(f"{job[1:3]}: {len(diffs)} differences, first {diffs[0]}")
+    assert not mismatches, "\n".join(mismatches)
+
+
+def test_json_round_trip():
+    spec = {"data": [{"type": "bar", "x": np.arange(5, dtype="int64"), "y": np.linspace(0, 1, 5), "name": "</script>"}], "layout": {}}
+    fig_json = figure_spec.to_json(spec)
+    assert "</script>" not in fig_json
+    assert figure_spec.normalize(fig_json)["data"][0]["y"] == [0.0, 0.25, 0.5, 0.75, 1.0]
+    assert figure_spec.from_json(fig_json).data[0].name == "</script>"
+
+
+def test_plain_lists_without_typed_arrays(monkeypatch):
+    spec = {"data": [{"type": "scatter", "x": np.arange(3, dtype="float32"), "y": np.array([1.5, np.nan, 3.0])}], "layout": {}}
+    typed = figure_spec.to_json(spec)
+    monkeypatch.setattr(figure_spec, "to_typed_array_spec", None)
+    plain = figure_spec.to_json(spec)
+    assert "bdata" not in plain
+    assert figure_spec.equivalent(plain, typed)
+
+
+def test_differences_reports_paths():
+    a = {"data": [{"y": [1.0, 2.0]}], "layout": {"title": {"text": "a"}}}
+    b = {"data": [{"y": [1.0, 2.5]}], "layout": {"title": {"text": "a"}}}
+    assert figure_spec.differences(a, b) == [(".data[0].y[1]", 2.0, 2.5)]
+    assert figure_spec.equivalent(a, a)
@@ -0,0 +1,66 @@
+import warnings
+import numpy as np
+import pandas as pd
+import pytest
+from regression import grouped_ols, grouped_sums, combine_sums, ols_from_sums
+
+
+def frame():
+    rng = np.random.default_rng(0)
+    parts = []
+    for key, n in [("a", 200), ("b", 37), ("c", 3)]:
+        x = rng.normal(2000, 30, n)
+        parts.append(pd.DataFrame({"g": key, "x": x, "y": 0.3 * x - 550 + rng.normal(0, 2, n)}))
+    parts.append(pd.DataFrame({"g": "two", "x": [1.0, 3.0], "y": [2.0, 8.0]}))
+    parts.append(pd.DataFrame({"g": "one", "x": [5.0], "y": [1.0]}))
+    parts.append(pd.DataFrame({"g": "flat_x", "x": [1957.3] * 4, "y": [40.0, 41.0, 42.0, 43.0]}))
+    parts.append(pd.DataFrame({"g": "flat_y", "x": [1.0, 2.0, 4.0], "y": [7.0, 7.0, 7.0]}))
+    parts.append(pd.DataFrame({"g": "nan", "x": [1.0, np.nan, 2.0, 3.0], "y": [1.0, 5.0, np.nan, 3.0]}))
+    return pd.concat(parts, ignore_index=True)
+
+
+def polyfit(g):
+    g = g.dropna()
+    slope, intercept = np.polyfit(g["x"], g["y"], 1)
+    resid = g["y"] - (slope * g["x"] + intercept)
+    ssy = ((g["y"] - g["y"].mean()) ** 2).sum()
+    r2 = 1 - (resid ** 2).sum() / ssy if ssy > 0 else np.nan
+    return slope, intercept, r2, len(g)
+
+
+# Every group with at least two distinct x values fits like np.polyfit on that group alone
+@pytest.mark.parametrize("key", ["a", "b", "c", "two", "flat_y", "nan"])
+def test_matches_polyfit(key):
+    d = frame()
+    fit = grouped_ols(d, "g", "x", "y").set_index("g").loc[key]
+    slope, intercept, r2, n = polyfit(d[d["g"] == key])
+    assert fit["n"] == n
+    assert fit["slope"] == pytest.approx(slope, rel=1e-7, abs=1e-9)
+    assert fit["intercept"] == pytest.approx(intercept, rel=1e-7, abs=1e-7)
+    if np.isnan(r2):
+        assert np.isnan(fit["r2"])
+    else:
+        assert fit["r2"] == pytest.approx(r2, rel=1e-7, abs=1e-9)
+    # Standard error needs a residual degree of freedom
+    assert np.isnan(fit["stderr"]) == (n <= 2)
+
+
+# No line through one point, or through points that all share x: np.polyfit is rank
+# deficient there, and the fit is left undefined rather than made up
+@pytest.mark.parametrize("key", ["one", "flat_x"])
+def test_degenerate_groups(key):
+    fit = grouped_ols(frame(), "g", "x", "y").set_index("g").loc[key]
+    assert np.isnan(fit["slope"]) and np.isnan(fit["intercept"])
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", np.exceptions.RankWarning)
+        with pytest.raises(np.exceptions.RankWarning):
+            polyfit(frame().query("g == @key"))
+
+
+def test_sums_combine_across_chunks():
+    d = frame()
+    x0, y0 = float(d["x"].mean()), float(d["y"].mean())
+    halves = [grouped_sums(part, "g", "x", "y", x0, y0) for part in (d.iloc[::2], d.iloc[1::2])]
+    chunked = ols_from_sums(combine_sums(*halves), "g", x0, y0)
+    whole = grouped_ols(d, "g", "x", "y")
+    pd.testing.assert_frame_equal(chunked, whole, rtol=1e-9)
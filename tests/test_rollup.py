@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+import data_access as da
+from rollup import WORLD
+
+
+# The same roll-up straight from the country rows: totals per year, then averaged over
+# the years of each period
+def reference(df, by_continent, period):
+    d = df.assign(
+        continent=df["continent"] if by_continent else WORLD,
+        decade=(df["year"] // 10) * 10,
+        lifeexp_pop=df["lifeexp"] * df["pop"],
+    )
+    keys = ["continent", period]
+    yearly = d.groupby(list(dict.fromkeys([*keys, "year"])))[["pop", "gdp", "lifeexp_pop"]].sum()
+    out = yearly.groupby(level=[0, 1]).agg({"pop": "mean", "gdp": "mean", "lifeexp_pop": "sum"})
+    out["lifeexp"] = out["lifeexp_pop"] / d.groupby(keys)["pop"].sum()
+    out["gdppercap"] = out["gdp"] / out["pop"]
+    out["gdppercap_median"] = d.groupby(keys)["gdppercap"].median()
+    return out.reset_index()
+
+
+@pytest.mark.parametrize("period", ["year", "decade"])
+@pytest.mark.parametrize("by_continent", [True, False])
+def test_rollup_matches_groupby(period, by_continent):
+    df = da.get_full().frame.astype({"continent": str, "year": "int64"})
+    got = da.get_rollup().query(("continent", period) if by_continent else (period,))
+    got = got.astype({"continent": str, period: "int64"})
+    expected = reference(df, by_continent, period)
+    merged = expected.merge(got, on=["continent", period], suffixes=("", "_cube"), validate="one_to_one")
+    assert len(merged) == len(expected) == len(got)
+    for col in ("pop", "gdp", "lifeexp", "gdppercap"):
+        np.testing.assert_allclose(merged[f"{col}_cube"], merged[col], rtol=1e-9, err_msg=col)
+    # Quantiles come from the histograms, accurate to about a bin width
+    np.testing.assert_allclose(merged["gdppercap_median_cube"], merged["gdppercap_median"], rtol=0.01)
+
+
+def test_world_decade_population_is_not_summed_over_years():
+    world = da.get_rollup().query(("decade",)).set_index("decade")
+    df = da.get_full().frame
+    assert world.loc[1950, "pop"] == pytest.approx(df[df["year"].isin([1952, 1957])].groupby("year")["pop"].sum().mean())
@@ -0,0 +1,134 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import data_access as da
+import fig_builder as fb
+import fig_cache
+from options import PALETTES, TEXT_SIZES, THEMES, CATEGORIES, MAP_COLUMNS, TAB_FIGURES, ROLLUP_PERIODS
+
+# Pre-renders every figure variant the dashboard can ask for into the persistent figure
+# cache, before the server takes traffic. Jobs are ordered so the most likely views (default
+# palette, text size and theme; latest year) are rendered first, and the run stops
+# submitting work once the time budget is spent.
+
+
+def enumerate_jobs(years):
+    styles = [
+        (palette, text_size, theme)
+        for theme in THEMES
+        for text_size in sorted(TEXT_SIZES, key=lambda s: abs(s - 17))
+        for palette in PALETTES.values()
+    ]
+    jobs = []
+    for palette, text_size, theme in styles:
+        text_color, background_color = THEMES[theme]
+        style = (palette, text_size, text_color, background_color)
+        jobs.append(("make_bubble", None, None, style))
+        for name, _ in TAB_FIGURES:
+            if name != "make_latest_residual_bars":
+                jobs.append((name, None, None, style))
+        # Rollup figures read the cube; the trends job carries its period in the category slot
+        jobs.append(("make_rollup_summary", None, None, style))
+        for period in ROLLUP_PERIODS.values():
+            jobs.append(("make_rollup_trends", None, period, style))
+        # The residual tab has its own year selector, so it is rendered per year like the map
+        for year in sorted(years, reverse=True):
+            jobs.append(("make_latest_residual_bars", year, None, style))
+            for category in CATEGORIES.values():
+                jobs.append(("make_choropleth", year, category, style))
+    return jobs
+
+
+# The builder call the dashboard makes for a job, so cache keys match
+def figure_call(job):
+    name, year, category, style = job
+    builder = getattr(fb, name)
+    if name == "make_choropleth":
+        args, kwargs = (da.get_slice("year", year, MAP_COLUMNS), category, *style), {}
+    elif name == "make_rollup_trends":
+        args, kwargs = (da.get_rollup(), *style), {"period": category}
+    elif name == "make_rollup_summary":
+        args, kwargs = (da.get_rollup(), *style), {}
+    elif name == "make_latest_residual_bars":
+        args, kwargs = (da.get_full(), *style), {"year": year, "index": da.get_residual_index()}
+    else:
+        args = (da.get_full(), *style)
+        kwargs = {"fits": da.get_fits()} if dict(TAB_FIGURES).get(name) else {}
+    return builder, args, kwargs
+
+
+# The figure's JSON for a job, straight from the figure cache when it is there
+def figure_json(job):
+    builder, args, kwargs = figure_call(job)
+    key = builder.cache_key(*args, **kwargs)
+    fig_json = fig_cache.load(key)
+    if fig_json is None:
+        fig = builder(*args, **kwargs)
+        fig_json = fig_cache.load(key) or fig.to_json()
+    return fig_json
+
+
+# Runs in a worker process: builds one figure. Returns (name, seconds, already_cached).
+def render(job):
+    builder, args, kwargs = figure_call(job)
+    if fig_cache.is_cached(builder, *args, **kwargs):
+        return job[0], 0.0, True
+    start = time.perf_counter()
+    builder(*args, **kwargs)
+    return job[0], time.perf_counter() - start, False
+
+
+def warm_up(budget=300, workers=None, verbose=True):
+    start = time.perf_counter()
+    jobs = enumerate_jobs(da.get_years())
+    workers = workers or os.cpu_count() or 1
+
+    built, cached, seconds = 0, 0, 0.0
+    pending = set()
+    queue = iter(jobs)
+    out_of_time = False
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while True:
+            # Keep a couple of jobs per worker in flight so the budget can stop the run promptly
+            while not out_of_time and len(pending) < workers * 2:
+                job = next(queue, None)
+                if job is None:
+                    break
+                pending.add(pool.submit(render, job))
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                _, took, hit = future.result()
+                cached += hit
+                built += not hit
+                seconds += took
+            if budget is not None and time.perf_counter() - start > budget:
+                out_of_time = True
+
+    elapsed = time.perf_counter() - start
+    report = {
+        "jobs": len(jobs),
+        "built": built,
+        "already_cached": cached,
+        "skipped": len(jobs) - built - cached,
+        "coverage": (built + cached) / len(jobs) if jobs else 1.0,
+        "elapsed_s": elapsed,
+        "render_s": seconds,
+    }
+    if verbose:
+        print(
+            f"Warm-up: {report['coverage']:.0%} of {len(jobs)} figures cached "
+            f"({built} built, {cached} already cached, {report['skipped']} skipped) "
+            f"in {elapsed:.1f}s across {workers} workers"
+        )
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-render dashboard figures into the figure cache")
+    parser.add_argument("--budget", type=float, default=300, help="seconds to spend before stopping (default 300)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    args = parser.parse_args()
+    warm_up(args.budget, args.workers)